@@ -1,4 +1,36 @@
-from xproc import pidstatus, meminfo
+import argparse
+import collections
+import logging
+import os
+import subprocess
+import time
+
+import pytest
+
+from xproc import (
+    cgroups,
+    console,
+    disk,
+    expr,
+    history,
+    irq,
+    meminfo,
+    numa,
+    pidstatus,
+    procfile,
+    psi,
+    pss,
+    proctable,
+    pstop,
+    slabinfo,
+    softirq,
+    stat,
+    record,
+    sampler,
+    util,
+    vmstat,
+    watcher,
+)
 
 
 def test_pidstatus():
@@ -10,3 +42,640 @@ def test_pidstatus():
 def test_meminfo():
     info = meminfo.MemoryInfo()
     assert info.get_attr(meminfo.MEMTOTAL) != meminfo.EmptyAttr
+
+
+def test_proc_file_reader_grows_buffer(tmp_path):
+    path = tmp_path / "big"
+    content = b"x" * 10000 + b"\n"
+    path.write_bytes(content)
+    with procfile.ProcFileReader(str(path), bufsize=16) as reader:
+        assert reader.read() == content
+        assert reader.read() == content
+
+
+def test_proc_file_reader_short_reads(tmp_path, monkeypatch):
+    path = tmp_path / "seq"
+    content = bytes(range(256)) * 40
+    path.write_bytes(content)
+    pread_into = procfile._pread_into
+
+    def page_at_most(fd, buf, offset):
+        # like a seq_file, which returns about a page per read
+        return pread_into(fd, buf[:100], offset)
+
+    monkeypatch.setattr(procfile, "_pread_into", page_at_most)
+    with procfile.ProcFileReader(str(path), bufsize=64) as reader:
+        assert reader.read() == content
+        assert reader.read() == content
+
+
+def test_proc_file_reader_single(tmp_path, monkeypatch):
+    path = tmp_path / "stat"
+    path.write_bytes(b"1 (init) S 0\n")
+    preads = []
+    pread_into = procfile._pread_into
+
+    def counted(fd, buf, offset):
+        preads.append(offset)
+        return pread_into(fd, buf, offset)
+
+    monkeypatch.setattr(procfile, "_pread_into", counted)
+    with procfile.ProcFileReader(str(path), single=True) as reader:
+        assert reader.read() == b"1 (init) S 0\n"
+    assert preads == [0]
+
+
+def test_meminfo_from_bytes():
+    data = b"MemTotal:       1000 kB\nMemFree:         200 kB\nSlab:  10 kB\n"
+    info = meminfo.MemoryInfo(data=data)
+    assert info.get_attr_int_value(meminfo.MEMFREE) == 200
+    assert info.get_attr_int_value("KERNEL") == 10
+
+
+def test_sampler_ticks():
+    assert list(sampler.Scheduler(0.01, 3)) == [0, 1, 2]
+    multi = sampler.Sampler()
+    multi.register("mem")
+    multi.register("load")
+    attrs = multi.sample()
+    assert attrs[0].name == "TIME"
+    assert [a.name for a in attrs][-1] == "LAST_PID"
+
+
+def test_scheduler_overrun():
+    overruns = []
+    scheduler = sampler.Scheduler(0.01, 3, overruns.append)
+    for _ in scheduler:
+        time.sleep(0.025)
+    assert scheduler.overruns == 2
+    assert scheduler.missed >= 2
+    assert len(overruns) == 2
+
+
+def test_vmstat_rate():
+    assert vmstat.is_counter(vmstat.PGFAULT)
+    assert vmstat.is_counter(vmstat.NR_DIRTIED)
+    assert not vmstat.is_counter(vmstat.NR_FREE_PAGES)
+    rate = vmstat.VMStatRate([vmstat.PGFAULT, vmstat.NR_FREE_PAGES])
+    rate.rates(vmstat.VMStat(data=b"pgfault 100\nnr_free_pages 7\n"))
+    rates = rate.rates(vmstat.VMStat(data=b"pgfault 100\nnr_free_pages 9\n"))
+    assert rates == [0, 9]
+
+
+def test_snapshot_schema_shared():
+    first = vmstat.VMStat(data=b"pgfault 1\nnr_free_pages 2\n").snapshot
+    second = vmstat.VMStat(data=b"pgfault 3\nnr_free_pages 4\n").snapshot
+    assert first.schema is second.schema
+    assert second.get(vmstat.PGFAULT) == 3
+    assert str(meminfo.MemoryInfo().get_attr(meminfo.MEMTOTAL)).endswith("kB")
+
+
+def test_history_window_stats():
+    store = None
+    for i in range(10):
+        snap = vmstat.VMStat(data=b"pgfault %d\n" % i).snapshot
+        snap.ts = float(i)
+        if store is None:
+            store = history.History(snap.schema, 4)
+        store.append(snap)
+    assert list(store.column(vmstat.PGFAULT)) == [6, 7, 8, 9]
+    stats = store.stats([vmstat.PGFAULT], seconds=1.5)[vmstat.PGFAULT]
+    assert (stats.count, stats.min, stats.max, stats.mean) == (2, 8, 9, 8.5)
+
+
+class _CountSource(record.RecordSource):
+    name = "count"
+
+    def __init__(self):
+        super().__init__(["A", "B"])
+        self._count = 0
+
+    def values(self):
+        self._count += 1
+        return [self._count, -self._count]
+
+
+def test_record_round_trip(tmp_path):
+    for compress in (False, True):
+        path = str(tmp_path / f"test-{compress}.xpr")
+        with record.Recorder(path, [_CountSource()], 1, compress,
+                             block_rows=3) as recorder:
+            for i in range(10):
+                recorder.record(1000.0 + i)
+        with record.Recording(path) as recording:
+            assert len(recording) == 10
+            assert recording.find(1004.5) == 5
+            source = recording.sources["count"]
+            snapshot = source.snapshot(recording.row(7))
+            assert (snapshot.ts, snapshot.get("A"), snapshot.get("B")) == (
+                1007.0, 8, -8)
+
+
+def test_recording_rejects_bad_files(tmp_path):
+    good = tmp_path / "good.xpr"
+    with record.Recorder(str(good), [_CountSource()], 1):
+        pass
+    header = good.read_bytes()
+    fds = len(os.listdir("/proc/self/fd"))
+    for idx, data in enumerate([
+            b"", b"XPR", b"JUNK" + header[4:], header[:12],
+            header[:8] + b"{" * (len(header) - 8),
+            header[:8] + b'{"sources": []}'.ljust(len(header) - 8)
+    ]):
+        path = tmp_path / f"bad{idx}.xpr"
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            record.Recording(str(path))
+    assert len(os.listdir("/proc/self/fd")) == fds
+
+
+_INTERRUPTS = b"""           CPU0       CPU1       CPU2
+  0:         10          0          0   IO-APIC   2-edge      timer
+  1:          0          9          0   IO-APIC   1-edge      i8042
+NMI:          1          2          3   Non-maskable interrupts
+ERR:          7
+MIS:          0
+"""
+
+
+def test_interrupts_matrix():
+    matrix = irq.get_matrix(data=_INTERRUPTS)
+    assert matrix.cpu_ids == [0, 1, 2]
+    assert matrix.labels == ["0", "1", "NMI"]
+    assert matrix.extras[2] == ["Non-maskable", "interrupts"]
+    assert list(matrix.row(1)) == [0, 9, 0]
+    assert matrix.err == 7
+    counts = matrix.counts
+    assert irq.get_matrix(data=_INTERRUPTS, out=matrix) is matrix
+    assert matrix.counts is counts
+    # a larger layout in the same matrix
+    grown = _INTERRUPTS.replace(
+        b"MIS:", b"LOC:          4          5          6   Local timer\nMIS:")
+    irq.get_matrix(data=grown, out=matrix)
+    assert matrix.labels == ["0", "1", "NMI", "LOC"]
+    assert list(matrix.row(3)) == [4, 5, 6]
+    assert len(matrix.counts) == 12
+    assert irq.get(data=_INTERRUPTS).total_irq == 25
+
+
+def test_irq_delta_engine(tmp_path):
+    path = tmp_path / "interrupts"
+    path.write_bytes(_INTERRUPTS)
+    engine = irq.IrqDeltaEngine(str(path))
+    first = engine.last
+    delta = engine.update(
+        _INTERRUPTS.replace(b"  0:         10", b"  0:         13"))
+    assert list(delta.deltas[:3]) == [3, 0, 0]
+    # the first matrix is the spare one, refilled by the next update
+    counts = first.counts
+    delta = engine.update()
+    assert list(delta.deltas[:3]) == [-3, 0, 0]
+    assert engine.last is first
+    assert first.counts is counts
+    assert list(first.row(0)) == [10, 0, 0]
+
+
+def test_irq_delta_by_label():
+    last = irq.get_matrix(data=_INTERRUPTS)
+    now = irq.get_matrix(data=_INTERRUPTS.replace(
+        b"  1:          0          9          0   IO-APIC   1-edge      i8042\n",
+        b"  1:          0         19          0   IO-APIC   1-edge      i8042\n"
+        b"  2:          4          0          0   IO-APIC   1-edge      new\n"))
+    now.ts_secs = last.ts_secs + 2
+    delta = irq.IrqDelta(now, last)
+    assert delta.labels == ["0", "1", "2", "NMI"]
+    assert delta.row_totals() == [0, 10, 4, 0]
+    assert delta.cpu_totals() == [4, 10, 0]
+    assert delta.top(1) == [1]
+    assert delta.rate(delta.total()) == 7
+
+
+def test_parse_cpuset():
+    assert util.parse_cpuset("0,2-3, 5") == 0b101101
+    for bad in ("x", "4-", "-1", "3-1", "1-x"):
+        with pytest.raises(ValueError):
+            util.parse_cpuset(bad)
+
+
+def test_irq_view(caplog):
+    last = irq.get_matrix(data=_INTERRUPTS)
+    now = irq.get_matrix(data=_INTERRUPTS.replace(b"  0:         10",
+                                                  b"  0:         16"))
+    now.ts_secs = last.ts_secs + 1
+    delta = irq.IrqDelta(now, last)
+    view = irq.IrqView(["NMI", "timer"], util.parse_cpuset("0,2-3"))
+    assert view.rows(delta) == [2, 0]
+    assert view.cols(delta) == [0, 2]
+    assert view.cells(delta, top=1) == [(0, [6, 0], 6)]
+    assert view.hot(delta, 0, 2) == [(0, 6)]
+    assert irq.IrqView(all_cpus=True).cols(delta) == [0, 1, 2]
+    logger = logging.getLogger("xproc.test")
+    with caplog.at_level(logging.INFO, logger="xproc.test"):
+        irq.show_view(irq.IrqView(["1"], util.parse_cpuset("0")), -1, logger,
+                      delta)
+    assert caplog.messages[-2].split() == ["ALL", "6", "6"]
+
+
+def test_irq_view_numeric_filters():
+    delta = irq.IrqDelta(irq.get_matrix(data=_INTERRUPTS),
+                         irq.get_matrix(data=_INTERRUPTS))
+    # numbers are labels only, 2 is not in 2-edge
+    assert irq.IrqView(["0"]).rows(delta) == [0]
+    assert irq.IrqView(["2"]).rows(delta) == []
+    assert irq.IrqView(["1", "timer"]).rows(delta) == [1, 0]
+    assert irq.IrqView(["edge"]).rows(delta) == [0, 1]
+    assert irq.IrqView().rows(delta) == [0, 1, 2]
+
+
+def test_proc_table(tmp_path):
+    stat = ("S 1 7 7 0 -1 4194560 120 0 3 0 25 11 0 0 20 0 2 0 1234 "
+            "9437184 512 18446744073709551615 1 1 0 0 0 0 0 0 0 0 0 0 17 "
+            "2 0 0 0 0 0")
+    (tmp_path / "7").mkdir()
+    (tmp_path / "7" / "stat").write_text(f"7 (a) (b)) {stat}\n")
+    (tmp_path / "8").mkdir()    # exited, stat is gone
+    (tmp_path / "sys").mkdir()
+    table = proctable.ProcTable(
+        fields=(proctable.STAT_MAJFLT, proctable.STAT_UTIME,
+                proctable.STAT_RSS),
+        proc=str(tmp_path))
+    entries = table.scan()
+    assert list(entries) == [7]
+    assert entries[7].comm == "a) (b)"
+    assert entries[7].state == "S"
+    assert entries[7].snapshot.values.tolist() == [3, 25, 512]
+    with proctable.ProcTable(workers=2, proc=str(tmp_path)) as table:
+        assert table.scan()[7].snapshot.get(proctable.STAT_STARTTIME) == 1234
+
+
+def test_process_top():
+    monitor = pstop.ProcessTop([os.getpid(), 999999999])
+    first = monitor.update()
+    assert [row.pid for row in first] == [os.getpid()]
+    assert first[0].rss > 0
+    sum(range(100000))
+    row = monitor.top("cpu", 1)[0]
+    assert row.pid == os.getpid()
+    assert row.cpu >= 0 and row.majflt >= 0
+    monitor.close()
+
+
+def test_pidstatus_fields():
+    data = (b"Name:\tbash\nUmask:\t0022\nState:\tS (sleeping)\nPid:\t42\n"
+            b"Uid:\t1000\t1000\t1000\t1000\nVmRSS:\t    5944 kB\n"
+            b"Threads:\t3\n")
+    status = pidstatus.PIDStatus(
+        42,
+        fields=[pidstatus.PS_NAME, pidstatus.PS_VMRSS, pidstatus.PS_THREADS],
+        data=data)
+    assert status.names() == ["Name", "VmRSS", "Threads"]
+    assert status.get_str(pidstatus.PS_NAME) == "bash"
+    assert status.get_int(pidstatus.PS_VMRSS) == 5944
+    assert status.get_int(pidstatus.PS_THREADS) == 3
+    assert status.get(pidstatus.PS_VMRSS) == "VmRSS:5944kB"
+    # out of the file order, and missing
+    status = pidstatus.PIDStatus(
+        42, fields=[pidstatus.PS_THREADS, pidstatus.PS_PID,
+                    pidstatus.PS_VMSWAP], data=data)
+    assert status.names() == ["Threads", "Pid"]
+    assert status.get_int(pidstatus.PS_PID) == 42
+    assert status.get_int(pidstatus.PS_VMSWAP, -1) == -1
+
+
+def test_process_watcher():
+    child = subprocess.Popen(["sleep", "10"])
+    with watcher.ProcessWatcher([os.getpid(), child.pid],
+                                status_fields=[pidstatus.PS_VMRSS],
+                                fd_budget=3) as procs:
+        first = procs.poll()
+        assert sorted(first) == sorted([os.getpid(), child.pid])
+        assert all(item.new for item in first.values())
+        assert first[os.getpid()].status.get_int(pidstatus.PS_VMRSS) > 0
+        assert procs.open_fds() == 3
+        assert not any(item.new for item in procs.poll().values())
+        child.kill()
+        child.wait()
+        assert list(procs.poll()) == [os.getpid()]
+        assert procs.exited == [child.pid]
+        assert procs.pids == [os.getpid()]
+
+
+def test_pss_aggregator(tmp_path):
+    stat = "S 1 7 7 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 {} 0 0"
+    (tmp_path / "7").mkdir()
+    (tmp_path / "7" / "stat").write_text("7 (a) " + stat.format(100))
+    (tmp_path / "7" / "smaps_rollup").write_text(
+        "55d0-7ffd ---p 00000000 00:00 0 [rollup]\n"
+        "Rss:                 900 kB\nPss:                 600 kB\n")
+    with pss.PssAggregator(workers=2, proc=str(tmp_path)) as aggregator:
+        assert aggregator.total() == 600
+        assert aggregator.reads == 1
+        assert aggregator.total() == 600
+        assert aggregator.reads == 0    # cached
+        # pid 7 was reused
+        (tmp_path / "7" / "stat").write_text("7 (b) " + stat.format(200))
+        assert aggregator.refresh() == {(7, 200): 600}
+        assert aggregator.reads == 1
+    data = (b"Buffers: 10 kB\nCached: 300 kB\nMapped: 100 kB\n"
+            b"HugePages_Total: 2\nHugepagesize: 2048 kB\n")
+    info = meminfo.MemoryInfo(data=data, pss=600)
+    assert info.get_attr_int_value(meminfo.USER_PSS) == 600 + 200 + 10 + 4096
+
+
+def _slab(name: str, active_objs: int, num_objs: int,
+          objsize: int) -> slabinfo.Slab:
+    return slabinfo.Slab(name, active_objs, num_objs, objsize, 10, 1, 0, 0, 0,
+                         num_objs // 10, num_objs // 10, 0)
+
+
+def test_slabinfo_sort_and_growth():
+    last = slabinfo.SlabInfo(
+        collections.OrderedDict(
+            (slab.name, slab)
+            for slab in [_slab("b", 10, 20, 64), _slab("a", 30, 30, 8)]))
+    now = slabinfo.SlabInfo(
+        collections.OrderedDict((slab.name, slab) for slab in [
+            _slab("b", 10, 40, 64),
+            _slab("a", 30, 30, 8),
+            _slab("c", 5, 10, 512)
+        ]))
+    assert [s.name for s in now.sorted_slabs("n", 2)] == ["a", "b"]
+    assert [s.name for s in now.sorted_slabs("u", -1)] == ["a", "c", "b"]
+    assert now.sorted_slabs("c", 1)[0].name == "b"
+    assert [(s.name, g) for s, g in now.growth(last, 2)] == [("c", 5120),
+                                                             ("b", 1280)]
+
+
+_SLABINFO = b"""slabinfo - version: 2.1
+# name            <active_objs> <num_objs> <objsize> <objperslab> <pagesperslab> : tunables <limit> <batchcount> <sharedfactor> : slabdata <active_slabs> <num_slabs> <sharedavail>
+kmalloc-rcl-512      64     64    512   32    4 : tunables    0    0    0 : slabdata      2      2      0
+ext4_inode_cache   6622   6636   1120   14    4 : tunables    0    0    0 : slabdata    474    474      0
+"""
+
+
+def test_slabinfo_parser():
+    parser = slabinfo.SlabInfoParser()
+    last = parser.parse(_SLABINFO)
+    assert last.names == ["kmalloc-rcl-512", "ext4_inode_cache"]
+    assert last.index["ext4_inode_cache"] == 1
+    assert last.columns["objsize"].tolist() == [512, 1120]
+    now = parser.parse(_SLABINFO.replace(b"   64     64", b"   64     96"))
+    assert now.names is last.names
+    info = slabinfo.SlabInfo(now)
+    assert info.num_objs().value.value() == 96 + 6636
+    assert [(s.name, g) for s, g in info.growth(slabinfo.SlabInfo(last), 1)
+            ] == [("kmalloc-rcl-512", 32 * 512)]
+    with pytest.raises(ValueError):
+        slabinfo.SlabInfoParser().parse(
+            _SLABINFO.replace(b"<sharedavail>", b"<other>"))
+
+
+def test_vmalloc_summary():
+    summary = meminfo.VmallocSummary()
+    for line in [
+            b"0xa-0xb   20480 copy_process+0x1b3/0x16a0 pages=4 vmalloc N0=4",
+            b"0xb-0xc   12288 copy_process+0x1b3/0x16a0 pages=2 vmalloc N1=2",
+            b"0xc-0xd    8192 acpi_os_map_iomem+0x1d9/0x1f0 phys=0xa ioremap",
+            b"0xd-0xe    4096 unpurged vm_area",
+    ]:
+        summary.add(line)
+    assert summary.count == 3
+    assert summary.size_in_bytes == 20480 + 12288 + 8192
+    assert summary.unpurged_in_bytes == 4096
+    assert summary.nodes == {"N0": 4, "N1": 2}
+    top = summary.top(1)
+    assert [(s.caller, s.count, s.pages) for s in top] == [("copy_process", 2,
+                                                            6)]
+
+
+_STAT = b"""cpu  100 0 50 800 10 0 0 40 0 0
+cpu0 60 0 30 400 5 0 0 20 0 0
+cpu1 40 0 20 400 5 0 0 20 0 0
+intr 57 1 2 3
+ctxt 320
+btime 1700000000
+processes 99
+procs_running 2
+procs_blocked 0
+softirq 10 0 1 2 3 4 0 0 0 0 0
+"""
+
+
+def test_cpu_usage():
+    sys_stat = stat.current_system_stat(data=_STAT)
+    assert sys_stat.intr_total == 57
+    assert sys_stat.intr == [57, 1, 2, 3]
+    assert sys_stat.cpus[1].steal == 20
+    last = stat.parse_cpu_times(_STAT)
+    assert last.cpu_ids == [-1, 0, 1]
+    assert last.row(2).tolist() == [40, 0, 20, 400, 5, 0, 0, 20, 0, 0]
+    now = stat.parse_cpu_times(
+        _STAT.replace(b"cpu1 40 0 20 400", b"cpu1 70 0 30 460"))
+    usage = stat.CpuUsage(now, last)
+    assert usage.totals == [0, 0, 100]
+    assert usage.percents(2)[:4] == [30.0, 0.0, 10.0, 60.0]
+    assert usage.percents(0) == [0.0] * 10
+
+
+_SOFTIRQS = b"""                    CPU0       CPU1       CPU2       CPU3
+          HI:          0          0          0          0
+      NET_RX:        100        100        100        100
+"""
+
+
+def test_softirq_summary():
+    last = softirq.get(data=_SOFTIRQS)
+    assert last.labels == ["HI", "NET_RX"]
+    assert last.cpu_ids == [0, 1, 2, 3]
+    now = softirq.get(data=_SOFTIRQS.replace(
+        b"100        100        100        100",
+        b"900        100        100        300"))
+    now.ts_secs = last.ts_secs + 2
+    stats = softirq.summarize(irq.IrqDelta(now, last), hot=2)
+    assert stats[0] == softirq.SoftirqStat("HI", 0, [], 0.0)
+    assert stats[1].rate == 500
+    assert stats[1].hot == [(0, 400), (3, 100)]
+    assert stats[1].imbalance == 3.2
+
+
+def test_expr_plan():
+    info = meminfo.MemoryInfo(
+        data=b"MemTotal: 1000 kB\nActive(anon): 150 kB\nAnonPages: 250 kB\n"
+        b"Dirty: 3 kB\nWriteback: 4 kB\nSwapTotal: 0 kB\n")
+    ratio = expr.parse_definition("ANON_RATIO=AnonPages/MemTotal")
+    assert ratio.evaluate(info.snapshot) == 0.25
+    assert str(ratio.attr(info.snapshot).value) == "0.2500"
+    dirty = expr.parse_definition("DIRTY_WB = Dirty + Writeback * 2")
+    assert str(dirty.attr(info.snapshot)) == "DIRTY_WB:11kB"
+    anon = expr.parse_definition("X=-(Active(anon) - AnonPages) / MemTotal")
+    assert anon.evaluate(info.snapshot) == 0.1
+    assert anon.bind(info.snapshot.schema) is anon.bind(info.snapshot.schema)
+    assert expr.Expr("S", "Dirty/SwapTotal").evaluate(info.snapshot) == 0
+    for bad in ["A=Dirty +", "A=(Dirty", "A=Dirty)", "A=Dirty Dirty", "A="]:
+        with pytest.raises(expr.ExprError):
+            expr.parse_definition(bad)
+    with pytest.raises(expr.ExprError):
+        expr.Expr("U", "Unknown + 1").evaluate(info.snapshot)
+
+
+def test_memory_window_rejects_derived_columns(caplog):
+    option = argparse.Namespace(list=False, count=1, interval=1, numa=False,
+                                extra=["USER,RATIO=USER_PSS/MemTotal"],
+                                window=10)
+    with caplog.at_level(logging.ERROR, logger="xproc.console"):
+        console.show_memory(option)
+    assert caplog.messages == [
+        "derived columns are not supported with --window: RATIO"
+    ]
+
+
+def test_numa_matrix(tmp_path):
+    for node, free in ((0, 100), (1, 300)):
+        path = tmp_path / f"node{node}"
+        path.mkdir()
+        (path / "meminfo").write_bytes(
+            f"Node {node} MemFree:  {free} kB\n"
+            f"Node {node} FilePages:  20 kB\n"
+            f"Node {node} HugePages_Total:     0\n".encode())
+        (path / "numastat").write_bytes(
+            f"numa_hit {free * 10}\nnuma_miss 1\n".encode())
+    (tmp_path / "possible").write_bytes(b"0-1\n")
+    with numa.NumaReader(str(tmp_path)) as reader:
+        assert reader.nodes == [0, 1]
+        first = reader.read()
+        assert list(first.column("MemFree")) == [100, 300]
+        assert list(first.column("numa_hit")) == [1000, 3000]
+        assert list(first.column("AnonPages")) == [0, 0]
+        assert str(first.row(1).attr("FilePages")) == "FilePages:20kB"
+        assert first.row(0).get("HugePages_Total") == 0
+        (tmp_path / "node1" / "numastat").write_bytes(
+            b"numa_hit 3500\nnuma_miss 1\n")
+        second = reader.read()
+        assert second.schema is first.schema
+        deltas = second.delta(first)
+        assert list(second.column("numa_hit", deltas)) == [0, 500]
+    assert numa.list_nodes(str(tmp_path / "missing")) == []
+
+
+def test_cgroup_monitor(tmp_path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(
+        "33 32 0:29 / /sys/fs/cgroup/cpu,cpuacct rw - cgroup cgroup "
+        "rw,cpu,cpuacct\n"
+        "41 32 0:37 / /sys/fs/cgroup/systemd rw - cgroup cgroup "
+        "rw,name=systemd\n"
+        "42 32 0:38 / /sys/fs/cgroup/unified rw - cgroup2 cgroup2 rw\n")
+    roots = cgroups.find_roots(str(mountinfo))
+    assert roots == {
+        "cpu": "/sys/fs/cgroup/cpu,cpuacct",
+        "cpuacct": "/sys/fs/cgroup/cpu,cpuacct",
+        "unified": "/sys/fs/cgroup/unified",
+    }
+
+    def write(path, usage, anon):
+        path.mkdir(exist_ok=True)
+        (path / "memory.current").write_text(f"{anon + 4096}\n")
+        (path / "memory.stat").write_text(
+            f"anon {anon}\nfile 4096\nanon_thp 0\npgmajfault 2\n")
+        (path / "cpu.stat").write_text(
+            f"usage_usec {usage}\nuser_usec 0\nthrottled_usec 0\n")
+        (path / "io.stat").write_text(
+            "8:0 rbytes=2048 wbytes=1024 rios=1 wios=1\n"
+            "8:16 rbytes=2048 wbytes=0 rios=1 wios=0\n")
+
+    root = tmp_path / "unified"
+    root.mkdir()
+    (root / "cgroup.controllers").write_text("cpu io memory\n")
+    (root / "cpu.stat").write_text("usage_usec 5\n")
+    (root / "memory.stat").write_text("anon 8192\nfile 4096\n")
+    write(root / "a", 100, 8192)
+    write(root / "a" / "b", 200, 1024)
+    # the memory controller is not enabled for n
+    (root / "n").mkdir()
+    (root / "n" / "cpu.stat").write_text("usage_usec 7\n")
+    proc_cgroups = tmp_path / "cgroups"
+    proc_cgroups.write_text("#subsys_name\thierarchy\tnum_cgroups\tenabled\n"
+                            "memory\t0\t3\t1\n")
+    monitor = cgroups.CGroupMonitor({cgroups.UNIFIED: str(root)},
+                                    str(proc_cgroups))
+    assert monitor.version == 2
+    assert sorted(monitor.paths) == ["/", "/a", "/a/b", "/n"]
+    first = {row.path: row for row in monitor.update()}
+    assert first["/a"] == cgroups.CGroupStat("/a", 0, 0, 12, 8, 4, 0, 0, 0)
+    assert first["/"].cpu == 0
+    assert first["/"].memory == 12
+    assert first["/n"] == cgroups.CGroupStat("/n", 0, 0, 0, 0, 0, 0, 0, 0)
+    # a new cgroup is not seen before num_cgroups changes
+    write(root / "c", 0, 0)
+    write(root / "a", 1000100, 8192)
+    rows = monitor.top("cpu", 1)
+    assert [row.path for row in rows] == ["/a"]
+    assert rows[0].cpu > 0
+    assert monitor.scans == 1
+    assert "/n" in monitor.paths
+    assert monitor.scans == 1
+    proc_cgroups.write_text("memory\t0\t4\t1\n")
+    assert len(monitor.top("mem")) == 5
+    assert monitor.scans == 2
+
+
+def test_psi(tmp_path):
+    for resource, total in (("cpu", 2000000), ("memory", 0), ("io", 10)):
+        (tmp_path / resource).write_bytes(
+            f"some avg10=1.50 avg60=0.25 avg300=0.00 total={total}\n"
+            f"full avg10=0.00 avg60=0.00 avg300=0.00 total={total // 2}\n".
+            encode())
+    lines = psi.parse_pressure((tmp_path / "cpu").read_bytes())
+    assert lines[psi.SOME] == psi.PressureLine(1.5, 0.25, 0.0, 2000000)
+    with psi.PressureReader(root=str(tmp_path)) as reader:
+        first = reader.read()
+        assert [p.resource for p in first] == ["cpu", "memory", "io"]
+        later = first[0]._replace(
+            some=first[0].some._replace(total=2500000), ts=first[0].ts + 2)
+        assert later.stall(first[0]) == {psi.SOME: 25.0, psi.FULL: 0.0}
+    trigger = psi.parse_trigger("memory:some:150:2000", str(tmp_path))
+    assert str(trigger) == "memory some 150ms/2000ms"
+    # a regular file never raises POLLPRI
+    with psi.PsiMonitor([trigger]) as monitor:
+        assert monitor.wait(0) == []
+    assert (tmp_path / "memory").read_bytes().startswith(
+        b"some 150000 2000000\0")
+    for bad in ("memory:some:150", "disk:some:1:1000", "cpu:some:1:100",
+                "cpu:half:1:1000", "cpu:some:3000:2000"):
+        with pytest.raises(ValueError):
+            psi.parse_trigger(bad, str(tmp_path))
+
+
+def test_disk_delta(tmp_path):
+    (tmp_path / "sda1").mkdir()
+    (tmp_path / "sda1" / "partition").write_text("1\n")
+    last = (b"   8       0 sda 100 0 800 50 10 0 80 20 0 100 70\n"
+            b"   8       1 sda1 100 0 800 50 10 0 80 20 0 100 70\n"
+            b" 253       0 dm-0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n")
+    now = (b"   8       0 sda 300 0 2800 250 20 0 2080 120 1 600 1070\n"
+           b"   8       1 sda1 300 0 2800 250 20 0 2080 120 1 600 1070\n"
+           b" 253       0 dm-0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n")
+    parser = disk.DiskStatsParser()
+    first, second = parser.parse(last), parser.parse(now)
+    assert second.names is first.names
+    assert list(second.row(0)[disk.IN_FLIGHT:disk.IO_TICKS + 1]) == [1, 600]
+    assert len(second.counts) == 3 * disk.NFIELDS
+    second.ts_secs = first.ts_secs + 2
+    delta = disk.DiskDelta(second, first)
+    view = disk.DiskView(root=str(tmp_path))
+    rows = view.rows(delta.names)
+    assert rows == [0, 2] and view.rows(delta.names) is rows
+    sda = delta.stats(rows)[0]
+    assert sda == disk.DiskStat("sda", 100.0, 5.0, 500.0, 500.0, 1.0, 10.0,
+                                0.5, 25.0)
+    assert disk.DiskView(partitions=True, dm=False,
+                         root=str(tmp_path)).rows(delta.names) == [0, 1]
+    assert disk.DiskView(["sda1"], root=str(tmp_path)).rows(
+        delta.names) == [1]
+    # a new device is counted from 0
+    added = parser.parse(now + b" 259 0 nvme0n1 4 0 8 1 0 0 0 0 0 2 1\n")
+    added.ts_secs = second.ts_secs + 1
+    moved = disk.DiskDelta(added, second)
+    assert moved.names[-1] == "nvme0n1"
+    assert moved.stats([0, 3])[1].rps == 4.0
+    assert moved.stats([0])[0].rps == 0.0
@@ -1,8 +1,17 @@
 
+import os
 import re
-from typing import NamedTuple
+import time
+import heapq
+import logging
+import operator
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from xproc.procfile import read_once
 from xproc.util import open_file
 
+logger = logging.getLogger("xproc.cgroups")
+
 
 HIERARCHY_IDX = 0
 NUM_CGROUPS_IDX = 1
@@ -47,6 +56,10 @@ class CGroups:
     def get(self, name:str) -> SubSys:
         return self._subsys.get(name, EmptySubSys)
 
+    def counts(self) -> Tuple[int, ...]:
+        """num_cgroups of the subsystems, changed by a new or removed cgroup"""
+        return tuple(sub.num_cgroups for sub in self._subsys.values())
+
     @property
     def cpuset(self) -> SubSys:
         return self.get(CPUSET)
@@ -101,3 +114,271 @@ class CGroups:
 
 def current_cgroups() -> CGroups:
     return CGroups()
+
+
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+# key of the v2 unified hierarchy in the roots
+UNIFIED = "unified"
+
+# columns read from every cgroup
+CG_MEMORY = 0    # bytes, memory.current, memory.usage_in_bytes of v1
+CG_ANON = 1    # bytes
+CG_FILE = 2    # bytes
+CG_MAJFLT = 3    # major faults
+CG_CPU = 4    # usec
+CG_THROTTLED = 5    # usec
+CG_READ = 6    # bytes
+CG_WRITE = 7    # bytes
+_NCOLS = 8
+
+# memory.stat keys of (anon, file, majflt)
+_V2_MEMORY_KEYS = (b"\nanon ", b"\nfile ", b"\npgmajfault ")
+# hierarchical ones like memory.current in v2
+_V1_MEMORY_KEYS = (b"\ntotal_rss ", b"\ntotal_cache ",
+                   b"\ntotal_pgmajfault ")
+
+
+class CGroupStat(NamedTuple):
+    path: str    # relative to the root of the hierarchy, / is the root
+    cpu: float    # percent of one cpu
+    throttled: float    # percent of the time throttled
+    memory: int    # kB
+    anon: int    # kB
+    file: int    # kB
+    majflt: float    # major faults per second
+    read: float    # kB per second
+    write: float    # kB per second
+
+
+SORT_KEYS = {
+    "cpu": lambda row: row.cpu,
+    "mem": lambda row: row.memory,
+    "io": lambda row: row.read + row.write,
+    "majflt": lambda row: row.majflt,
+}
+
+
+def find_roots(path: str = MOUNTINFO_PATH) -> Dict[str, str]:
+    """
+    Mount points of the cgroup hierarchies, the v2 one is keyed by
+    UNIFIED, a v1 one by each of its controllers, such as cpu and cpuacct
+    of a cpu,cpuacct mount.
+    """
+    roots: Dict[str, str] = {}
+    with open_file(path) as mounts:
+        for line in mounts:
+            fields, _, extra = line.partition(" - ")
+            fstype, _, options = extra.split(" ", 2)
+            mount_point = fields.split(" ")[4]
+            if fstype == "cgroup2":
+                roots[UNIFIED] = mount_point
+            elif fstype == "cgroup":
+                for option in options.strip().split(","):
+                    # skip rw and name=systemd
+                    if option not in ("rw", "ro") and "=" not in option:
+                        roots.setdefault(option, mount_point)
+    return roots
+
+
+def walk(root: str) -> List[str]:
+    """Every cgroup below root, as paths relative to root"""
+    paths = ["/"]
+    pending = [""]
+    while pending:
+        rel = pending.pop()
+        try:
+            with os.scandir(root + rel) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        child = f"{rel}/{entry.name}"
+                        paths.append(child)
+                        pending.append(child)
+        except FileNotFoundError:    # removed while walking
+            continue
+    return paths
+
+
+def _stat_value(data: bytes, key: bytes) -> int:
+    """The int after key, key is b"\\nname " to match a whole name"""
+    if data.startswith(key[1:]):
+        start = len(key) - 1
+    else:
+        pos = data.find(key)
+        if pos < 0:
+            return 0
+        start = pos + len(key)
+    end = data.find(b"\n", start)
+    return int(data[start:end] if end >= 0 else data[start:])
+
+
+def _io_bytes(data: bytes) -> Tuple[int, int]:
+    """Sum of rbytes= and wbytes= of all devices in io.stat"""
+    totals = [0, 0]
+    for idx, key in enumerate((b"rbytes=", b"wbytes=")):
+        pos = data.find(key)
+        while pos >= 0:
+            start = pos + len(key)
+            end = data.find(b" ", start)
+            totals[idx] += int(data[start:end])
+            pos = data.find(key, start)
+    return totals[0], totals[1]
+
+
+class CGroupMonitor:
+    """
+    Usage of every cgroup, of v2 if the unified hierarchy has the memory
+    controller, else of the v1 memory, cpuacct and cpu hierarchies.
+
+    The tree is walked once and cached, it is walked again only when the
+    num_cgroups of /proc/cgroups change, or a cached cgroup has gone.
+    A tick only reads the files of the cached cgroups.
+    """
+
+    def __init__(self,
+                 roots: Optional[Dict[str, str]] = None,
+                 cgroups_path: str = "/proc/cgroups"):
+        self._roots = find_roots() if roots is None else roots
+        self._cgroups_path = cgroups_path
+        self.version = 2 if self._is_v2() else 1
+        self._counts: Optional[Tuple[int, ...]] = None
+        self._paths: List[str] = []
+        # v1 hierarchy -> its cgroups, the trees may differ
+        self._trees: Dict[str, frozenset] = {}
+        self._stale = True
+        self.scans = 0
+        # path -> values of the last tick
+        self._last: Dict[str, array] = {}
+        self._last_ts = 0.0
+
+    def _is_v2(self) -> bool:
+        unified = self._roots.get(UNIFIED)
+        if unified is None:
+            return False
+        if "memory" not in self._roots:
+            return True
+        try:
+            controllers = read_once(f"{unified}/cgroup.controllers")
+        except OSError:
+            return False
+        return b"memory" in controllers.split()
+
+    def _counts_now(self) -> Optional[Tuple[int, ...]]:
+        try:
+            return CGroups(self._cgroups_path).counts()
+        except OSError:    # without /proc/cgroups, walk every tick
+            return None
+
+    @property
+    def paths(self) -> List[str]:
+        counts = self._counts_now()
+        if self._stale or counts is None or counts != self._counts:
+            self._paths = self._walk()
+            self._counts, self._stale = counts, False
+            self.scans += 1
+            logger.debug("%d cgroups", len(self._paths))
+        return self._paths
+
+    def _walk(self) -> List[str]:
+        if self.version == 2:
+            return walk(self._roots[UNIFIED])
+        self._trees = {
+            name: frozenset(walk(self._roots[name]))
+            for name in ("memory", "cpuacct", "cpu") if name in self._roots
+        }
+        paths = set()
+        for name in ("memory", "cpuacct"):
+            paths.update(self._trees.get(name, ()))
+        return sorted(paths)
+
+    def _read_v2(self, rel: str, values: array):
+        base = self._roots[UNIFIED] + rel
+        data = read_once(f"{base}/cpu.stat")
+        values[CG_CPU] = _stat_value(data, b"\nusage_usec ")
+        values[CG_THROTTLED] = _stat_value(data, b"\nthrottled_usec ")
+        try:
+            data = read_once(f"{base}/io.stat")
+            values[CG_READ], values[CG_WRITE] = _io_bytes(data)
+        except FileNotFoundError:    # io controller not enabled
+            pass
+        # memory files exist only when the parent enables the controller
+        try:
+            data = read_once(f"{base}/memory.stat")
+            for col, key in enumerate(_V2_MEMORY_KEYS, CG_ANON):
+                values[col] = _stat_value(data, key)
+        except FileNotFoundError:
+            return
+        try:
+            values[CG_MEMORY] = int(read_once(f"{base}/memory.current"))
+        except FileNotFoundError:    # the root has only memory.stat
+            values[CG_MEMORY] = values[CG_ANON] + values[CG_FILE]
+
+    def _read_v1(self, rel: str, values: array):
+        trees = self._trees
+        if rel in trees.get("memory", ()):
+            base = self._roots["memory"] + rel
+            values[CG_MEMORY] = int(read_once(f"{base}/memory.usage_in_bytes"))
+            data = read_once(f"{base}/memory.stat")
+            for col, key in enumerate(_V1_MEMORY_KEYS, CG_ANON):
+                values[col] = _stat_value(data, key)
+        if rel in trees.get("cpuacct", ()):
+            usage = read_once(f"{self._roots['cpuacct']}{rel}/cpuacct.usage")
+            values[CG_CPU] = int(usage) // 1000
+        if rel in trees.get("cpu", ()):
+            data = read_once(f"{self._roots['cpu']}{rel}/cpu.stat")
+            values[CG_THROTTLED] = _stat_value(data,
+                                               b"\nthrottled_time ") // 1000
+
+    def read(self, rel: str) -> Optional[array]:
+        """
+        The columns of a cgroup, None if it has gone, that is cpu.stat of
+        v2 or a file of a hierarchy it was walked in is missing.
+        """
+        values = array("q", bytes(8 * _NCOLS))
+        try:
+            if self.version == 2:
+                self._read_v2(rel, values)
+            else:
+                self._read_v1(rel, values)
+        except FileNotFoundError:
+            if rel != "/":
+                return None
+        return values
+
+    def sample(self) -> Dict[str, array]:
+        samples = {}
+        for rel in self.paths:
+            values = self.read(rel)
+            if values is None:
+                self._stale = True
+                continue
+            samples[rel] = values
+        return samples
+
+    def update(self) -> List[CGroupStat]:
+        """Rates since the last update, 0 for new cgroups"""
+        samples = self.sample()
+        now = time.monotonic()
+        secs = max(now - self._last_ts, 1e-9)
+        rows = []
+        zeros = array("q", bytes(8 * _NCOLS))
+        for rel, values in samples.items():
+            last = self._last.get(rel)
+            deltas = zeros if last is None else array(
+                "q", map(operator.sub, values, last))
+            rows.append(
+                CGroupStat(rel, deltas[CG_CPU] / 1e4 / secs,
+                           deltas[CG_THROTTLED] / 1e4 / secs,
+                           values[CG_MEMORY] // 1024,
+                           values[CG_ANON] // 1024, values[CG_FILE] // 1024,
+                           deltas[CG_MAJFLT] / secs,
+                           deltas[CG_READ] / 1024 / secs,
+                           deltas[CG_WRITE] / 1024 / secs))
+        self._last, self._last_ts = samples, now
+        return rows
+
+    def top(self, sort: str = "cpu", top: int = -1) -> List[CGroupStat]:
+        rows = self.update()
+        key = SORT_KEYS[sort]
+        if top > 0:
+            return heapq.nlargest(top, rows, key=key)
+        return sorted(rows, key=key, reverse=True)
@@ -1,13 +1,42 @@
 import sys
 import argparse
-import time
 import logging
 import signal
+from array import array
+from typing import Dict, List, Optional, Union
 from pkg_resources import get_distribution
 
-from xproc import meminfo, vmstat, load, irq
+from xproc import (
+    cgroups,
+    disk,
+    expr,
+    irq,
+    load,
+    meminfo,
+    numa,
+    psi,
+    pss,
+    pstop,
+    slabinfo,
+    softirq,
+    stat,
+    vmstat,
+)
+from xproc.history import History, WindowStats
 from xproc.irq import Interrupts
-from xproc.util import grouper
+from xproc.record import RECORD_SOURCES, Recorder, Recording, replay
+from xproc.sampler import MIN_INTERVAL, SOURCES, Sampler, Scheduler
+from xproc.uptime import current_uptime
+from xproc.util import cpuset_contains, grouper, parse_cpuset
+from xproc.value import (
+    Attr,
+    FloatValue,
+    IntUnitValue,
+    IntValue,
+    StrValue,
+    current_time_attr,
+    set_time_msec,
+)
 
 logger = logging.getLogger("xproc.console")
 
@@ -35,8 +64,17 @@ _CMD_VMSTAT = ["vmstat"]
 _CMD_PS = ["process", "ps"]
 _CMD_VER = ["version"]
 _CMD_LOAD = ["load"]
-# _CMD_SLABINFO = ["slabinfo"]
+_CMD_SLABINFO = ["slabinfo"]
+_CMD_VMALLOC = ["vmalloc"]
+_CMD_CPU = ["cpu"]
+_CMD_SOFTIRQ = ["softirq"]
+_CMD_CGROUP = ["cgroup"]
+_CMD_PSI = ["psi"]
+_CMD_DISK = ["disk"]
 _CMD_INTERRUPT = ["int", "irq"]
+_CMD_MULTI = ["multi"]
+_CMD_RECORD = ["record"]
+_CMD_REPLAY = ["replay"]
 
 
 def _add_ps_parser(sub_parsers):
@@ -44,8 +82,24 @@ def _add_ps_parser(sub_parsers):
 
     ps_parser = sub_parsers.add_parser("process",
                                        aliases=["ps"],
-                                       help="TODO process subcommand")
-    ps_parser.add_argument("-P", "--pid", type=int, required=True, help="PID")
+                                       help="process subcommand")
+    ps_parser.add_argument("-P",
+                           "--pid",
+                           type=int,
+                           action="append",
+                           help="PID, all processes by default")
+    ps_parser.add_argument("-s",
+                           "--sort",
+                           choices=sorted(pstop.SORT_KEYS.keys()),
+                           default="cpu",
+                           help="Sort by")
+    ps_parser.add_argument("-t",
+                           "--top",
+                           type=int,
+                           default=20,
+                           help="Top N processes, -1 for all")
+    ps_parser.add_argument("interval", nargs='?', default=1, type=float)
+    ps_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
 def _add_mem_parser(sub_parsers):
@@ -59,8 +113,17 @@ def _add_mem_parser(sub_parsers):
                             "--extra",
                             action="append",
                             type=str,
-                            help="Append Memory Column")
-    mem_parser.add_argument("interval", nargs='?', default=1, type=int)
+                            help="Append Memory Column, or NAME=expression")
+    mem_parser.add_argument("-w",
+                            "--window",
+                            type=float,
+                            default=0,
+                            help="Show rolling statistics of last N seconds")
+    mem_parser.add_argument("--numa",
+                            action="store_true",
+                            help="Show free/file/anon and numa_* rates per "
+                            "node")
+    mem_parser.add_argument("interval", nargs='?', default=1, type=float)
     mem_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
@@ -74,13 +137,17 @@ def _add_vmstat_parser(sub_parsers):
                                action="append",
                                type=str,
                                help="Append VMStat Column")
-    vmstat_parser.add_argument("interval", nargs='?', default=1, type=int)
+    vmstat_parser.add_argument("-r",
+                               "--rate",
+                               action="store_true",
+                               help="Show counters as per second rates")
+    vmstat_parser.add_argument("interval", nargs='?', default=1, type=float)
     vmstat_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
 def _add_load_parser(sub_parsers):
     load_parser = sub_parsers.add_parser("load", help="vmstat subcommand")
-    load_parser.add_argument("interval", nargs='?', default=1, type=int)
+    load_parser.add_argument("interval", nargs='?', default=1, type=float)
     load_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
@@ -102,6 +169,11 @@ def _add_irq_parser(sub_parsers):
                             action="append",
                             type=str,
                             help="Display specifed cpus,(e.g. 0,2,4-7)+TOTAL")
+    int_parser.add_argument("-H",
+                            "--hot",
+                            type=int,
+                            default=0,
+                            help="Busiest N cpus of the filtered interrupts")
     int_parser.add_argument("-l",
                             "--list",
                             action="store_true",
@@ -111,28 +183,215 @@ def _add_irq_parser(sub_parsers):
                             type=int,
                             default=-1,
                             help="Top N interrupts")
-    int_parser.add_argument("interval", nargs='?', default=1, type=int)
+    int_parser.add_argument("interval", nargs='?', default=1, type=float)
     int_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
-# def _add_slab_parser(sub_parsers):
-#     slab_parser = sub_parsers.add_parser("slabinfo",
-#                                          help="slabinfo subcommand")
-#     slab_parser.add_argument("--sort",
-#                              "-s",
-#                              type=str,
-#                              choices=["a", "o", "v", "l", "s"],
-#                              help="""
-#                                 a: active_objs
-#                                 o: num_objs
-#                                 v: active_slabs
-#                                 l: num_slabs
-#                                 s: objsize
-#                              """)
-#     slab_parser.add_argument("--top",
-#                              type=int,
-#                              default=10,
-#                              help="Top N(default=10)")
+def _add_multi_parser(sub_parsers):
+    multi_parser = sub_parsers.add_parser(
+        "multi", help="sample several sources on the same tick")
+    multi_parser.add_argument("sources",
+                              type=str,
+                              help="Comma separated sources, "
+                              f"choices: {','.join(SOURCES.keys())}")
+    multi_parser.add_argument("interval", nargs='?', default=1, type=float)
+    multi_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_record_parser(sub_parsers):
+    record_parser = sub_parsers.add_parser(
+        "record", help="record sources into a binary file")
+    record_parser.add_argument("-o",
+                               "--output",
+                               type=str,
+                               required=True,
+                               help="Recording file")
+    record_parser.add_argument("-z",
+                               "--compress",
+                               action="store_true",
+                               help="Compress rows with zlib")
+    record_parser.add_argument("sources",
+                               type=str,
+                               help="Comma separated sources, "
+                               f"choices: {','.join(RECORD_SOURCES.keys())}")
+    record_parser.add_argument("interval", nargs='?', default=1, type=float)
+    record_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_replay_parser(sub_parsers):
+    replay_parser = sub_parsers.add_parser("replay",
+                                           help="replay a recording file")
+    replay_parser.add_argument("file", type=str, help="Recording file")
+    replay_parser.add_argument("view",
+                               nargs='?',
+                               type=str,
+                               help="View of a recorded source, "
+                               "default is the first one")
+    replay_parser.add_argument("-e",
+                               "--extra",
+                               action="append",
+                               type=str,
+                               help="Append Column of mem/vmstat views")
+    replay_parser.add_argument("-t",
+                               "--top",
+                               type=int,
+                               default=10,
+                               help="Top N interrupts of irq view")
+    replay_parser.add_argument("-s",
+                               "--start",
+                               type=float,
+                               default=0,
+                               help="Seconds since the beginning, "
+                               "negative from the end")
+    replay_parser.add_argument("-c",
+                               "--count",
+                               type=int,
+                               default=-1,
+                               help="Number of rows")
+
+
+def _add_slab_parser(sub_parsers):
+    slab_parser = sub_parsers.add_parser("slabinfo",
+                                         help="slabinfo subcommand")
+    slab_parser.add_argument("--sort",
+                             "-s",
+                             type=str,
+                             default="o",
+                             choices=["a", "b", "c", "l", "v", "n", "o", "p",
+                                      "s", "u"],
+                             help="""
+                                a: active_objs
+                                b: objperslab
+                                c: cache size
+                                l: num_slabs
+                                v: active_slabs
+                                n: name
+                                o: num_objs
+                                p: pagesperslab
+                                s: objsize
+                                u: utilization
+                             """)
+    slab_parser.add_argument("--top",
+                             "-t",
+                             type=int,
+                             default=10,
+                             help="Top N(default=10)")
+    slab_parser.add_argument("--growth",
+                             "-g",
+                             action="store_true",
+                             help="Sort by growth of num_objs * objsize")
+    slab_parser.add_argument("interval", nargs='?', default=1, type=float)
+    slab_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_vmalloc_parser(sub_parsers):
+    vmalloc_parser = sub_parsers.add_parser("vmalloc",
+                                            help="vmallocinfo subcommand")
+    vmalloc_parser.add_argument("--top",
+                                "-t",
+                                type=int,
+                                default=10,
+                                help="Top N callers by size(default=10)")
+    vmalloc_parser.add_argument("interval", nargs='?', default=1, type=float)
+    vmalloc_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_cpu_parser(sub_parsers):
+    cpu_parser = sub_parsers.add_parser("cpu", help="cpu subcommand")
+    cpu_parser.add_argument("-a",
+                            "--all",
+                            action="store_true",
+                            help="Show every cpu")
+    cpu_parser.add_argument("-c",
+                            "--cpus",
+                            action="append",
+                            type=str,
+                            help="Display specifed cpus,(e.g. 0,2,4-7)")
+    cpu_parser.add_argument("interval", nargs='?', default=1, type=float)
+    cpu_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_softirq_parser(sub_parsers):
+    softirq_parser = sub_parsers.add_parser("softirq",
+                                            help="softirq subcommand")
+    softirq_parser.add_argument("-a",
+                                "--all",
+                                action="store_true",
+                                help="Show every cpu")
+    softirq_parser.add_argument("-f",
+                                "--filter",
+                                action="append",
+                                type=str,
+                                help="Filter softirq, e.g. NET_RX")
+    softirq_parser.add_argument("-c",
+                                "--cpus",
+                                action="append",
+                                type=str,
+                                help="Display specifed cpus,(e.g. 0,2,4-7)")
+    softirq_parser.add_argument("-H",
+                                "--hot",
+                                type=int,
+                                default=3,
+                                help="Busiest N cpus of every softirq")
+    softirq_parser.add_argument("interval", nargs='?', default=1, type=float)
+    softirq_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_cgroup_parser(sub_parsers):
+    cgroup_parser = sub_parsers.add_parser("cgroup", help="cgroup subcommand")
+    cgroup_parser.add_argument("-s",
+                               "--sort",
+                               choices=sorted(cgroups.SORT_KEYS.keys()),
+                               default="cpu",
+                               help="Sort by")
+    cgroup_parser.add_argument("-t",
+                               "--top",
+                               type=int,
+                               default=20,
+                               help="Top N cgroups, -1 for all")
+    cgroup_parser.add_argument("interval", nargs='?', default=1, type=float)
+    cgroup_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_psi_parser(sub_parsers):
+    psi_parser = sub_parsers.add_parser("psi", help="psi subcommand")
+    psi_parser.add_argument("-r",
+                            "--resource",
+                            action="append",
+                            type=str,
+                            help="cpu, memory or io, all by default")
+    psi_parser.add_argument(
+        "-T",
+        "--trigger",
+        action="append",
+        type=str,
+        help="Wait for RESOURCE:KIND:STALL_MS:WINDOW_MS, "
+        "e.g. memory:some:150:2000, count is then the number of events")
+    psi_parser.add_argument("interval", nargs='?', default=1, type=float)
+    psi_parser.add_argument("count", nargs='?', default=-1, type=int)
+
+
+def _add_disk_parser(sub_parsers):
+    disk_parser = sub_parsers.add_parser("disk", help="disk subcommand")
+    disk_parser.add_argument("-f",
+                             "--filter",
+                             action="append",
+                             type=str,
+                             help="Filter device, e.g. sda,nvme0n1")
+    disk_parser.add_argument("-p",
+                             "--partitions",
+                             action="store_true",
+                             help="Show partitions")
+    disk_parser.add_argument("-D",
+                             "--no-dm",
+                             action="store_true",
+                             help="Hide device mapper devices")
+    disk_parser.add_argument("-z",
+                             "--hide-idle",
+                             action="store_true",
+                             help="Hide devices without io in the interval")
+    disk_parser.add_argument("interval", nargs='?', default=1, type=float)
+    disk_parser.add_argument("count", nargs='?', default=-1, type=int)
 
 
 def parse_argv() -> argparse.Namespace:
@@ -145,6 +404,16 @@ def parse_argv() -> argparse.Namespace:
     _add_vmstat_parser(sub_parsers)
     _add_load_parser(sub_parsers)
     _add_irq_parser(sub_parsers)
+    _add_multi_parser(sub_parsers)
+    _add_record_parser(sub_parsers)
+    _add_replay_parser(sub_parsers)
+    _add_slab_parser(sub_parsers)
+    _add_vmalloc_parser(sub_parsers)
+    _add_cpu_parser(sub_parsers)
+    _add_softirq_parser(sub_parsers)
+    _add_cgroup_parser(sub_parsers)
+    _add_psi_parser(sub_parsers)
+    _add_disk_parser(sub_parsers)
     try:
         parsed = argv.parse_args()
     except Exception:
@@ -169,43 +438,197 @@ def show_version():
     print(get_distribution('xproc'))
 
 
-def should_print_header(loop: int, interval: int) -> bool:
+def should_print_header(loop: int, interval: float) -> bool:
     if loop == 0:
         return True
-    if loop % (interval * 10) == 0:
+    # every ten seconds, but not more often than every ten rows
+    if loop % max(int(10 / interval), 10) == 0:
         return True
     return False
 
 
+def report_overrun(scheduler: Scheduler):
+    logger.warning("# overrun: tick took %.3fs, interval %.3fs, %d/%d overrun",
+                   scheduler.elapsed, scheduler.interval, scheduler.overruns,
+                   scheduler.loop)
+
+
+def ticks(interval: float, count: int) -> Scheduler:
+    set_time_msec(interval < 1)
+    return Scheduler(interval, count, report_overrun)
+
+
+def show_rows(loop: int, interval: float, rows: List[List[Attr]]):
+    if not rows:
+        return
+    strs = [[str(attr.value) for attr in attrs] for attrs in rows]
+    names = [attr.name for attr in rows[0]]
+    widths = [max(len(name), 12) for name in names]
+    for vals in strs:
+        widths = [max(width, len(val)) for width, val in zip(widths, vals)]
+    if should_print_header(loop, interval):
+        logger.info(" ".join(
+            [f"{name:>{width}s}" for name, width in zip(names, widths)]))
+    for vals in strs:
+        logger.info(" ".join(
+            [f"{val:>{width}s}" for val, width in zip(vals, widths)]))
+
+
+def show_attrs(loop: int, interval: float, attrs: List[Attr]):
+    show_rows(loop, interval, [attrs])
+
+
+def _window_stats_attrs(name: str, unit: str,
+                        stats: WindowStats) -> List[Attr]:
+    vals = [("CUR", stats.last), ("MIN", stats.min), ("MAX", stats.max),
+            ("MEAN", int(round(stats.mean))), ("P95", stats.p95),
+            ("P99", stats.p99)]
+    attrs = [Attr("FIELD", StrValue(name))]
+    for col, val in vals:
+        value = IntUnitValue(val, unit) if unit else IntValue(val)
+        attrs.append(Attr(col, value))
+    return attrs
+
+
+def show_memory_window(window: float,
+                       interval: float,
+                       count: int,
+                       names: List[str],
+                       aggregator: Optional[pss.PssAggregator] = None):
+    names = names or [
+        meminfo.KERNEL, meminfo.USER, meminfo.MEMFREE, meminfo.MEMTOTAL
+    ]
+    store = None
+    for loop in ticks(interval, count):
+        total_pss = aggregator.total() if aggregator else None
+        snapshot = meminfo.MemoryInfo(pss=total_pss).snapshot
+        if store is None:
+            store = History(snapshot.schema, int(window / interval) + 1)
+        store.append(snapshot)
+        stats = store.stats(names, window)
+        time_attr = current_time_attr()
+        rows = []
+        for name in names:
+            idx = store.schema.get_index(name)
+            if idx < 0:
+                continue
+            rows.append([time_attr] + _window_stats_attrs(
+                name, store.schema.units[idx], stats[name]))
+        show_rows(loop, interval, rows)
+
+
+def _memory_attrs(info: meminfo.MemoryInfo,
+                  columns: List[Union[str, expr.Expr]]) -> List[Attr]:
+    """Columns are field names or derived expressions"""
+    names = [column for column in columns if isinstance(column, str)]
+    if len(names) == len(columns):
+        return info.get_attrs(names)
+    attrs = [current_time_attr()]
+    for column in columns:
+        if isinstance(column, expr.Expr):
+            attrs.append(column.attr(info.snapshot))
+        elif column in info.snapshot:
+            attrs.append(info.get_attr(column))
+    return attrs
+
+
+_NUMA_GAUGES = [meminfo.MEMFREE, numa.FILEPAGES, meminfo.ANONPAGES]
+_NUMA_TITLES = [("ΔFree", "ΔFile", "ΔAnon"),
+                ("HIT/s", "MISS/s", "FOREIGN/s")]
+
+
+def _numa_attrs(time_attr: Attr, node: str, gauges: List[int],
+                deltas: List[int], rates: List[float]) -> List[Attr]:
+    attrs = [time_attr, Attr("NODE", StrValue(node))]
+    for name, value in zip(_NUMA_GAUGES, gauges):
+        attrs.append(Attr(name, IntUnitValue(value, "kB")))
+    for name, value in zip(_NUMA_TITLES[0], deltas):
+        attrs.append(Attr(name, IntUnitValue(value, "kB")))
+    for name, value in zip(_NUMA_TITLES[1], rates):
+        attrs.append(Attr(name, IntValue(int(value))))
+    return attrs
+
+
+def show_memory_numa(interval: float, count: int):
+    with numa.NumaReader() as reader:
+        if not reader.nodes:
+            logger.error("No NUMA node in %s", numa.NODE_ROOT)
+            return
+        # the first rates are since boot
+        boot_secs = current_uptime().since_boot_in_seconds
+        last = None
+        for _ in ticks(interval, count):
+            matrix = reader.read()
+            if last is None:
+                deltas = array("q", bytes(8 * len(matrix.values)))
+                counters, elapsed = matrix.values, boot_secs
+            else:
+                deltas = matrix.delta(last)
+                counters, elapsed = deltas, matrix.ts - last.ts
+            per_sec = 1 / max(elapsed, 1e-9)
+            gauges = [matrix.column(name) for name in _NUMA_GAUGES]
+            changes = [matrix.column(name, deltas) for name in _NUMA_GAUGES]
+            events = [
+                matrix.column(name, counters) for name in numa.NUMA_COUNTERS
+            ]
+            time_attr = current_time_attr()
+            rows = []
+            for idx, node in enumerate(matrix.nodes):
+                rows.append(
+                    _numa_attrs(time_attr, str(node),
+                                [col[idx] for col in gauges],
+                                [col[idx] for col in changes],
+                                [col[idx] * per_sec for col in events]))
+            rows.append(
+                _numa_attrs(time_attr, "all", [sum(col) for col in gauges],
+                            [sum(col) for col in changes],
+                            [sum(col) * per_sec for col in events]))
+            # a table per tick
+            show_rows(0, interval, rows)
+            logger.info("")
+            last = matrix
+
+
 def show_memory(option: argparse.Namespace):
     logger.debug("%s", option)
     if option.list:
         return list_memory_available_column_names()
     count = option.count
-    interval = max(option.interval, 1)
+    interval = max(option.interval, MIN_INTERVAL)
     extras = []
     if option.extra:
         for item in option.extra:
             extras.extend([i.strip() for i in item.split(",")])
-    loop = 0
-    while count != 0:
-        count -= 1
-        try:
-            minfo = meminfo.MemoryInfo()
-            attrs = minfo.get_attrs(extras)
-            title, data = [], []
-            for attr in attrs:
-                name, value = attr.name, attr.value
-                val_str = str(value)
-                width = max(len(name), len(val_str), 12)
-                title.append(f"{name:>{width}s}")
-                data.append(f"{val_str:>{width}s}")
-            if should_print_header(loop, interval):
-                logger.info(" ".join(title))
-            logger.info(" ".join(data))
-        finally:
-            loop += 1
-            time.sleep(interval)
+    if option.numa:
+        return show_memory_numa(interval, count)
+    try:
+        columns = [
+            expr.parse_definition(item) if "=" in item else item
+            for item in extras
+        ]
+    except expr.ExprError as err:
+        logger.error("%s", err)
+        return
+    derived = [column for column in columns if isinstance(column, expr.Expr)]
+    if derived and option.window > 0:
+        logger.error("derived columns are not supported with --window: %s",
+                     ", ".join(column.name for column in derived))
+        return
+    # USER_PSS may be asked for only inside an expression
+    needed = set(extras)
+    for column in derived:
+        needed.update(column.fields)
+    aggregator = pss.PssAggregator() if meminfo.USER_PSS in needed else None
+    if option.window > 0:
+        return show_memory_window(option.window, interval, count, extras,
+                                  aggregator)
+    try:
+        for loop in ticks(interval, count):
+            total_pss = aggregator.total() if aggregator else None
+            info = meminfo.MemoryInfo(pss=total_pss)
+            show_attrs(loop, interval, _memory_attrs(info, columns))
+    except expr.ExprError as err:
+        logger.error("%s", err)
 
 
 def show_vmstat(option: argparse.Namespace):
@@ -213,62 +636,158 @@ def show_vmstat(option: argparse.Namespace):
     if option.list:
         return list_vmstat_available_column_names()
     count = option.count
-    interval = max(option.interval, 1)
+    interval = max(option.interval, MIN_INTERVAL)
     extras = []
     if option.extra:
         for item in option.extra:
             extras.extend([i.strip() for i in item.split(",")])
     else:
         extras.extend(vmstat.list_default_vmstat_names())
-    loop = 0
-    while count != 0:
-        count -= 1
-        try:
-            attrs = vmstat.VMStat().get_attrs(*extras)
-            title, data = [], []
-            for attr in attrs:
-                name, value = attr.name, attr.value
-                val_str = str(value)
-                width = max(len(name), len(val_str), 12)
-                title.append(f"{name:>{width}s}")
-                data.append(f"{val_str:>{width}s}")
-            if should_print_header(loop, interval):
-                logger.info(" ".join(title))
-            logger.info(" ".join(data))
-        finally:
-            loop += 1
-            time.sleep(interval)
+    rate = vmstat.VMStatRate(extras) if option.rate else None
+    for loop in ticks(interval, count):
+        stat = vmstat.VMStat()
+        if rate:
+            attrs = rate.get_attrs(stat)
+        else:
+            attrs = stat.get_attrs(*extras)
+        show_attrs(loop, interval, attrs)
 
 
 def show_load(option: argparse.Namespace):
     logger.debug("%s", option)
     count = option.count
-    interval = max(option.interval, 1)
-    loop = 0
-    while count != 0:
-        count -= 1
-        try:
-            attrs = load.current_loadavg().get_attrs()
-            title, data = [], []
-            for attr in attrs:
-                name, value = attr.name, attr.value
-                val_str = str(value)
-                width = max(len(name), len(val_str), 12)
-                title.append(f"{name:>{width}s}")
-                data.append(f"{val_str:>{width}s}")
-            if should_print_header(loop, interval):
-                logger.info(" ".join(title))
-            logger.info(" ".join(data))
-        finally:
-            loop += 1
-            time.sleep(interval)
-
-
-# def show_slabinfo(option: argparse.Namespace):
-#     logger.debug("%s", option)
-#     sort_by = option.sort
-#     top_n = option.top
-#     slab_info = slabinfo.current_slabinfo()
+    interval = max(option.interval, MIN_INTERVAL)
+    for loop in ticks(interval, count):
+        show_attrs(loop, interval, load.current_loadavg().get_attrs())
+
+
+def _slab_attrs(slab: slabinfo.Slab,
+                growth: Optional[int] = None) -> List[Attr]:
+    attrs = [
+        Attr("OBJS", IntValue(slab.num_objs)),
+        Attr("ACTIVE", IntValue(slab.active_objs)),
+        Attr("USE", IntUnitValue(slab.use, "%")),
+        Attr("OBJ_SIZE", IntUnitValue(slab.objsize, "B")),
+        Attr("SLABS", IntValue(slab.num_slabs)),
+        Attr("OBJ/SLAB", IntValue(slab.objperslab)),
+        Attr("CACHE_SIZE", IntUnitValue(slab.cache_size // 1024, "kB")),
+    ]
+    if growth is not None:
+        attrs.append(Attr("GROWTH", IntUnitValue(growth, "B")))
+    attrs.append(Attr("NAME", StrValue(slab.name)))
+    return attrs
+
+
+def show_slabinfo(option: argparse.Namespace):
+    logger.debug("%s", option)
+    sort_by = option.sort
+    top_n = option.top
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    last = None
+    if option.growth:
+        # the first tick only primes the growth
+        last = slabinfo.current_slabinfo()
+        count = count + 1 if count > 0 else count
+    for loop in ticks(interval, count):
+        if option.growth and loop == 0:
+            continue
+        slab_info = slabinfo.current_slabinfo()
+        logger.info("%s %s %s %s %s", current_time_attr(),
+                    slab_info.active_objs(), slab_info.num_objs(),
+                    slab_info.active_slabs(), slab_info.num_slabs())
+        if last is not None:
+            rows = [
+                _slab_attrs(slab, growth)
+                for slab, growth in slab_info.growth(last, top_n)
+            ]
+            last = slab_info
+        else:
+            rows = [
+                _slab_attrs(slab)
+                for slab in slab_info.sorted_slabs(sort_by, top_n)
+            ]
+        # a table per tick
+        show_rows(0, interval, rows)
+        logger.info("")
+
+
+def show_vmalloc(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    for _ in ticks(interval, count):
+        summary = meminfo.current_vmalloc_summary()
+        nodes = " ".join([
+            f"{node}:{pages}" for node, pages in sorted(summary.nodes.items())
+        ])
+        logger.info("%s AREAS:%d SIZE:%dkB PAGES:%d UNPURGED:%dkB %s",
+                    current_time_attr(), summary.count,
+                    summary.size_in_bytes // 1024, summary.pages,
+                    summary.unpurged_in_bytes // 1024, nodes)
+        rows = [[
+            Attr("AREAS", IntValue(stat.count)),
+            Attr("SIZE", IntUnitValue(stat.size_in_bytes // 1024, "kB")),
+            Attr("PAGES", IntValue(stat.pages)),
+            Attr("CALLER", StrValue(stat.caller)),
+        ] for stat in summary.top(option.top)]
+        # a table per tick
+        show_rows(0, interval, rows)
+        logger.info("")
+
+
+# (column, index in /proc/stat cpu line)
+_CPU_COLUMNS = [("%USR", 0), ("%NICE", 1), ("%SYS", 2), ("%IOWAIT", 4),
+                ("%IRQ", 5), ("%SOFT", 6), ("%STEAL", 7), ("%IDLE", 3)]
+
+
+def _cpu_attrs(time_attr: Attr, cpu: int, percents: List[float]) -> List[Attr]:
+    attrs = [time_attr, Attr("CPU", StrValue(str(cpu) if cpu >= 0 else "all"))]
+    for name, idx in _CPU_COLUMNS:
+        value = FloatValue(percents[idx])
+        value.fmt = "{0:.2f}"
+        attrs.append(Attr(name, value))
+    return attrs
+
+
+def _parse_cpus(items: Optional[List[str]]) -> Optional[int]:
+    """Bitmap of the -c cpu lists, None without -c"""
+    if not items:
+        return None
+    cpus = 0
+    try:
+        for item in items:
+            cpus |= parse_cpuset(item)
+    except ValueError as ex:
+        logger.error("%s", ex)
+        sys.exit(1)
+    return cpus
+
+
+def show_cpu(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    cpus = _parse_cpus(option.cpus)
+    last = None
+    for loop in ticks(interval, count):
+        now = stat.current_cpu_times()
+        # the first tick is the usage since boot
+        usage = stat.CpuUsage(now, last)
+        last = now
+        time_attr = current_time_attr()
+        rows = []
+        for idx, cpu in enumerate(usage.cpu_ids):
+            if cpu >= 0 and not option.all and (
+                    cpus is None or not cpuset_contains(cpus, cpu)):
+                continue
+            rows.append(_cpu_attrs(time_attr, cpu, usage.percents(idx)))
+        if len(rows) > 1:
+            # a table per tick
+            show_rows(0, interval, rows)
+            logger.info("")
+        else:
+            show_rows(loop, interval, rows)
 
 
 def list_irq_label(ints: Interrupts):
@@ -283,29 +802,307 @@ def list_irq_label(ints: Interrupts):
 
 def show_irq(option: argparse.Namespace):
     logger.debug("%s", option)
-    last_irqs = irq.get()
     if option.list:
-        return list_irq_label(last_irqs)
+        return list_irq_label(irq.get())
     count = option.count
-    interval = max(option.interval, 1)
-    # TODO: top > filter == cpus > all ? 合理吗
-    # TODO:找到哪个中断最多
-    # TODO:滤某个中断
-    # TODO:过滤某个中断，哪个核心最多
+    interval = max(option.interval, MIN_INTERVAL)
     top = option.top
-    # cpus = option.cpus
-    # fitler = option.filter
-    # all = option.all
-    # cpu_cnt = cpu_count()
-    while count != 0:
-        count -= 1
-        time.sleep(interval)
-        now_irqs = irq.get()
-        delta_irqs = now_irqs.sub(last_irqs)
-        last_irqs = now_irqs
-        if top > 0:
+    filters = []
+    if option.filter:
+        for item in option.filter:
+            filters.extend([i.strip() for i in item.split(",") if i.strip()])
+    cpus = _parse_cpus(option.cpus)
+    view = None
+    if filters or cpus is not None or option.all or option.hot > 0:
+        view = irq.IrqView(filters, cpus, option.all)
+    elif top <= 0:
+        view = irq.IrqView()
+    engine = irq.IrqDeltaEngine()
+    # the first tick only primes the engine
+    for loop in ticks(interval, count + 1 if count > 0 else count):
+        if loop == 0:
+            continue
+        delta_irqs = engine.update()
+        if view is None:
             irq.show_top(top, interval, logger, delta_irqs)
+        elif option.hot > 0:
+            irq.show_hot(view, option.hot, logger, delta_irqs)
+        else:
+            irq.show_view(view, top, logger, delta_irqs)
+
+
+def _process_attrs(time_attr: Attr, row: pstop.ProcessRow) -> List[Attr]:
+    cpu = FloatValue(row.cpu)
+    cpu.fmt = "{0:.1f}"
+    return [
+        time_attr,
+        Attr("PID", IntValue(row.pid)),
+        Attr("UID", StrValue(row.uid)),
+        Attr("CPU%", cpu),
+        Attr("RSS", IntUnitValue(row.rss, "kB")),
+        Attr("CTXSW/s", IntValue(int(row.ctxsw))),
+        Attr("MAJFLT/s", IntValue(int(row.majflt))),
+        Attr("CPUS", StrValue(row.cpus)),
+        Attr("NAME", StrValue(row.name)),
+    ]
+
+
+def show_ps(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    monitor = pstop.ProcessTop(option.pid)
+    for _ in ticks(interval, count):
+        rows = monitor.top(option.sort, option.top)
+        time_attr = current_time_attr()
+        # a table per tick
+        show_rows(0, interval, [_process_attrs(time_attr, r) for r in rows])
+        logger.info("")
+
+
+def _softirq_attrs(time_attr: Attr,
+                   softirq_stat: softirq.SoftirqStat) -> List[Attr]:
+    ratio = FloatValue(softirq_stat.imbalance)
+    ratio.fmt = "{0:.2f}"
+    hot = " ".join(
+        [f"{cpu}:{int(rate)}" for cpu, rate in softirq_stat.hot])
+    return [
+        time_attr,
+        Attr("SOFTIRQ", StrValue(softirq_stat.name)),
+        Attr("RATE", IntValue(int(softirq_stat.rate))),
+        Attr("IMBALANCE", ratio),
+        Attr("HOT(CPU:RATE)", StrValue(hot)),
+    ]
+
+
+def show_softirq(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    filters = []
+    if option.filter:
+        for item in option.filter:
+            filters.extend([i.strip() for i in item.split(",") if i.strip()])
+    cpus = _parse_cpus(option.cpus)
+    view = irq.IrqView(filters, cpus, option.all)
+    engine = softirq.engine()
+    # the first tick only primes the engine
+    for loop in ticks(interval, count + 1 if count > 0 else count):
+        if loop == 0:
+            continue
+        delta = engine.update()
+        if cpus is not None or option.all:
+            irq.show_view(view, -1, logger, delta)
             continue
+        time_attr = current_time_attr()
+        rows = view.rows(delta)
+        stats = softirq.summarize(delta, option.hot)
+        show_rows(0, interval,
+                  [_softirq_attrs(time_attr, stats[row]) for row in rows])
+        logger.info("")
+
+
+def _cgroup_attrs(time_attr: Attr, row: cgroups.CGroupStat) -> List[Attr]:
+    cpu = FloatValue(row.cpu)
+    cpu.fmt = "{0:.1f}"
+    throttled = FloatValue(row.throttled)
+    throttled.fmt = "{0:.1f}"
+    return [
+        time_attr,
+        Attr("CPU%", cpu),
+        Attr("THROTTLED%", throttled),
+        Attr("MEM", IntUnitValue(row.memory, "kB")),
+        Attr("ANON", IntUnitValue(row.anon, "kB")),
+        Attr("FILE", IntUnitValue(row.file, "kB")),
+        Attr("MAJFLT/s", IntValue(int(row.majflt))),
+        Attr("READ/s", IntUnitValue(int(row.read), "kB")),
+        Attr("WRITE/s", IntUnitValue(int(row.write), "kB")),
+        Attr("CGROUP", StrValue(row.path)),
+    ]
+
+
+def show_cgroup(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    monitor = cgroups.CGroupMonitor()
+    # the first tick only primes the monitor
+    for loop in ticks(interval, count + 1 if count > 0 else count):
+        rows = monitor.top(option.sort, option.top)
+        if loop == 0:
+            continue
+        time_attr = current_time_attr()
+        # a table per tick
+        show_rows(0, interval, [_cgroup_attrs(time_attr, r) for r in rows])
+        logger.info("")
+
+
+def _psi_attrs(time_attr: Attr, label: Attr, pressure: psi.Pressure,
+               stall: Dict[str, float]) -> List[Attr]:
+    attrs = [time_attr, label]
+    for kind, line in ((psi.SOME, pressure.some), (psi.FULL, pressure.full)):
+        title = kind.upper()
+        for name, val in ((f"{title}10", line.avg10),
+                          (f"{title}60", line.avg60),
+                          (f"{title}%", stall[kind])):
+            value = FloatValue(val)
+            value.fmt = "{0:.2f}"
+            attrs.append(Attr(name, value))
+    return attrs
+
+
+def show_psi_trigger(texts: List[str], count: int):
+    try:
+        triggers = [psi.parse_trigger(text) for text in texts]
+    except (OSError, ValueError) as ex:
+        logger.error("%s", ex)
+        sys.exit(1)
+    set_time_msec(True)
+    with psi.PsiMonitor(triggers) as monitor:
+        # the stall% is since the last event of a trigger, or since boot
+        last: Dict[int, psi.Pressure] = {}
+        events = 0
+        while count < 0 or events < count:
+            for trigger in monitor.wait():
+                pressure = trigger.read()
+                stall = pressure.stall(last.get(trigger.fileno()))
+                last[trigger.fileno()] = pressure
+                label = Attr("TRIGGER", StrValue(str(trigger)))
+                show_attrs(
+                    events, 1,
+                    _psi_attrs(current_time_attr(), label, pressure, stall))
+                events += 1
+
+
+def show_psi(option: argparse.Namespace):
+    logger.debug("%s", option)
+    if not psi.supported():
+        logger.error("No %s, PSI needs Linux 4.20+", psi.PRESSURE_ROOT)
+        sys.exit(1)
+    if option.trigger:
+        return show_psi_trigger(option.trigger, option.count)
+    resources = []
+    if option.resource:
+        for item in option.resource:
+            resources.extend([i.strip() for i in item.split(",")])
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    with psi.PressureReader(resources or psi.RESOURCES) as reader:
+        # the first stall% is since boot
+        last: Dict[str, psi.Pressure] = {}
+        for _ in ticks(interval, count):
+            time_attr = current_time_attr()
+            rows = []
+            for pressure in reader.read():
+                stall = pressure.stall(last.get(pressure.resource))
+                last[pressure.resource] = pressure
+                label = Attr("RESOURCE", StrValue(pressure.resource))
+                rows.append(_psi_attrs(time_attr, label, pressure, stall))
+            # a table per tick
+            show_rows(0, interval, rows)
+            logger.info("")
+
+
+_DISK_COLUMNS = [
+    "R/s", "W/s", "RKB/s", "WKB/s", "R_AWAIT", "W_AWAIT", "AQU-SZ", "UTIL%"
+]
+
+
+def _disk_attrs(time_attr: Attr, disk_stat: disk.DiskStat) -> List[Attr]:
+    attrs = [time_attr, Attr("DEVICE", StrValue(disk_stat.name))]
+    for name, val in zip(_DISK_COLUMNS, disk_stat[1:]):
+        value = FloatValue(val)
+        value.fmt = "{0:.2f}"
+        attrs.append(Attr(name, value))
+    return attrs
+
+
+def show_disk(option: argparse.Namespace):
+    logger.debug("%s", option)
+    count = option.count
+    interval = max(option.interval, MIN_INTERVAL)
+    filters = []
+    if option.filter:
+        for item in option.filter:
+            filters.extend([i.strip() for i in item.split(",") if i.strip()])
+    view = disk.DiskView(filters, option.partitions, not option.no_dm)
+    with disk.DiskStatsEngine() as engine:
+        # the first tick only primes the engine
+        for loop in ticks(interval, count + 1 if count > 0 else count):
+            if loop == 0:
+                continue
+            delta = engine.update()
+            stats = delta.stats(view.rows(delta.names))
+            if option.hide_idle:
+                stats = [s for s in stats if s.rps or s.wps or s.util]
+            time_attr = current_time_attr()
+            show_rows(loop - 1, interval,
+                      [_disk_attrs(time_attr, s) for s in stats])
+
+
+def show_multi(option: argparse.Namespace):
+    logger.debug("%s", option)
+    sampler = Sampler()
+    for name in option.sources.split(","):
+        name = name.strip()
+        if name not in SOURCES:
+            logger.error("Unknown source: %s, choices: %s", name,
+                         ",".join(SOURCES.keys()))
+            sys.exit(1)
+        sampler.register(name)
+    interval = max(option.interval, MIN_INTERVAL)
+    for loop in ticks(interval, option.count):
+        show_attrs(loop, interval, sampler.sample())
+
+
+def show_record(option: argparse.Namespace):
+    logger.debug("%s", option)
+    sources = []
+    for name in option.sources.split(","):
+        name = name.strip()
+        if name not in RECORD_SOURCES:
+            logger.error("Unknown source: %s, choices: %s", name,
+                         ",".join(RECORD_SOURCES.keys()))
+            sys.exit(1)
+        sources.append(RECORD_SOURCES[name]())
+    interval = max(option.interval, MIN_INTERVAL)
+    with Recorder(option.output, sources, interval,
+                  option.compress) as recorder:
+        for _ in Scheduler(interval, option.count, report_overrun):
+            recorder.record()
+
+
+def show_replay(option: argparse.Namespace):
+    logger.debug("%s", option)
+    names = []
+    if option.extra:
+        for item in option.extra:
+            names.extend([i.strip() for i in item.split(",")])
+    try:
+        recording = Recording(option.file)
+    except (OSError, ValueError) as ex:
+        logger.error("%s", ex)
+        sys.exit(1)
+    with recording:
+        if not recording:
+            return
+        view = option.view or next(iter(recording.sources))
+        start = 0
+        if option.start > 0:
+            start = recording.find(recording.ts(0) + option.start)
+        elif option.start < 0:
+            start = recording.find(
+                recording.ts(len(recording) - 1) + option.start)
+        interval = recording.interval
+        set_time_msec(interval < 1)
+        try:
+            tables = replay(recording, view, names, option.top, start,
+                            option.count)
+        except ValueError as ex:
+            logger.error("%s", ex)
+            sys.exit(1)
+        for loop, rows in enumerate(tables):
+            show_rows(loop, interval, rows)
 
 
 def main():
@@ -316,7 +1113,7 @@ def main():
     if command in _CMD_VER:
         show_version()
     elif command in _CMD_PS:
-        pass
+        show_ps(namespace)
     elif command in _CMD_MEM:
         show_memory(namespace)
     elif command in _CMD_VMSTAT:
@@ -325,5 +1122,23 @@ def main():
         show_load(namespace)
     elif command in _CMD_INTERRUPT:
         show_irq(namespace)
-    # elif command in _CMD_SLABINFO:
-    #     show_slabinfo(namespace)
+    elif command in _CMD_MULTI:
+        show_multi(namespace)
+    elif command in _CMD_RECORD:
+        show_record(namespace)
+    elif command in _CMD_REPLAY:
+        show_replay(namespace)
+    elif command in _CMD_SLABINFO:
+        show_slabinfo(namespace)
+    elif command in _CMD_VMALLOC:
+        show_vmalloc(namespace)
+    elif command in _CMD_CPU:
+        show_cpu(namespace)
+    elif command in _CMD_SOFTIRQ:
+        show_softirq(namespace)
+    elif command in _CMD_CGROUP:
+        show_cgroup(namespace)
+    elif command in _CMD_PSI:
+        show_psi(namespace)
+    elif command in _CMD_DISK:
+        show_disk(namespace)
@@ -0,0 +1,235 @@
+import os
+import time
+import operator
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from xproc.procfile import ProcFileReader
+
+DISKSTATS_PATH = "/proc/diskstats"
+SYS_BLOCK = "/sys/class/block"
+
+# columns after major, minor and name, 11 before 4.18, 15 before 5.5
+READS = 0
+READ_MERGES = 1
+READ_SECTORS = 2
+READ_TICKS = 3    # ms
+WRITES = 4
+WRITE_MERGES = 5
+WRITE_SECTORS = 6
+WRITE_TICKS = 7    # ms
+IN_FLIGHT = 8    # gauge
+IO_TICKS = 9    # ms
+TIME_IN_QUEUE = 10    # weighted ms
+DISCARDS = 11
+DISCARD_MERGES = 12
+DISCARD_SECTORS = 13
+DISCARD_TICKS = 14
+FLUSHES = 15
+FLUSH_TICKS = 16
+NFIELDS = 17
+
+# diskstats counts 512 byte sectors whatever the device
+_SECTOR_KB = 0.5
+
+
+class DiskStat(NamedTuple):
+    name: str
+    rps: float    # reads per second
+    wps: float
+    rkbps: float    # kB read per second
+    wkbps: float
+    r_await: float    # ms a read takes, queued and served
+    w_await: float
+    aqu_sz: float    # average queue length
+    util: float    # percent of time busy
+
+
+class DiskMatrix:
+    """
+    /proc/diskstats in one flat int64 array, a row per device and
+    NFIELDS columns, missing columns of older kernels are 0.
+    """
+
+    __slots__ = ("names", "counts", "ts_secs")
+
+    def __init__(self, names: List[str], counts: array, ts_secs: float):
+        self.names = names
+        self.counts = counts
+        self.ts_secs = ts_secs
+
+    def row(self, idx: int) -> array:
+        return self.counts[idx * NFIELDS:(idx + 1) * NFIELDS]
+
+
+class DiskStatsParser:
+    """Device names are decoded once and interned by raw bytes"""
+
+    def __init__(self):
+        self._names: Dict[bytes, str] = {}
+        self._layout: Tuple[str, ...] = ()
+        self._layout_list: List[str] = []
+
+    def _name(self, raw: bytes) -> str:
+        name = self._names.get(raw)
+        if name is None:
+            name = raw.decode("utf-8")
+            self._names[raw] = name
+        return name
+
+    def parse(self, data: bytes) -> DiskMatrix:
+        names = []
+        counts = array("q")
+        pad = [0] * NFIELDS
+        for line in data.splitlines():
+            tokens = line.split()
+            if len(tokens) < 14:
+                continue
+            names.append(self._name(tokens[2]))
+            values = tokens[3:3 + NFIELDS]
+            counts.extend(map(int, values))
+            if len(values) < NFIELDS:
+                counts.extend(pad[len(values):])
+        # the same list while devices stay, so views compare by identity
+        if tuple(names) != self._layout:
+            self._layout, self._layout_list = tuple(names), names
+        return DiskMatrix(self._layout_list, counts, time.time())
+
+
+def is_partition(name: str, root: str = SYS_BLOCK) -> bool:
+    # cciss/c0d0 is cciss!c0d0 in sysfs
+    return os.path.exists(f"{root}/{name.replace('/', '!')}/partition")
+
+
+def is_dm(name: str) -> bool:
+    return name.startswith("dm-")
+
+
+class DiskView:
+    """
+    Devices selected by name filters, partitions and dm devices. The row
+    indexes are compiled once per device layout, a tick only slices them.
+    """
+
+    def __init__(self,
+                 filters: Optional[List[str]] = None,
+                 partitions: bool = False,
+                 dm: bool = True,
+                 root: str = SYS_BLOCK):
+        self.filters = filters or []
+        self.partitions = partitions
+        self.dm = dm
+        self._root = root
+        self._names: Optional[List[str]] = None
+        self._rows: List[int] = []
+
+    def _match(self, name: str) -> bool:
+        if self.filters:
+            # named devices are shown whatever their kind
+            return any(pattern in name for pattern in self.filters)
+        if not self.dm and is_dm(name):
+            return False
+        return self.partitions or not is_partition(name, self._root)
+
+    def rows(self, names: List[str]) -> List[int]:
+        if names is not self._names:
+            self._names = names
+            self._rows = [
+                idx for idx, name in enumerate(names) if self._match(name)
+            ]
+        return self._rows
+
+
+class DiskDelta:
+    """Deltas between two DiskMatrix, in the layout of the latest one"""
+
+    __slots__ = ("names", "deltas", "secs")
+
+    def __init__(self, now: DiskMatrix, last: DiskMatrix):
+        self.names = now.names
+        self.secs = max(now.ts_secs - last.ts_secs, 1e-9)
+        if now.names is last.names or now.names == last.names:
+            self.deltas = array("q", map(operator.sub, now.counts,
+                                         last.counts))
+        else:
+            self.deltas = _sub_by_name(now, last)
+
+    def column(self, col: int, rows: List[int]) -> List[int]:
+        deltas = self.deltas
+        return [deltas[row * NFIELDS + col] for row in rows]
+
+    def stats(self, rows: List[int]) -> List[DiskStat]:
+        """iostat -x like rates of the given rows"""
+        per_sec = 1 / self.secs
+        reads = self.column(READS, rows)
+        writes = self.column(WRITES, rows)
+        r_ticks = self.column(READ_TICKS, rows)
+        w_ticks = self.column(WRITE_TICKS, rows)
+        ms_per_sec = per_sec / 1000
+        rps = [v * per_sec for v in reads]
+        wps = [v * per_sec for v in writes]
+        rkbps = [v * _SECTOR_KB * per_sec
+                 for v in self.column(READ_SECTORS, rows)]
+        wkbps = [v * _SECTOR_KB * per_sec
+                 for v in self.column(WRITE_SECTORS, rows)]
+        r_await = list(map(_await, r_ticks, reads))
+        w_await = list(map(_await, w_ticks, writes))
+        aqu_sz = [v * ms_per_sec for v in self.column(TIME_IN_QUEUE, rows)]
+        # io_ticks may run ahead of the wall clock on a busy device
+        util = [min(v * ms_per_sec * 100, 100.0)
+                for v in self.column(IO_TICKS, rows)]
+        return [
+            DiskStat(self.names[row], *values) for row, values in zip(
+                rows, zip(rps, wps, rkbps, wkbps, r_await, w_await, aqu_sz,
+                          util))
+        ]
+
+
+def _await(ticks: int, ios: int) -> float:
+    return ticks / ios if ios > 0 else 0.0
+
+
+def _sub_by_name(now: DiskMatrix, last: DiskMatrix) -> array:
+    """Slow path, devices were added or removed"""
+    deltas = array("q", now.counts)
+    last_rows = {name: idx for idx, name in enumerate(last.names)}
+    for row, name in enumerate(now.names):
+        last_row = last_rows.get(name)
+        if last_row is None:
+            continue    # new device, counted from 0
+        base, last_base = row * NFIELDS, last_row * NFIELDS
+        deltas[base:base + NFIELDS] = array(
+            "q",
+            map(operator.sub, now.counts[base:base + NFIELDS],
+                last.counts[last_base:last_base + NFIELDS]))
+    return deltas
+
+
+class DiskStatsEngine:
+    """Keep /proc/diskstats open and the matrix of the last update"""
+
+    def __init__(self, path: str = DISKSTATS_PATH):
+        self._reader = ProcFileReader(path)
+        self._parser = DiskStatsParser()
+        self._last = self._parser.parse(self._reader.read())
+
+    @property
+    def last(self) -> DiskMatrix:
+        return self._last
+
+    def update(self, data: Optional[bytes] = None) -> DiskDelta:
+        if data is None:
+            data = self._reader.read()
+        now = self._parser.parse(data)
+        delta = DiskDelta(now, self._last)
+        self._last = now
+        return delta
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
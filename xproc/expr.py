@@ -0,0 +1,191 @@
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from xproc.snapshot import Schema, Snapshot
+from xproc.value import Attr, FloatValue, IntUnitValue, IntValue
+
+
+class ExprError(ValueError):
+    pass
+
+
+# field names may hold parentheses, such as Active(anon)
+_TOKEN_PAT = re.compile(r"\s*(?:(?P<num>\d+(?:\.\d*)?)|"
+                        r"(?P<name>[A-Za-z_][\w]*(?:\(\w+\))?)|"
+                        r"(?P<op>[-+*/()]))")
+
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "neg": 3}
+
+
+def _div(left, right):
+    # such as SwapTotal on a host without swap
+    if right == 0:
+        return 0
+    return left / right
+
+
+_FUNCS: Dict[str, Callable[[Any, Any], Any]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _div,
+}
+
+# codes of the evaluation plan
+_LOAD = 0
+_CONST = 1
+_NEG = 2
+_BINARY = 3
+
+Plan = List[Tuple[int, Any]]
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_PAT.match(text, pos)
+        if not match:
+            raise ExprError(f"invalid expression at {pos}: {text}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _to_rpn(text: str) -> List[Tuple[str, str]]:
+    """Shunting-yard, the operands and operators in postfix order"""
+    output: List[Tuple[str, str]] = []
+    ops: List[str] = []
+    expect_operand = True
+    for kind, token in _tokenize(text):
+        if kind in ("num", "name"):
+            if not expect_operand:
+                raise ExprError(f"missing operator before {token}: {text}")
+            output.append((kind, token))
+            expect_operand = False
+        elif token == "(":
+            if not expect_operand:
+                raise ExprError(f"missing operator before (: {text}")
+            ops.append(token)
+        elif token == ")":
+            while ops and ops[-1] != "(":
+                output.append(("op", ops.pop()))
+            if not ops:
+                raise ExprError(f"unbalanced ): {text}")
+            ops.pop()
+            expect_operand = False
+        else:
+            if expect_operand:
+                if token != "-":
+                    raise ExprError(f"missing operand before {token}: {text}")
+                token = "neg"
+            while (ops and ops[-1] != "(" and token != "neg" and
+                   _PRECEDENCE[ops[-1]] >= _PRECEDENCE[token]):
+                output.append(("op", ops.pop()))
+            ops.append(token)
+            expect_operand = True
+    if expect_operand:
+        raise ExprError(f"incomplete expression: {text}")
+    while ops:
+        token = ops.pop()
+        if token == "(":
+            raise ExprError(f"unbalanced (: {text}")
+        output.append(("op", token))
+    return output
+
+
+class Expr:
+    """
+    A derived column, NAME=expression over the fields of a snapshot, such
+    as ANON_RATIO=AnonPages/MemTotal.
+
+    The expression is parsed once into postfix tokens, and bound once per
+    schema into a flat plan of field indexes, constants and operator
+    functions, a tick only runs the plan over the values array.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        self._rpn = _to_rpn(text)
+        self.fields = [token for kind, token in self._rpn if kind == "name"]
+        self.is_ratio = any(token == "/" for _, token in self._rpn)
+        self._schema: Optional[Schema] = None
+        self._plan: Plan = []
+        self.unit = ""
+
+    def bind(self, schema: Schema) -> Plan:
+        if schema is self._schema:
+            return self._plan
+        plan: Plan = []
+        units: List[str] = []
+        for kind, token in self._rpn:
+            if kind == "name":
+                idx = schema.get_index(token)
+                if idx < 0:
+                    raise ExprError(f"unknown field {token}: {self.text}")
+                plan.append((_LOAD, idx))
+                units.append(schema.units[idx])
+            elif kind == "num":
+                plan.append((_CONST, float(token) if "." in token else
+                             int(token)))
+                units.append("")
+            elif token == "neg":
+                plan.append((_NEG, None))
+            else:
+                plan.append((_BINARY, _FUNCS[token]))
+                right, left = units.pop(), units.pop()
+                units.append(_unit(token, left, right))
+        self._schema, self._plan, self.unit = schema, plan, units[0]
+        return plan
+
+    def evaluate(self, snapshot: Snapshot):
+        values = snapshot.values
+        stack: List[Any] = []
+        push, pop = stack.append, stack.pop
+        for code, arg in self.bind(snapshot.schema):
+            if code == _LOAD:
+                push(values[arg])
+            elif code == _BINARY:
+                right = pop()
+                push(arg(pop(), right))
+            elif code == _CONST:
+                push(arg)
+            else:
+                push(-pop())
+        return stack[0]
+
+    def attr(self, snapshot: Snapshot) -> Attr:
+        result = self.evaluate(snapshot)
+        if self.unit:
+            return Attr(self.name, IntUnitValue(int(round(result)),
+                                                self.unit))
+        if self.is_ratio or isinstance(result, float):
+            value = FloatValue(result)
+            value.fmt = "{0:.4f}"
+            return Attr(self.name, value)
+        return Attr(self.name, IntValue(result))
+
+
+def _unit(token: str, left: str, right: str) -> str:
+    """kB + kB is kB, kB * 2 is kB, kB / kB is a ratio"""
+    if token in ("+", "-"):
+        if left == right or not right:
+            return left
+        return right if not left else ""
+    if token == "*":
+        return "" if left and right else left or right
+    return "" if right else left
+
+
+def parse_definition(text: str) -> Expr:
+    """NAME=expression"""
+    name, sep, expr = text.partition("=")
+    name = name.strip()
+    if not sep or not name or not expr.strip():
+        raise ExprError(f"expect NAME=expression: {text}")
+    return Expr(name, expr)
+
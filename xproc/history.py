@@ -0,0 +1,124 @@
+import math
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from xproc.snapshot import Schema, Snapshot
+
+
+class WindowStats(NamedTuple):
+    count: int
+    last: int
+    min: int
+    max: int
+    mean: float
+    p95: int
+    p99: int
+
+
+EmptyWindowStats = WindowStats(0, 0, 0, 0, 0.0, 0, 0)
+
+
+def percentile(sorted_vals: Sequence[int], pct: float) -> int:
+    """Nearest-rank percentile of ascending sorted values"""
+    if not sorted_vals:
+        return 0
+    rank = max(math.ceil(pct / 100 * len(sorted_vals)), 1)
+    return sorted_vals[rank - 1]
+
+
+class History:
+    """
+    Fixed capacity ring buffer of snapshots sharing one schema.
+
+    Rows(ticks) are preallocated in one flat int64 array, a column of the
+    ring is a strided slice of it, so the statistics run over C arrays.
+    """
+
+    def __init__(self, schema: Schema, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive: {capacity}")
+        self.schema = schema
+        self.capacity = capacity
+        self._ncols = len(schema)
+        self._data = array("q", bytes(8 * capacity * self._ncols))
+        self._ts = array("d", bytes(8 * capacity))
+        self._head = 0    # the row to write next
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, snapshot: Snapshot):
+        values = snapshot.values
+        if snapshot.schema is not self.schema:
+            names = self.schema.names
+            values = array("q", [snapshot.get(name) for name in names])
+        row = self._head
+        self._data[row * self._ncols:(row + 1) * self._ncols] = values
+        self._ts[row] = snapshot.ts
+        self._head = (row + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _window_size(self, seconds: Optional[float]) -> int:
+        """Number of the latest rows within seconds of the latest one"""
+        if seconds is None or self._size == 0:
+            return self._size
+        first = self._head - self._size
+        oldest = self._ts[(self._head - 1) % self.capacity] - seconds
+        # binary search the first row not older than oldest
+        low, high = 0, self._size
+        while low < high:
+            mid = (low + high) // 2
+            if self._ts[(first + mid) % self.capacity] < oldest:
+                low = mid + 1
+            else:
+                high = mid
+        return self._size - low
+
+    def column(self, name: str, seconds: Optional[float] = None) -> array:
+        """Values of name in the window, from the oldest to the latest"""
+        return self._column(self.schema.get_index(name),
+                            self._window_size(seconds))
+
+    def _column(self, col: int, count: int) -> array:
+        if col < 0 or count == 0:
+            return array("q")
+        data, ncols = self._data, self._ncols
+        start = (self._head - count) % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            return data[start * ncols + col:end * ncols:ncols]
+        # wrapped: [start, capacity) + [0, head)
+        return (data[start * ncols + col::ncols] +
+                data[col:self._head * ncols:ncols])
+
+    def stats(self,
+              names: Sequence[str],
+              seconds: Optional[float] = None) -> Dict[str, WindowStats]:
+        result = {}
+        count = self._window_size(seconds)
+        for name in names:
+            vals = self._column(self.schema.get_index(name), count)
+            if not vals:
+                result[name] = EmptyWindowStats
+                continue
+            sorted_vals = sorted(vals)
+            result[name] = WindowStats(count=len(vals),
+                                       last=vals[-1],
+                                       min=sorted_vals[0],
+                                       max=sorted_vals[-1],
+                                       mean=sum(vals) / len(vals),
+                                       p95=percentile(sorted_vals, 95),
+                                       p99=percentile(sorted_vals, 99))
+        return result
+
+    def snapshots(self, seconds: Optional[float] = None) -> List[Snapshot]:
+        """Rebuild snapshots of the window, from the oldest to the latest"""
+        count = self._window_size(seconds)
+        ncols = self._ncols
+        snaps = []
+        for i in range(self._head - count, self._head):
+            row = i % self.capacity
+            values = self._data[row * ncols:(row + 1) * ncols]
+            snaps.append(Snapshot(self.schema, values, self._ts[row]))
+        return snaps
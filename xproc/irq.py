@@ -1,10 +1,13 @@
-import re
+import heapq
 import time
 import logging
+import operator
+from array import array
 from operator import attrgetter
-from typing import Dict, NamedTuple, List, Tuple, Union
+from typing import Dict, NamedTuple, List, Optional, Tuple
 
-from xproc.util import open_file, cpu_count
+from xproc.procfile import read_proc
+from xproc.util import cpuset_contains
 
 
 class CountStat(NamedTuple):
@@ -22,7 +25,7 @@ class IrqStat(NamedTuple):
     # int number or int str
     label: str
     # int count of ever cpu
-    # the length of cpus is equal to os.cpu_count()
+    # the length of cpus is the number of cpus in the header line
     cpus: List[int]
     # type? edge? name?
     extras: List[str]
@@ -36,7 +39,7 @@ class IrqStat(NamedTuple):
         return " ".join(self.extras)
 
     def get(self, cpu_idx: int) -> int:
-        if 0 <= cpu_idx < cpu_count():
+        if 0 <= cpu_idx < len(self.cpus):
             return self.cpus[cpu_idx]
         return 0
 
@@ -66,7 +69,12 @@ class Interrupts(NamedTuple):
         delta_stats: List[IrqStat] = []
         delta_err = self.err - other.err
         delta_mis = self.mis - other.mis
-        for src, dst in zip(self.stats, other.stats):
+        # match by label, interrupts may come and go between two samples
+        others = {stat.label: stat for stat in other.stats}
+        for src in self.stats:
+            dst = others.get(src.label)
+            if dst is None:
+                dst = IrqStat(src.label, [0] * len(src.cpus), src.extras, 0)
             delta_stats.append(src.sub(dst, delta_ts_secs))
         return Interrupts(total_irq=delta_total_irq,
                           stats=delta_stats,
@@ -91,52 +99,338 @@ class Interrupts(NamedTuple):
                           ts_secs=self.ts_secs)
 
 
-def _parse(line: str) -> Union[IrqStat, CountStat]:
-    cols = re.split(r"\s+", line)
-    label = cols[0]
-    if label[-1] == ":":
-        label = label[:-1]
-    if label == "ERR":
-        return CountStat("ERR", int(cols[1]))
-    if label == "MIS":
-        return CountStat("MIS", int(cols[1]))
-    cpu_cnt = cpu_count()
-    cpus = [int(c) for c in cols[1:cpu_cnt + 1]]
-    extras = cols[cpu_cnt + 1:]
-    return IrqStat(label, cpus, extras, sum(cpus))
+class IrqMatrix:
+    """
+    Counts of /proc/interrupts in one flat int64 array, a row per interrupt
+    and a column per online cpu.
+    """
+
+    __slots__ = ("cpu_ids", "labels", "extras", "counts", "err", "mis",
+                 "ts_secs")
+
+    def __init__(self, cpu_ids: List[int], labels: List[str],
+                 extras: List[List[str]], counts: array, err: int, mis: int,
+                 ts_secs: float):
+        self.cpu_ids = cpu_ids    # cpu number of every column
+        self.labels = labels
+        self.extras = extras
+        self.counts = counts
+        self.err = err
+        self.mis = mis
+        self.ts_secs = ts_secs
+
+    @property
+    def ncpu(self) -> int:
+        return len(self.cpu_ids)
+
+    @property
+    def nirq(self) -> int:
+        return len(self.labels)
+
+    def row(self, idx: int) -> array:
+        ncpu = len(self.cpu_ids)
+        return self.counts[idx * ncpu:(idx + 1) * ncpu]
+
+    def row_totals(self) -> List[int]:
+        return _row_sums(self.counts, len(self.cpu_ids), len(self.labels))
+
+    def to_interrupts(self) -> Interrupts:
+        stats = []
+        total_irq = 0
+        for idx, label in enumerate(self.labels):
+            cpus = self.row(idx)
+            total = sum(cpus)
+            total_irq += total
+            stats.append(IrqStat(label, cpus, self.extras[idx], total))
+        return Interrupts(total_irq=total_irq,
+                          stats=stats,
+                          err=CountStat("ERR", self.err),
+                          mis=CountStat("MIS", self.mis),
+                          ts_secs=self.ts_secs)
+
+
+class InterruptsParser:
+    """
+    Parse /proc/interrupts into an IrqMatrix.
+
+    The cpu columns come from the header line. Labels and extras never
+    change between ticks, they are decoded once and interned by raw bytes.
+    """
+
+    def __init__(self):
+        self._labels: Dict[bytes, str] = {}
+        self._extras: Dict[bytes, List[str]] = {}
+        self._skipped = 0    # ERR: and MIS: lines of the last parse
+
+    def _label(self, raw: bytes) -> str:
+        label = self._labels.get(raw)
+        if label is None:
+            label = raw.rstrip(b":").decode("utf-8")
+            self._labels[raw] = label
+        return label
+
+    def _extra(self, raw: bytes) -> List[str]:
+        extra = self._extras.get(raw)
+        if extra is None:
+            extra = raw.decode("utf-8").split()
+            self._extras[raw] = extra
+        return extra
 
+    def parse(self, data: bytes, out: Optional[IrqMatrix] = None) -> IrqMatrix:
+        """Fill out in place when given, its counts are reused"""
+        lines = data.splitlines()
+        if not lines:
+            return IrqMatrix([], [], [], array("q"), 0, 0, time.time())
+        cpu_ids = [int(cpu[3:]) for cpu in lines[0].split()]    # CPUn
+        ncpu = len(cpu_ids)
+        labels: List[str] = []
+        extras: List[List[str]] = []
+        err, mis = 0, 0
+        # ERR: and MIS: are not rows, size by the rows kept last time so a
+        # tick of the same layout refills the counts of out
+        nrows = len(lines) - 1 - self._skipped
+        skipped = 0
+        if out is not None and len(out.counts) >= ncpu * nrows:
+            counts = out.counts
+        else:
+            counts = array("q", bytes(8 * ncpu * nrows))
+        row_end = 0
+        for line in lines[1:]:
+            tokens = line.split(None, ncpu + 1)
+            label = self._label(tokens[0])
+            if label in ("ERR", "MIS") and len(tokens) <= 2:
+                # ERR: and MIS: have one count
+                if label == "ERR":
+                    err = int(tokens[1])
+                else:
+                    mis = int(tokens[1])
+                skipped += 1
+                continue
+            cpus = tokens[1:ncpu + 1]
+            if len(tokens) < ncpu + 2 or not cpus[-1].isdigit():
+                # fewer counts than cpus
+                cpus = [c for c in tokens[1:] if c.isdigit()]
+                extra = b" ".join(tokens[len(cpus) + 1:])
+                cpus.extend([b"0"] * (ncpu - len(cpus)))
+            else:
+                extra = tokens[ncpu + 1]
+            labels.append(label)
+            extras.append(self._extra(extra))
+            counts[row_end:row_end + ncpu] = array("q", map(int, cpus))
+            row_end += ncpu
+        # slicing past the end appended the rows of a larger layout
+        if len(counts) != row_end:
+            del counts[row_end:]
+        self._skipped = skipped
+        if out is None:
+            return IrqMatrix(cpu_ids, labels, extras, counts, err, mis,
+                             time.time())
+        out.cpu_ids, out.labels, out.extras = cpu_ids, labels, extras
+        out.counts, out.err, out.mis = counts, err, mis
+        out.ts_secs = time.time()
+        return out
+
+
+_PARSER = InterruptsParser()
+
+
+def get_matrix(path: str = "/proc/interrupts",
+               data: Optional[bytes] = None,
+               out: Optional[IrqMatrix] = None) -> IrqMatrix:
+    if data is None:
+        data = read_proc(path)
+    return _PARSER.parse(data, out)
 
-def get() -> Interrupts:
+
+def get(path: str = "/proc/interrupts",
+        data: Optional[bytes] = None) -> Interrupts:
     """
     Get current /proc/interrupts Stats
     """
-    with open_file("/proc/interrupts") as proc_irqs:
-        lines = [l.strip() for l in proc_irqs.readlines()]
-    total_irq = 0
-    stats: List[IrqStat] = []
-    err = CountStat("ERR")
-    mis = CountStat("MIS")
-    for line in lines[1:]:    # pass header
-        stat = _parse(line)
-        label = stat.label
-        if isinstance(stat, IrqStat):
-            total_irq += stat.total
-            stats.append(stat)
-        else:    # CountStat
-            if label == "ERR":
-                err = stat
-            elif label == "MIS":
-                mis = stat
-    return Interrupts(total_irq=total_irq,
-                      stats=stats,
-                      mis=mis,
-                      err=err,
-                      ts_secs=time.time())
+    return get_matrix(path, data).to_interrupts()
+
+
+def _row_sums(flat: array, ncols: int, nrows: int) -> List[int]:
+    return [sum(flat[i * ncols:(i + 1) * ncols]) for i in range(nrows)]
+
+
+def _col_sums(flat: array, ncols: int) -> List[int]:
+    return [sum(flat[i::ncols]) for i in range(ncols)]
+
+
+class IrqDelta:
+    """Deltas between two IrqMatrix, in the layout of the latest one"""
+
+    __slots__ = ("cpu_ids", "labels", "extras", "deltas", "secs", "err",
+                 "mis")
+
+    def __init__(self, now: IrqMatrix, last: IrqMatrix):
+        self.cpu_ids = now.cpu_ids
+        self.labels = now.labels
+        self.extras = now.extras
+        self.secs = max(now.ts_secs - last.ts_secs, 1e-9)
+        self.err = now.err - last.err
+        self.mis = now.mis - last.mis
+        if now.labels == last.labels and now.cpu_ids == last.cpu_ids:
+            # the common case, one pass over the whole matrix
+            self.deltas = array("q", map(operator.sub, now.counts,
+                                         last.counts))
+        else:
+            self.deltas = _sub_by_label(now, last)
+
+    @property
+    def ncpu(self) -> int:
+        return len(self.cpu_ids)
+
+    @property
+    def nirq(self) -> int:
+        return len(self.labels)
+
+    def row(self, idx: int) -> array:
+        ncpu = len(self.cpu_ids)
+        return self.deltas[idx * ncpu:(idx + 1) * ncpu]
+
+    def row_totals(self) -> List[int]:
+        """Delta of every interrupt on all cpus"""
+        return _row_sums(self.deltas, len(self.cpu_ids), len(self.labels))
+
+    def cpu_totals(self) -> List[int]:
+        """Delta of all interrupts on every cpu"""
+        return _col_sums(self.deltas, len(self.cpu_ids))
+
+    def total(self) -> int:
+        return sum(self.deltas)
+
+    def rate(self, delta: int) -> float:
+        return delta / self.secs
+
+    def top(self, top: int) -> List[int]:
+        """Row indexes of the top N interrupts"""
+        totals = self.row_totals()
+        return heapq.nlargest(top, range(len(totals)), key=totals.__getitem__)
+
+
+def _sub_by_label(now: IrqMatrix, last: IrqMatrix) -> array:
+    """Slow path, interrupts were added or removed, or cpus went offline"""
+    ncpu = len(now.cpu_ids)
+    deltas = array("q", now.counts)
+    last_rows = {label: idx for idx, label in enumerate(last.labels)}
+    last_cols = {cpu: idx for idx, cpu in enumerate(last.cpu_ids)}
+    cols = [last_cols.get(cpu, -1) for cpu in now.cpu_ids]
+    last_ncpu = len(last.cpu_ids)
+    for row, label in enumerate(now.labels):
+        last_row = last_rows.get(label)
+        if last_row is None:
+            continue    # new interrupt, counted from 0
+        base = last_row * last_ncpu
+        for col, last_col in enumerate(cols):
+            if last_col >= 0:
+                deltas[row * ncpu + col] -= last.counts[base + last_col]
+    return deltas
+
+
+class IrqDeltaEngine:
+    """
+    Keep two IrqMatrix and swap them on every update, so the counts arrays
+    are reused between ticks.
+    """
+
+    def __init__(self, path: str = "/proc/interrupts"):
+        self._path = path
+        self._last = get_matrix(path)
+        self._spare: Optional[IrqMatrix] = None
+
+    @property
+    def last(self) -> IrqMatrix:
+        return self._last
+
+    def update(self, data: Optional[bytes] = None) -> IrqDelta:
+        now = get_matrix(self._path, data, self._spare)
+        delta = IrqDelta(now, self._last)
+        self._spare, self._last = self._last, now
+        return delta
+
+
+class IrqView:
+    """
+    Rows and columns of an IrqDelta selected by label/name filters and a
+    cpu bitmap. The indexes are resolved once per layout, a tick only
+    slices the selected cells.
+    """
+
+    def __init__(self,
+                 filters: Optional[List[str]] = None,
+                 cpus: Optional[int] = None,
+                 all_cpus: bool = False):
+        self.filters = filters or []
+        self.cpus = cpus    # bitmap of cpu numbers, None for no cpu column
+        self.all_cpus = all_cpus
+        self._labels: Optional[List[str]] = None
+        self._cpu_ids: Optional[List[int]] = None
+        self._rows: List[int] = []
+        self._cols: List[int] = []
+
+    def rows(self, delta: IrqDelta) -> List[int]:
+        if delta.labels != self._labels:
+            self._labels = delta.labels
+            index = {label: idx for idx, label in enumerate(delta.labels)}
+            if not self.filters:
+                self._rows = list(range(len(delta.labels)))
+                return self._rows
+            # exact labels first, then the device and type names
+            rows = [index[f] for f in self.filters if f in index]
+            # a number is an irq label, -f 24 must not match 524288-edge
+            names = [
+                f for f in self.filters if f not in index and not f.isdigit()
+            ]
+            seen = set(rows)
+            rows.extend(idx for idx, extras in enumerate(delta.extras)
+                        if idx not in seen and any(
+                            name in extra for name in names
+                            for extra in extras))
+            self._rows = rows
+        return self._rows
+
+    def cols(self, delta: IrqDelta) -> List[int]:
+        if delta.cpu_ids != self._cpu_ids:
+            self._cpu_ids = delta.cpu_ids
+            if self.all_cpus:
+                self._cols = list(range(len(delta.cpu_ids)))
+            elif self.cpus is None:
+                self._cols = []
+            else:
+                self._cols = [
+                    idx for idx, cpu in enumerate(delta.cpu_ids)
+                    if cpuset_contains(self.cpus, cpu)
+                ]
+        return self._cols
+
+    def cells(self, delta: IrqDelta,
+              top: int = -1) -> List[Tuple[int, List[int], int]]:
+        """(row, deltas of the selected cpus, total of all cpus) of rows"""
+        ncpu = len(delta.cpu_ids)
+        deltas = delta.deltas
+        rows = self.rows(delta)
+        totals = [sum(deltas[r * ncpu:(r + 1) * ncpu]) for r in rows]
+        order = range(len(rows))
+        if top > 0:
+            order = heapq.nlargest(top, order, key=totals.__getitem__)
+        cols = self.cols(delta)
+        return [(rows[i], [deltas[rows[i] * ncpu + c]
+                           for c in cols], totals[i]) for i in order]
+
+    def hot(self, delta: IrqDelta, row: int,
+            top: int) -> List[Tuple[int, int]]:
+        """(cpu number, delta) of the busiest cpus of the row"""
+        ncpu = len(delta.cpu_ids)
+        cells = delta.deltas[row * ncpu:(row + 1) * ncpu]
+        cols = heapq.nlargest(top, range(ncpu), key=cells.__getitem__)
+        return [(delta.cpu_ids[c], cells[c]) for c in cols if cells[c] > 0]
 
 
 # show functions
-def show_top(top: int, interval: int, logger: logging.Logger,
-             delta_irqs: Interrupts):
+def show_top(top: int, interval: float, logger: logging.Logger,
+             delta_irqs: IrqDelta):
     # print header
     title = f"{time.strftime('%H:%M:%S', time.localtime()):>55s}"
     logger.info(title)
@@ -150,18 +444,69 @@ def show_top(top: int, interval: int, logger: logging.Logger,
         ]
     logger.info(" ".join(title))
     # print data
-    top_irqs = delta_irqs.sort(top=top)
-    for stat in top_irqs.stats:
-        label = stat.label
-        label_width = len(stat.label)
-        name = f"{stat.extra_str()} ({label:>{label_width}s})"
+    totals = delta_irqs.row_totals()
+    for idx in delta_irqs.top(top):
+        label = delta_irqs.labels[idx]
+        label_width = len(label)
+        name = f"{' '.join(delta_irqs.extras[idx])} ({label:>{label_width}s})"
+        rate = int(delta_irqs.rate(totals[idx]))
         if interval == 1:
-            line = [f"{name:>55s}", f"{sum(stat.cpus):>11d}"]
+            line = [f"{name:>55s}", f"{rate:>11d}"]
         else:
             line = [
                 f"{name:>55s}",
-                f"{sum(stat.cpus):>11d}",
-                f"{stat.total:>11d}",
+                f"{rate:>11d}",
+                f"{totals[idx]:>11d}",
             ]
         logger.info(" ".join(line))
     logger.info("")
+
+
+def show_view(view: IrqView, top: int, logger: logging.Logger,
+              delta_irqs: IrqDelta):
+    """Per second rates of the selected interrupts on the selected cpus"""
+    cols = view.cols(delta_irqs)
+    title = [f"{'IRQ':>10s}"]
+    title.extend(f"{'CPU' + str(delta_irqs.cpu_ids[c]):>10s}" for c in cols)
+    title.extend([f"{'TOTAL':>11s}", "  DEVICE"])
+    logger.info(f"{time.strftime('%H:%M:%S', time.localtime())}")
+    logger.info(" ".join(title))
+    rate = delta_irqs.rate
+    for row, cells, total in view.cells(delta_irqs, top):
+        line = [f"{delta_irqs.labels[row]:>10s}"]
+        line.extend(f"{int(rate(cell)):>10d}" for cell in cells)
+        line.append(f"{int(rate(total)):>11d}")
+        line.append(f"  {' '.join(delta_irqs.extras[row])}")
+        logger.info(" ".join(line))
+    if cols:
+        # every interrupt of the cpus, the filtered out ones too
+        cpu_totals = delta_irqs.cpu_totals()
+        line = [f"{'ALL':>10s}"]
+        line.extend(f"{int(rate(cpu_totals[c])):>10d}" for c in cols)
+        line.append(f"{int(rate(delta_irqs.total())):>11d}")
+        logger.info(" ".join(line))
+    logger.info("")
+
+
+_HOT_BAR_WIDTH = 40
+
+
+def show_hot(view: IrqView, hot: int, logger: logging.Logger,
+             delta_irqs: IrqDelta):
+    """The busiest cpus of every selected interrupt, with a share bar"""
+    logger.info(f"{time.strftime('%H:%M:%S', time.localtime())}")
+    rate = delta_irqs.rate
+    for row, _, total in view.cells(delta_irqs):
+        name = " ".join(delta_irqs.extras[row])
+        logger.info(f"{name} ({delta_irqs.labels[row]}),"
+                    f" {int(rate(total))} IRQs/SECOND")
+        cells = view.hot(delta_irqs, row, hot)
+        if not cells:
+            continue
+        busiest = cells[0][1]
+        for cpu, cell in cells:
+            share = cell * 100 / total
+            bar = "#" * max(int(cell * _HOT_BAR_WIDTH / busiest), 1)
+            logger.info(f"{'CPU' + str(cpu):>10s} {int(rate(cell)):>11d}"
+                        f" {share:>6.1f}% {bar}")
+    logger.info("")
@@ -1,6 +1,7 @@
 import re
-from typing import List, NamedTuple
+from typing import List, NamedTuple, Optional
 
+from xproc.procfile import read_proc
 from xproc.value import (
     Attr,
     FloatValue,
@@ -31,18 +32,19 @@ class Loadavg(NamedTuple):
 
 EmptyLoadavg = Loadavg(0, 0, 0, 0, 0, 0)
 
-LOAD_PATTERN = re.compile(r"^(?P<load_1>[0-9]+\.[0-9]+)\s+"
-                          r"(?P<load_5>[0-9]+\.[0-9]+)\s+"
-                          r"(?P<load_15>[0-9]+\.[0-9]+)\s+"
-                          r"(?P<nr_running>[0-9]+)/(?P<nr_total>[0-9]+)\s+"
-                          r"(?P<last_pid>[0-9]+)\s?$")
+LOAD_PATTERN = re.compile(rb"^(?P<load_1>[0-9]+\.[0-9]+)\s+"
+                          rb"(?P<load_5>[0-9]+\.[0-9]+)\s+"
+                          rb"(?P<load_15>[0-9]+\.[0-9]+)\s+"
+                          rb"(?P<nr_running>[0-9]+)/(?P<nr_total>[0-9]+)\s+"
+                          rb"(?P<last_pid>[0-9]+)\s?$")
 
 
-def current_loadavg() -> Loadavg:
+def current_loadavg(path: str = "/proc/loadavg",
+                    data: Optional[bytes] = None) -> Loadavg:
     # 0.24 0.16 0.06 1/296 1968353
-    with open("/proc/loadavg", mode="r", encoding="utf-8") as load:
-        line = load.readlines()[0]
-    match = re.match(LOAD_PATTERN, line)
+    if data is None:
+        data = read_proc(path)
+    match = LOAD_PATTERN.match(data)
     if not match:
         return EmptyLoadavg
     return Loadavg(load_1=float(match.group("load_1")),
@@ -1,11 +1,14 @@
+import heapq
 import re
-from collections import OrderedDict, defaultdict
-from typing import Dict, List, NamedTuple, Tuple
+from collections import defaultdict
+from operator import attrgetter
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import logging
+from xproc.procfile import read_proc
 from xproc.util import open_file
 
+from xproc.snapshot import Snapshot, parse_snapshot
 from xproc.value import (
-    IntUnitValue,
     parse_int_unit_val,
     parse_int_val,
     DEF_FMT_1,
@@ -116,44 +119,43 @@ ATTR_DICT = {
 }
 
 
+KERNEL = "KERNEL"
+USER = "USER"
+USER_PSS = "USER_PSS"
+
+# columns derived from /proc/meminfo
+_DERIVED = ((KERNEL, "kB"), (USER, "kB"), (USER_PSS, "kB"))
+
+
 class MemoryInfo:
 
-    def __init__(self, path="/proc/meminfo"):
-        with open(path, mode="r", encoding="utf-8") as meminfo:
-            lines = meminfo.readlines()
-        attrs: Dict[str, Attr] = OrderedDict()
-        for line in lines:
-            sep_idx = line.find(":")
-            name = line[0:sep_idx]
-            val = line[sep_idx + 1:-1]    # exclude \n
-            if name not in ATTR_DICT:
-                continue
-            parser, fmt = ATTR_DICT[name]
-            attr = parser(name, val)
-            attr.set_value_fmt(fmt)
-            attrs[name] = attr
-        self._attrs = attrs
-        kernel = self._get_kernel_used_mem()
-        self._attrs[kernel.name] = kernel
-        user = self._get_user_used_mem()
-        self._attrs[user.name] = user
+    def __init__(self,
+                 path="/proc/meminfo",
+                 data: Optional[bytes] = None,
+                 pss: Optional[int] = None):
+        """pss is ΣPss of all the processes in kB, see xproc.pss"""
+        if data is None:
+            data = read_proc(path)
+        self._snapshot = parse_snapshot(data, b":", _DERIVED)
+        self._snapshot.set(KERNEL, self._get_kernel_used_mem())
+        self._snapshot.set(USER, self._get_user_used_mem())
+        if pss is not None:
+            self._snapshot.set(USER_PSS, self._get_user_pss_mem(pss))
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
 
     def _get_attr(self, name: str) -> Attr:
-        if name not in self._attrs:
-            return EmptyAttr
-        return self._attrs[name]
+        return self._snapshot.attr(name)
 
     def get_attr_int_value(self, name: str) -> int:
-        attr = self._get_attr(name)
-        val = attr.value.value()
-        if isinstance(val, int):
-            return val
-        return 0
+        return self._snapshot.get(name)
 
     def names(self) -> List[str]:
-        return list(self._attrs.keys())
+        return self._snapshot.names()
 
-    def _get_kernel_used_mem(self) -> Attr:
+    def _get_kernel_used_mem(self) -> int:
         """
         From http://linuxperf.com/?cat=7
         Kernel Used Memory includes:
@@ -165,34 +167,21 @@ class MemoryInfo:
             6. Bounce
             7. X, alloc_pages/__get_free_pages, but not in /proc/meminfo
         """
-        slab = self._get_attr(SLAB)
-        vmalloc_used = self._get_attr(VMALLOCUSED)
-        page_tables = self._get_attr(PAGETABLES)
-        kernel_stack = self._get_attr(KERNELSTACK)
-        hw_corrupted = self._get_attr(HARDWARECORRUPTED)
-        bounce = self._get_attr(BOUNCE)
-        logger.debug("Kernel Used Memory Details, %s, %s, %s, %s, %s, %s",
-                     slab, vmalloc_used, page_tables, kernel_stack,
-                     hw_corrupted, bounce)
+        get = self._snapshot.get
         used = [
-            slab.value.value(),
-            vmalloc_used.value.value(),
-            page_tables.value.value(),
-            kernel_stack.value.value(),
-            hw_corrupted.value.value(),
-            bounce.value.value(),
+            get(SLAB),
+            get(VMALLOCUSED),
+            get(PAGETABLES),
+            get(KERNELSTACK),
+            get(HARDWARECORRUPTED),
+            get(BOUNCE),
         ]
-        kernel_used = 0
-        for val in used:
-            if isinstance(val, int):
-                kernel_used += val
-        kval = IntUnitValue(kernel_used, "kB")
-        kval.fmt = DEF_FMT_2
-        logger.debug("Total Kernel Used Memory: %d %s", kval.value(),
-                     kval.unit())
-        return Attr("KERNEL", kval)
-
-    def _get_user_used_mem(self) -> Attr:
+        logger.debug("Kernel Used Memory Details, %s", used)
+        kernel_used = sum(used)
+        logger.debug("Total Kernel Used Memory: %d kB", kernel_used)
+        return kernel_used
+
+    def _get_user_used_mem(self) -> int:
         """
         From http://linuxperf.com/?cat=7
         User Used Memory includes:
@@ -217,34 +206,33 @@ class MemoryInfo:
         >     但是还没有包括Page Cache中unmapped部分、以及HugePages，所以公式如下：
         >     ΣPss + (Cached – mapped) + Buffers + (HugePages_Total * Hugepagesize)
         """
-        cached = self._get_attr(CACHED)
-        anon_pages = self._get_attr(ANONPAGES)
-        buffers = self._get_attr(BUFFERS)
-        hp_total = self.get_attr_int_value(HUGEPAGES_TOTAL)
-        hp_size = self.get_attr_int_value(HUGEPAGESIZE)
-        logger.debug("User Used Memory Details, %s, %s, %s, %d, %d", cached,
-                     anon_pages, buffers, hp_total, hp_size)
+        get = self._snapshot.get
         used = [
-            cached.value.value(),
-            anon_pages.value.value(),
-            buffers.value.value(),
-            hp_total * hp_size,
+            get(CACHED),
+            get(ANONPAGES),
+            get(BUFFERS),
+            get(HUGEPAGES_TOTAL) * get(HUGEPAGESIZE),
         ]
-        user_used = 0
-        for val in used:
-            if isinstance(val, int):
-                user_used += val
-        uval = IntUnitValue(user_used, "kB")
-        uval.fmt = DEF_FMT_2
-        logger.debug("Total User Used Memory: %d %s", uval.value(),
-                     uval.unit())
-        return Attr("USER", uval)
+        logger.debug("User Used Memory Details, %s", used)
+        user_used = sum(used)
+        logger.debug("Total User Used Memory: %d kB", user_used)
+        return user_used
+
+    def _get_user_pss_mem(self, pss: int) -> int:
+        """
+        The third method of _get_user_used_mem:
+            ΣPss + (Cached - Mapped) + Buffers
+            + (HugePages_Total * Hugepagesize)
+        """
+        get = self._snapshot.get
+        return (pss + get(CACHED) - get(MAPPED) + get(BUFFERS) +
+                get(HUGEPAGES_TOTAL) * get(HUGEPAGESIZE))
 
     def get_attrs(self, names: List[str]) -> List[Attr]:
         attrs = []
         attrs.append(current_time_attr())
         if not names:
-            names = ["KERNEL", "USER", MEMFREE, MEMTOTAL]
+            names = [KERNEL, USER, MEMFREE, MEMTOTAL]
         if names:
             for name in names:
                 attr = self._get_attr(name)
@@ -377,3 +365,81 @@ class VmallocInfo:
         self._sorted_by_size = sorted(by_size,
                                       key=lambda pair: pair[1],
                                       reverse=True)
+
+
+_UNPURGED = VmallocInfo.UNPURGED.encode("utf-8")
+
+
+class CallerStat:
+    """vmalloc areas of one caller"""
+
+    __slots__ = ("caller", "count", "size_in_bytes", "pages")
+
+    def __init__(self, caller: str):
+        self.caller = caller
+        self.count = 0
+        self.size_in_bytes = 0
+        self.pages = 0
+
+
+class VmallocSummary:
+    """
+    Aggregates of /proc/vmallocinfo, folded line by line, the areas are
+    never kept. Callers are function names, the +offset/size is dropped.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.size_in_bytes = 0
+        self.pages = 0
+        # lazily freed areas, not counted in the totals above
+        self.unpurged_in_bytes = 0
+        self.callers: Dict[str, CallerStat] = {}
+        # N0, N1 ... -> pages on the memory node
+        self.nodes: Dict[str, int] = defaultdict(int)
+        # raw caller -> stat, every area of a caller shares one decode
+        self._raw_callers: Dict[bytes, CallerStat] = {}
+
+    def add(self, line: bytes):
+        tokens = line.split()
+        if len(tokens) < 3:
+            return
+        size = int(tokens[1])
+        if tokens[2] == _UNPURGED:
+            self.unpurged_in_bytes += size
+            return
+        stat = self._raw_callers.get(tokens[2])
+        if stat is None:
+            caller = tokens[2].split(b"+", 1)[0].decode("utf-8", "replace")
+            stat = self.callers.get(caller)
+            if stat is None:
+                stat = CallerStat(caller)
+                self.callers[caller] = stat
+            self._raw_callers[tokens[2]] = stat
+        stat.count += 1
+        stat.size_in_bytes += size
+        self.count += 1
+        self.size_in_bytes += size
+        for token in tokens[3:]:
+            if token.startswith(b"pages="):
+                pages = int(token[6:])
+                stat.pages += pages
+                self.pages += pages
+            elif token.startswith(b"N") and b"=" in token:
+                node, _, pages = token.partition(b"=")
+                self.nodes[node.decode("utf-8")] += int(pages)
+
+    def top(self, top: int = -1) -> List[CallerStat]:
+        """Callers by size"""
+        key = attrgetter("size_in_bytes")
+        if top <= 0:
+            return sorted(self.callers.values(), key=key, reverse=True)
+        return heapq.nlargest(top, self.callers.values(), key=key)
+
+
+def current_vmalloc_summary(path="/proc/vmallocinfo") -> VmallocSummary:
+    summary = VmallocSummary()
+    with open(path, mode="rb") as vminfo:
+        for line in vminfo:
+            summary.add(line)
+    return summary
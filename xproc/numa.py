@@ -0,0 +1,130 @@
+import os
+import time
+import operator
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from xproc.procfile import ProcFileReader
+from xproc.snapshot import Schema, Snapshot, intern_schema
+from xproc.vmstat import NUMA_FOREIGN, NUMA_HIT, NUMA_MISS
+
+NODE_ROOT = "/sys/devices/system/node"
+
+# nodeN/meminfo has FilePages in place of Cached
+FILEPAGES = "FilePages"
+NUMA_COUNTERS = [NUMA_HIT, NUMA_MISS, NUMA_FOREIGN]
+
+
+def list_nodes(root: str = NODE_ROOT) -> List[int]:
+    try:
+        with os.scandir(root) as entries:
+            return sorted(
+                int(entry.name[4:]) for entry in entries
+                if entry.name.startswith("node") and entry.name[4:].isdigit())
+    except FileNotFoundError:    # kernel without NUMA
+        return []
+
+
+def _parse_node(meminfo: bytes, numastat: bytes, names: List[bytes],
+                units: List[str], values: array):
+    """Node N Name: value [unit] lines, then name value lines"""
+    for line in meminfo.splitlines():
+        # strip "Node N "
+        tokens = line.split(None, 5)
+        if len(tokens) < 4:
+            continue
+        names.append(tokens[2].rstrip(b":"))
+        units.append(tokens[4].decode("utf-8") if len(tokens) > 4 else "")
+        values.append(int(tokens[3]))
+    for line in numastat.splitlines():
+        tokens = line.split()
+        if len(tokens) != 2:
+            continue
+        names.append(tokens[0])
+        units.append("")
+        values.append(int(tokens[1]))
+
+
+class NumaMatrix:
+    """
+    nodeN/meminfo and nodeN/numastat of every node in one flat int64
+    array, a row per node, the fields of a row are named by schema.
+    """
+
+    __slots__ = ("nodes", "schema", "values", "ts")
+
+    def __init__(self, nodes: List[int], schema: Schema, values: array,
+                 ts: float):
+        self.nodes = nodes
+        self.schema = schema
+        self.values = values
+        self.ts = ts
+
+    def row(self, idx: int) -> Snapshot:
+        ncols = len(self.schema)
+        return Snapshot(self.schema,
+                        self.values[idx * ncols:(idx + 1) * ncols], self.ts)
+
+    def column(self, name: str, values: Optional[array] = None) -> array:
+        """The value of name on every node, in values if laid out alike"""
+        if values is None:
+            values = self.values
+        col = self.schema.get_index(name)
+        if col < 0:
+            return array("q", [0] * len(self.nodes))
+        return values[col::len(self.schema)]
+
+    def delta(self, last: "NumaMatrix") -> array:
+        """Flat deltas since last, 0 when the layout changed"""
+        if last.nodes != self.nodes or last.schema is not self.schema:
+            return array("q", bytes(8 * len(self.values)))
+        return array("q", map(operator.sub, self.values, last.values))
+
+
+class NumaReader:
+    """Keep the node files open, every read is a pread per file"""
+
+    def __init__(self, root: str = NODE_ROOT):
+        self.nodes = list_nodes(root)
+        self._readers: List[Tuple[ProcFileReader, ProcFileReader]] = [
+            (ProcFileReader(f"{root}/node{node}/meminfo"),
+             ProcFileReader(f"{root}/node{node}/numastat"))
+            for node in self.nodes
+        ]
+        # raw names of every node -> schema
+        self._schemas: Dict[Tuple[bytes, ...], Schema] = {}
+
+    def read(self) -> NumaMatrix:
+        first: List[bytes] = []
+        units: List[str] = []
+        values = array("q")
+        for meminfo, numastat in self._readers:
+            names: List[bytes] = []
+            row = array("q")
+            _parse_node(meminfo.read(), numastat.read(), names, units, row)
+            if not first:
+                first = names
+            elif names != first:
+                # nodes of different layouts, in the layout of the first
+                index = dict(zip(names, row))
+                row = array("q", [index.get(name, 0) for name in first])
+            values.extend(row)
+        key = tuple(first)
+        schema = self._schemas.get(key)
+        if schema is None:
+            schema = intern_schema([name.decode("utf-8") for name in key],
+                                   units[:len(key)])
+            self._schemas[key] = schema
+        return NumaMatrix(list(self.nodes), schema, values, time.time())
+
+    def close(self):
+        for meminfo, numastat in self._readers:
+            meminfo.close()
+            numastat.close()
+        self._readers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,8 +1,11 @@
-from collections import OrderedDict
-from typing import Dict, List
-import pathlib
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
 import re
+import time
 
+from xproc.procfile import read_once
+from xproc.snapshot import Schema, Snapshot, intern_schema
 from xproc.value import (
     parse_int_val,
     parse_str_val,
@@ -10,6 +13,7 @@ from xproc.value import (
     DEF_FMT_1,
     DEF_FMT_2,
     Attr,
+    StrValue,
 )
 
 PID_PAT = re.compile(r"[1-9][0-9]+")
@@ -129,40 +133,143 @@ ATTR_DICT = {
 }
 
 
+# raw name in /proc/<pid>/status -> (name, unit), unit is None for str values
+_FIELDS: Dict[bytes, Tuple[str, Optional[str]]] = {}
+for _name, (_parser, _) in ATTR_DICT.items():
+    if _parser is parse_str_val:
+        _FIELDS[_name.encode("utf-8")] = (_name, None)
+    elif _parser is parse_int_unit_val:
+        _FIELDS[_name.encode("utf-8")] = (_name, "kB")
+    else:
+        _FIELDS[_name.encode("utf-8")] = (_name, "")
+_UNITS = {name: unit for name, unit in _FIELDS.values() if unit is not None}
+
+# names of a status file layout -> schema of its int values
+_SCHEMAS: Dict[Tuple[str, ...], Schema] = {}
+
+
+def status_unit(name: str) -> Optional[str]:
+    """Unit of an int field, "" without unit, None for str fields"""
+    return _UNITS.get(name)
+
+
+def _parse_all(data: bytes, names: List[str], values: array,
+               strs: Dict[str, str]):
+    for line in data.splitlines():
+        sep_idx = line.find(b":")
+        field = _FIELDS.get(line[0:sep_idx])
+        if field is None:
+            continue
+        name, unit = field
+        names.append(name)
+        val = line[sep_idx + 1:]
+        if unit is None:
+            strs[name] = val.strip().decode("utf-8")
+        else:
+            values.append(int(val.split(None, 1)[0]))
+
+
+# name -> b"\n<name>:"
+_KEYS = {name: b"\n" + raw + b":" for raw, (name, _) in _FIELDS.items()}
+
+
+def _parse_fields(data: bytes, fields: Sequence[str], names: List[str],
+                  values: array, strs: Dict[str, str]):
+    """
+    Search the requested keys in the raw bytes, the lines in between are
+    never split. Keys requested in the file order are found in one pass
+    which stops at the last one.
+    """
+    pos = 0
+    for name in fields:
+        key = _KEYS.get(name)
+        if key is None:
+            raise ValueError(f"unknown status field: {name}")
+        start = data.find(key, pos)
+        if start < 0:
+            start = data.find(key)
+        if start < 0:
+            if not data.startswith(key[1:]):
+                continue    # such as VmRSS of kernel threads
+            start = -1    # the first line, without the leading newline
+        start += len(key)
+        end = data.find(b"\n", start)
+        if end < 0:
+            end = len(data)
+        pos = end
+        names.append(name)
+        if _UNITS.get(name) is None:
+            strs[name] = data[start:end].strip().decode("utf-8")
+        else:
+            values.append(int(data[start:end].split(None, 1)[0]))
+
+
 class PIDStatus:
+    """
+    Fields of /proc/<pid>/status, every known field by default or only
+    the ones in fields.
+    """
 
-    def __init__(self, pid: int):
-        status_path = f"/proc/{pid}/status"
-        with open(status_path, mode="r", encoding="UTF-8") as status_fp:
-            lines = status_fp.readlines()
-        attrs: Dict[str, Attr] = OrderedDict()
-        for line in lines:
-            sep_idx = line.find(":")
-            name = line[0:sep_idx]
-            val = line[sep_idx + 1:-1]  # exclude \n
-            if name not in ATTR_DICT:
-                continue
-            parser, fmt = ATTR_DICT[name]
-            attr = parser(name, val)
-            attr.set_value_fmt(fmt)
-            attrs[name] = attr
-        self._attrs = attrs
+    def __init__(self,
+                 pid: int,
+                 path: Optional[str] = None,
+                 fields: Optional[Sequence[str]] = None,
+                 data: Optional[bytes] = None):
+        if data is None:
+            data = read_once(path or f"/proc/{pid}/status")
+        names: List[str] = []
+        values = array("q")
+        strs: Dict[str, str] = {}
+        if fields is None:
+            _parse_all(data, names, values, strs)
+        else:
+            _parse_fields(data, fields, names, values, strs)
+        key = tuple(names)
+        schema = _SCHEMAS.get(key)
+        if schema is None:
+            int_names = [name for name in names if name not in strs]
+            schema = intern_schema(
+                int_names, [_UNITS[name] for name in int_names])
+            _SCHEMAS[key] = schema
+        self._names = key
+        self._snapshot = Snapshot(schema, values, time.time())
+        self._strs = strs
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def _get_attr(self, name: str) -> Attr:
+        if name in self._strs:
+            return Attr(name, StrValue(self._strs[name]))
+        return self._snapshot.attr(name)
+
+    def get_int(self, name: str, default: int = 0) -> int:
+        """Value of an int field, in kB for the ones with a unit"""
+        return self._snapshot.get(name, default)
+
+    def get_str(self, name: str) -> str:
+        """Value of a str field, such as Name and Uid"""
+        return self._strs.get(name, "")
 
     def get(self, name: str) -> str:
-        if name not in self._attrs:
+        if name not in self._strs and name not in self._snapshot:
             return ""
-        attr = self._attrs[name]
-        return str(attr)
+        return str(self._get_attr(name))
 
     def names(self) -> List[str]:
-        return list(self._attrs.keys())
+        return list(self._names)
 
 
 def get_all_pidstatus() -> Dict[int, PIDStatus]:
     pids = {}
-    proc_path = pathlib.Path("/proc")
-    for process_path in proc_path.glob("*"):
-        if process_path.is_dir() and re.match(PID_PAT, process_path.name):
-            pid = int(process_path.name)
-            pids[pid] = PIDStatus(pid)
+    with os.scandir("/proc") as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            try:
+                pids[pid] = PIDStatus(pid)
+            except (FileNotFoundError, ProcessLookupError):
+                continue    # exited during the scan
     return pids
@@ -0,0 +1,114 @@
+import os
+from typing import Dict
+
+_INIT_BUF_SIZE = 4096
+
+
+class ProcFileReader:
+    """
+    Keep a /proc file open and reread it with pread into a reusable buffer.
+
+    seq_file backed proc files are regenerated on every read from offset 0,
+    so there is no need to reopen them between samples. They return short
+    reads before EOF, a read goes on until pread returns 0, unless single
+    tells that the file is generated in one go, such as /proc/<pid>/stat,
+    then a read shorter than the buffer is the whole content.
+    """
+
+    def __init__(self,
+                 path: str,
+                 bufsize: int = _INIT_BUF_SIZE,
+                 single: bool = False):
+        self._path = path
+        self._single = single
+        self._fd = -1
+        self._fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self._buf = bytearray(max(bufsize, 1))
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read(self) -> bytes:
+        """Return the whole file content, growing the buffer if needed"""
+        if self._fd < 0:
+            raise ValueError(f"read on closed proc file {self._path}")
+        view = memoryview(self._buf)
+        total = 0
+        while True:
+            # seq_file returns short reads before EOF, read until 0
+            nread = _pread_into(self._fd, view[total:], total)
+            if nread == 0:
+                return bytes(view[:total])
+            total += nread
+            if self._single and total < len(self._buf):
+                return bytes(view[:total])
+            if total == len(self._buf):
+                self._buf = bytearray(len(self._buf) * 2)
+                self._buf[:total] = view
+                view = memoryview(self._buf)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+if hasattr(os, "preadv"):
+
+    def _pread_into(fd: int, buf: memoryview, offset: int) -> int:
+        return os.preadv(fd, [buf], offset)
+else:
+
+    def _pread_into(fd: int, buf: memoryview, offset: int) -> int:
+        data = os.pread(fd, len(buf), offset)
+        buf[0:len(data)] = data
+        return len(data)
+
+
+def read_once(path: str, bufsize: int = _INIT_BUF_SIZE) -> bytes:
+    """Open, read and close path, for files read once such as per pid ones"""
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, bufsize)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+_READERS: Dict[str, ProcFileReader] = {}
+
+
+def get_reader(path: str) -> ProcFileReader:
+    """Return the shared reader of path, open it on first use"""
+    reader = _READERS.get(path)
+    if reader is None:
+        reader = ProcFileReader(path)
+        _READERS[path] = reader
+    return reader
+
+
+def read_proc(path: str) -> bytes:
+    return get_reader(path).read()
+
+
+def close_all():
+    for reader in _READERS.values():
+        reader.close()
+    _READERS.clear()
@@ -0,0 +1,233 @@
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Dict, Iterator, List, NamedTuple, Optional, Sequence,
+                    Tuple)
+
+from xproc import pidstatus
+from xproc.procfile import read_once
+from xproc.snapshot import Schema, Snapshot, intern_schema
+
+# /proc/<pid>/stat fields after "pid (comm)", see proc(5)
+STAT_STATE = "state"
+STAT_PPID = "ppid"
+STAT_PGRP = "pgrp"
+STAT_SESSION = "session"
+STAT_TTY_NR = "tty_nr"
+STAT_TPGID = "tpgid"
+STAT_FLAGS = "flags"
+STAT_MINFLT = "minflt"
+STAT_CMINFLT = "cminflt"
+STAT_MAJFLT = "majflt"
+STAT_CMAJFLT = "cmajflt"
+STAT_UTIME = "utime"
+STAT_STIME = "stime"
+STAT_CUTIME = "cutime"
+STAT_CSTIME = "cstime"
+STAT_PRIORITY = "priority"
+STAT_NICE = "nice"
+STAT_NUM_THREADS = "num_threads"
+STAT_ITREALVALUE = "itrealvalue"
+STAT_STARTTIME = "starttime"
+STAT_VSIZE = "vsize"
+STAT_RSS = "rss"
+STAT_RSSLIM = "rsslim"
+STAT_STARTCODE = "startcode"
+STAT_ENDCODE = "endcode"
+STAT_STARTSTACK = "startstack"
+STAT_KSTKESP = "kstkesp"
+STAT_KSTKEIP = "kstkeip"
+STAT_SIGNAL = "signal"
+STAT_BLOCKED = "blocked"
+STAT_SIGIGNORE = "sigignore"
+STAT_SIGCATCH = "sigcatch"
+STAT_WCHAN = "wchan"
+STAT_NSWAP = "nswap"
+STAT_CNSWAP = "cnswap"
+STAT_EXIT_SIGNAL = "exit_signal"
+STAT_PROCESSOR = "processor"
+STAT_RT_PRIORITY = "rt_priority"
+STAT_POLICY = "policy"
+STAT_DELAYACCT_BLKIO_TICKS = "delayacct_blkio_ticks"
+STAT_GUEST_TIME = "guest_time"
+STAT_CGUEST_TIME = "cguest_time"
+
+STAT_FIELDS = (
+    STAT_STATE, STAT_PPID, STAT_PGRP, STAT_SESSION, STAT_TTY_NR, STAT_TPGID,
+    STAT_FLAGS, STAT_MINFLT, STAT_CMINFLT, STAT_MAJFLT, STAT_CMAJFLT,
+    STAT_UTIME, STAT_STIME, STAT_CUTIME, STAT_CSTIME, STAT_PRIORITY,
+    STAT_NICE, STAT_NUM_THREADS, STAT_ITREALVALUE, STAT_STARTTIME,
+    STAT_VSIZE, STAT_RSS, STAT_RSSLIM, STAT_STARTCODE, STAT_ENDCODE,
+    STAT_STARTSTACK, STAT_KSTKESP, STAT_KSTKEIP, STAT_SIGNAL, STAT_BLOCKED,
+    STAT_SIGIGNORE, STAT_SIGCATCH, STAT_WCHAN, STAT_NSWAP, STAT_CNSWAP,
+    STAT_EXIT_SIGNAL, STAT_PROCESSOR, STAT_RT_PRIORITY, STAT_POLICY,
+    STAT_DELAYACCT_BLKIO_TICKS, STAT_GUEST_TIME, STAT_CGUEST_TIME)
+_STAT_INDEX = {name: idx for idx, name in enumerate(STAT_FIELDS)}
+
+DEFAULT_FIELDS = (STAT_PPID, STAT_MINFLT, STAT_MAJFLT, STAT_UTIME,
+                  STAT_STIME, STAT_NUM_THREADS, STAT_STARTTIME, STAT_RSS)
+
+# a pid exits between listing /proc and reading its files
+RACE_ERRORS = (FileNotFoundError, ProcessLookupError, NotADirectoryError)
+
+
+class ProcEntry(NamedTuple):
+    pid: int
+    tgid: int    # pid of the thread group leader, pid for processes
+    comm: str
+    state: str
+    snapshot: Snapshot    # int values of the requested fields
+    strs: Dict[str, str]    # str values of the requested status fields
+
+
+def stat_columns(fields: Sequence[str]) -> List[int]:
+    """Indexes of the int stat fields, for parse_stat"""
+    return [_STAT_INDEX[name] for name in fields if name != STAT_STATE]
+
+
+def parse_stat(data: bytes, cols: Sequence[int]) -> Tuple[str, str, array]:
+    """
+    (comm, state, values of cols) of a /proc/<pid>/stat. comm may hold
+    spaces and parentheses, the fields are split after the last ')'.
+    """
+    lpar = data.find(b"(")
+    rpar = data.rfind(b")")
+    tokens = data[rpar + 2:].split()
+    return (data[lpar + 1:rpar].decode("utf-8", "replace"),
+            tokens[0].decode("utf-8"),
+            array("q", [int(tokens[col]) for col in cols]))
+
+
+def list_pids(proc: str = "/proc") -> List[int]:
+    with os.scandir(proc) as entries:
+        return [int(entry.name) for entry in entries if entry.name.isdigit()]
+
+
+def list_tids(pid: int, proc: str = "/proc") -> List[int]:
+    try:
+        with os.scandir(f"{proc}/{pid}/task") as entries:
+            return [int(entry.name) for entry in entries]
+    except RACE_ERRORS:
+        return []
+
+
+class ProcTable:
+    """
+    Scan the processes(and optionally the threads) of /proc.
+
+    Only the requested fields are parsed. /proc/<pid>/stat is the fast
+    path, /proc/<pid>/status is only read when a requested field is not in
+    stat. Processes exiting during a scan are skipped. With workers > 0 the
+    reads fan out over a thread pool, the reads release the GIL.
+    """
+
+    def __init__(self,
+                 fields: Sequence[str] = DEFAULT_FIELDS,
+                 threads: bool = False,
+                 workers: int = 0,
+                 proc: str = "/proc"):
+        stat_cols: List[int] = []
+        status_names: List[str] = []
+        names: List[str] = []
+        units: List[str] = []
+        self._str_names: List[str] = []
+        for name in fields:
+            if name == STAT_STATE:
+                continue    # always parsed, a str
+            if name in _STAT_INDEX:
+                stat_cols.append(_STAT_INDEX[name])
+                names.append(name)
+                units.append("")
+                continue
+            if name not in pidstatus.ATTR_DICT:
+                raise ValueError(f"unknown process field: {name}")
+            unit = pidstatus.status_unit(name)
+            if unit is None:
+                self._str_names.append(name)
+            else:
+                status_names.append(name)
+                names.append(name)
+                units.append(unit)
+        self.fields = tuple(fields)
+        self.threads = threads
+        self.schema: Schema = intern_schema(names, units)
+        self._stat_cols = stat_cols
+        self._status_names = status_names
+        self._status_fields = [
+            name for name in fields if name in status_names or
+            name in self._str_names
+        ]
+        self._need_status = bool(self._status_fields)
+        self._proc = proc
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def read(self,
+             pid: int,
+             tgid: Optional[int] = None) -> Optional[ProcEntry]:
+        """Read one process or thread, None if it has exited"""
+        tgid = pid if tgid is None else tgid
+        base = (f"{self._proc}/{pid}" if tgid == pid else
+                f"{self._proc}/{tgid}/task/{pid}")
+        try:
+            data = read_once(f"{base}/stat")
+            status = pidstatus.PIDStatus(
+                pid, path=f"{base}/status",
+                fields=self._status_fields) if self._need_status else None
+        except RACE_ERRORS:
+            return None
+        comm, state, values = parse_stat(data, self._stat_cols)
+        strs: Dict[str, str] = {}
+        if status is not None:
+            values.extend(
+                [status.get_int(name) for name in self._status_names])
+            for name in self._str_names:
+                strs[name] = status.get_str(name)
+        return ProcEntry(pid, tgid, comm, state,
+                         Snapshot(self.schema, values, time.time()), strs)
+
+    def _read_all(self, pid: int) -> List[ProcEntry]:
+        if not self.threads:
+            entry = self.read(pid)
+            return [entry] if entry is not None else []
+        entries = []
+        for tid in list_tids(pid, self._proc):
+            entry = self.read(tid, pid)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def _read_batch(self, pids: List[int]) -> List[ProcEntry]:
+        entries = []
+        for pid in pids:
+            entries.extend(self._read_all(pid))
+        return entries
+
+    def iter_entries(self) -> Iterator[ProcEntry]:
+        pids = list_pids(self._proc)
+        if self._executor is None:
+            yield from self._read_batch(pids)
+            return
+        # a batch per task, a future per pid costs more than the read
+        size = max(len(pids) // (self._workers * 4), 16)
+        batches = [pids[i:i + size] for i in range(0, len(pids), size)]
+        for entries in self._executor.map(self._read_batch, batches):
+            yield from entries
+
+    def scan(self) -> Dict[int, ProcEntry]:
+        """pid(tid with threads) -> entry of the live processes"""
+        return {entry.pid: entry for entry in self.iter_entries()}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,213 @@
+import os
+import errno
+import time
+import select
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from xproc.procfile import ProcFileReader
+from xproc.uptime import current_uptime
+
+PRESSURE_ROOT = "/proc/pressure"
+
+CPU = "cpu"
+MEMORY = "memory"
+IO = "io"
+RESOURCES = (CPU, MEMORY, IO)
+
+SOME = "some"
+FULL = "full"
+
+# the kernel accepts trigger windows of 500ms to 10s
+MIN_WINDOW_US = 500000
+MAX_WINDOW_US = 10000000
+
+
+class PressureLine(NamedTuple):
+    avg10: float    # percent of time stalled, the last 10 seconds
+    avg60: float
+    avg300: float
+    total: int    # usec stalled since boot
+
+
+EmptyPressureLine = PressureLine(0.0, 0.0, 0.0, 0)
+
+
+class Pressure(NamedTuple):
+    resource: str
+    some: PressureLine    # at least one task stalled
+    full: PressureLine    # all non-idle tasks stalled, 0 for cpu before 5.13
+    ts: float
+
+    def stall(self, last: Optional["Pressure"] = None) -> Dict[str, float]:
+        """
+        Percent of time stalled since last, since boot without last, of
+        some and full.
+        """
+        if last is None:
+            secs = current_uptime().since_boot_in_seconds
+            some, full = self.some.total, self.full.total
+        else:
+            secs = self.ts - last.ts
+            some = self.some.total - last.some.total
+            full = self.full.total - last.full.total
+        per_sec = 1e-4 / max(secs, 1e-9)
+        return {SOME: some * per_sec, FULL: full * per_sec}
+
+
+def parse_pressure(data: bytes) -> Dict[str, PressureLine]:
+    """some avg10=0.00 avg60=0.00 avg300=0.00 total=0"""
+    lines = {}
+    for line in data.splitlines():
+        tokens = line.split()
+        if len(tokens) != 5:
+            continue
+        kind, avg10, avg60, avg300, total = tokens
+        lines[kind.decode("utf-8")] = PressureLine(float(avg10[6:]),
+                                                   float(avg60[6:]),
+                                                   float(avg300[7:]),
+                                                   int(total[6:]))
+    return lines
+
+
+def supported(root: str = PRESSURE_ROOT) -> bool:
+    """Linux 4.20+ built with CONFIG_PSI, and not psi=0"""
+    return os.path.exists(f"{root}/{CPU}")
+
+
+class PressureReader:
+    """Keep the pressure files open, a read is a pread per resource"""
+
+    def __init__(self,
+                 resources: Sequence[str] = RESOURCES,
+                 root: str = PRESSURE_ROOT):
+        self.resources = list(resources)
+        self._readers = [
+            ProcFileReader(f"{root}/{resource}") for resource in resources
+        ]
+
+    def read(self) -> List[Pressure]:
+        pressures = []
+        for resource, reader in zip(self.resources, self._readers):
+            lines = parse_pressure(reader.read())
+            pressures.append(
+                Pressure(resource, lines.get(SOME, EmptyPressureLine),
+                         lines.get(FULL, EmptyPressureLine), time.monotonic()))
+        return pressures
+
+    def close(self):
+        for reader in self._readers:
+            reader.close()
+        self._readers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PsiTrigger:
+    """
+    A kernel PSI threshold, stall_us of kind stalled in window_us.
+
+    The threshold is written to a pressure fd kept open, the kernel then
+    raises POLLPRI on the fd once the threshold is crossed, at most once
+    per window. Without CAP_SYS_RESOURCE, Linux 6.5+ takes only windows
+    of a multiple of 2s, the write fails with EINVAL otherwise.
+    """
+
+    def __init__(self,
+                 resource: str,
+                 kind: str,
+                 stall_us: int,
+                 window_us: int,
+                 root: str = PRESSURE_ROOT):
+        if kind not in (SOME, FULL):
+            raise ValueError(f"kind is some or full: {kind}")
+        if not MIN_WINDOW_US <= window_us <= MAX_WINDOW_US:
+            raise ValueError(f"window is 500ms to 10s: {window_us}us")
+        if not 0 < stall_us <= window_us:
+            raise ValueError(f"stall is 0 to window: {stall_us}us")
+        self.resource = resource
+        self.kind = kind
+        self.stall_us = stall_us
+        self.window_us = window_us
+        self._fd = -1
+        self._fd = os.open(f"{root}/{resource}",
+                           os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            os.write(self._fd, f"{kind} {stall_us} {window_us}\0".encode())
+        except OSError as ex:
+            self.close()
+            if ex.errno == errno.EINVAL:
+                raise ValueError(
+                    f"{self} is rejected, the window must be a multiple of "
+                    "2s without CAP_SYS_RESOURCE") from ex
+            raise
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read(self) -> Pressure:
+        """The pressure of resource, read through the trigger fd"""
+        lines = parse_pressure(os.pread(self._fd, 4096, 0))
+        return Pressure(self.resource, lines.get(SOME, EmptyPressureLine),
+                        lines.get(FULL, EmptyPressureLine), time.monotonic())
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __str__(self) -> str:
+        return (f"{self.resource} {self.kind} {self.stall_us // 1000}ms/"
+                f"{self.window_us // 1000}ms")
+
+
+class PsiMonitor:
+    """Block in poll until a trigger fires, no sampling in between"""
+
+    def __init__(self, triggers: Sequence[PsiTrigger]):
+        self.triggers = list(triggers)
+        self._poller = select.poll()
+        self._by_fd: Dict[int, PsiTrigger] = {}
+        for trigger in self.triggers:
+            self._poller.register(trigger.fileno(), select.POLLPRI)
+            self._by_fd[trigger.fileno()] = trigger
+
+    def wait(self, timeout: Optional[float] = None) -> List[PsiTrigger]:
+        """
+        The triggers fired within timeout seconds, forever without timeout.
+        POLLERR means the monitored cgroup is gone, which is an error.
+        """
+        msecs = None if timeout is None else int(timeout * 1000)
+        fired = []
+        for fd, events in self._poller.poll(msecs):
+            if events & select.POLLERR:
+                raise OSError(f"psi trigger is gone: {self._by_fd[fd]}")
+            if events & select.POLLPRI:
+                fired.append(self._by_fd[fd])
+        return fired
+
+    def close(self):
+        for trigger in self.triggers:
+            self._poller.unregister(trigger.fileno())
+            trigger.close()
+        self.triggers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def parse_trigger(text: str, root: str = PRESSURE_ROOT) -> PsiTrigger:
+    """RESOURCE:KIND:STALL_MS:WINDOW_MS, such as memory:some:150:1000"""
+    parts = text.split(":")
+    if len(parts) != 4 or parts[0] not in RESOURCES:
+        raise ValueError(f"expect RESOURCE:KIND:STALL_MS:WINDOW_MS: {text}")
+    resource, kind, stall, window = parts
+    return PsiTrigger(resource, kind,
+                      int(float(stall) * 1000), int(float(window) * 1000),
+                      root)
@@ -0,0 +1,103 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from xproc.procfile import read_once
+from xproc.proctable import RACE_ERRORS, STAT_STARTTIME, ProcTable
+
+logger = logging.getLogger("xproc.pss")
+
+DEFAULT_WORKERS = 8
+# seconds a Pss stays valid
+DEFAULT_TTL = 10.0
+
+_PSS_KEY = b"\nPss:"
+
+
+def parse_pss(data: bytes) -> int:
+    """Sum of the Pss lines in kB, smaps_rollup has one, smaps one a vma"""
+    total = 0
+    pos = data.find(_PSS_KEY)
+    while pos >= 0:
+        start = pos + len(_PSS_KEY)
+        total += int(data[start:data.find(b"k", start)])
+        pos = data.find(_PSS_KEY, start)
+    return total
+
+
+def read_pss(pid: int, proc: str = "/proc") -> Optional[int]:
+    """
+    Pss of pid in kB from smaps_rollup, or smaps before Linux 4.14.
+    None if the process has exited or is not readable.
+    """
+    try:
+        try:
+            data = read_once(f"{proc}/{pid}/smaps_rollup")
+        except FileNotFoundError:
+            data = read_once(f"{proc}/{pid}/smaps")
+    except RACE_ERRORS + (PermissionError,):
+        return None
+    return parse_pss(data)
+
+
+class PssAggregator:
+    """
+    ΣPss of all the processes.
+
+    The Pss of a process is cached by (pid, starttime) for ttl seconds, a
+    refresh only reads the stat of every pid to get the start times, the
+    expired and the new processes are read by a worker pool.
+    """
+
+    def __init__(self,
+                 workers: int = DEFAULT_WORKERS,
+                 ttl: float = DEFAULT_TTL,
+                 proc: str = "/proc"):
+        self.ttl = ttl
+        self._proc = proc
+        self._table = ProcTable(fields=(STAT_STARTTIME,), proc=proc)
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+        # (pid, starttime) -> (Pss kB, expire at)
+        self._cache: Dict[Tuple[int, int], Tuple[int, float]] = {}
+        self.reads = 0    # smaps reads of the last refresh
+
+    def _read(self, pid: int) -> int:
+        pss = read_pss(pid, self._proc)
+        return 0 if pss is None else pss
+
+    def refresh(self) -> Dict[Tuple[int, int], int]:
+        """(pid, starttime) -> Pss kB of the live processes"""
+        now = time.monotonic()
+        keys = [(entry.pid, entry.snapshot.values[0])
+                for entry in self._table.iter_entries()]
+        cache: Dict[Tuple[int, int], Tuple[int, float]] = {}
+        missed: List[Tuple[int, int]] = []
+        for key in keys:
+            item = self._cache.get(key)
+            if item is None or item[1] <= now:
+                missed.append(key)
+            else:
+                cache[key] = item
+        expire = now + self.ttl
+        for key, pss in zip(
+                missed,
+                self._executor.map(self._read, [pid for pid, _ in missed])):
+            cache[key] = (pss, expire)
+        self.reads = len(missed)
+        logger.debug("pss of %d processes, %d read", len(keys), len(missed))
+        # exited processes are dropped
+        self._cache = cache
+        return {key: item[0] for key, item in cache.items()}
+
+    def total(self) -> int:
+        return sum(self.refresh().values())
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
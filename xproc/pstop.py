@@ -0,0 +1,143 @@
+import os
+import heapq
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from xproc import uptime
+from xproc.pidstatus import (
+    PS_CPUS_ALLOWED_LIST,
+    PS_NAME,
+    PS_NONVOLUNTARY_CTXT_SWITCHES,
+    PS_UID,
+    PS_VMRSS,
+    PS_VOLUNTARY_CTXT_SWITCHES,
+    PIDStatus,
+)
+from xproc.proctable import (
+    RACE_ERRORS,
+    STAT_MAJFLT,
+    STAT_STARTTIME,
+    STAT_STIME,
+    STAT_UTIME,
+    ProcEntry,
+    ProcTable,
+)
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# fields read on every tick
+_FIELDS = (STAT_UTIME, STAT_STIME, STAT_MAJFLT, STAT_STARTTIME, PS_VMRSS,
+           PS_VOLUNTARY_CTXT_SWITCHES, PS_NONVOLUNTARY_CTXT_SWITCHES)
+
+# fields read once per pid
+_NEW_FIELDS = (PS_NAME, PS_UID, PS_CPUS_ALLOWED_LIST)
+
+
+class ProcessRow(NamedTuple):
+    pid: int
+    name: str
+    uid: str
+    cpus: str    # Cpus_allowed_list
+    cpu: float    # percent of one cpu
+    rss: int    # kB
+    ctxsw: float    # context switches per second
+    majflt: float    # major faults per second
+
+
+SORT_KEYS = {
+    "cpu": lambda row: row.cpu,
+    "rss": lambda row: row.rss,
+    "ctx": lambda row: row.ctxsw,
+    "majflt": lambda row: row.majflt,
+    "pid": lambda row: -row.pid,
+}
+
+
+class _ProcState:
+    """What is kept of a live pid between two ticks"""
+
+    __slots__ = ("starttime", "name", "uid", "cpus", "ticks", "ctxsw",
+                 "majflt", "ts")
+
+    def __init__(self, starttime: int, name: str, uid: str, cpus: str):
+        self.starttime = starttime
+        self.name = name
+        self.uid = uid
+        self.cpus = cpus
+        self.ticks = 0
+        self.ctxsw = 0
+        self.majflt = 0
+        self.ts = 0.0
+
+
+def _new_state(entry: ProcEntry, starttime: int) -> Optional[_ProcState]:
+    """Name, Uid and Cpus_allowed hardly change, they are read once"""
+    try:
+        status = PIDStatus(entry.pid, fields=_NEW_FIELDS)
+    except RACE_ERRORS:
+        return None
+    return _ProcState(starttime,
+                      status.get_str(PS_NAME) or entry.comm,
+                      status.get_str(PS_UID).split("\t", 1)[0],
+                      status.get_str(PS_CPUS_ALLOWED_LIST))
+
+
+class ProcessTop:
+    """
+    Per pid rates between ticks, like top.
+
+    A state table keyed by pid keeps the counters of the last tick, the
+    state of an exited pid is dropped, a reused pid is detected by its
+    start time. The first row of a pid is its average since it started.
+    """
+
+    def __init__(self, pids: Optional[Iterable[int]] = None,
+                 workers: int = 0):
+        self._pids = sorted(set(pids)) if pids else None
+        self._table = ProcTable(fields=_FIELDS, workers=workers)
+        self._states: Dict[int, _ProcState] = {}
+
+    def _entries(self) -> Iterable[ProcEntry]:
+        if self._pids is None:
+            return self._table.iter_entries()
+        entries = (self._table.read(pid) for pid in self._pids)
+        return [entry for entry in entries if entry is not None]
+
+    def update(self) -> List[ProcessRow]:
+        now = time.monotonic()
+        boot_secs = uptime.current_uptime().since_boot_in_seconds
+        states: Dict[int, _ProcState] = {}
+        rows = []
+        for entry in self._entries():
+            (utime, stime, majflt, starttime, rss, vol,
+             nonvol) = entry.snapshot.values
+            ticks, ctxsw = utime + stime, vol + nonvol
+            state = self._states.get(entry.pid)
+            if state is None or state.starttime != starttime:
+                state = _new_state(entry, starttime)
+                if state is None:
+                    continue
+                secs = boot_secs - starttime / CLK_TCK
+            else:
+                secs = now - state.ts
+            secs = max(secs, 1e-9)
+            rows.append(
+                ProcessRow(entry.pid, state.name, state.uid, state.cpus,
+                           (ticks - state.ticks) * 100 / CLK_TCK / secs, rss,
+                           (ctxsw - state.ctxsw) / secs,
+                           (majflt - state.majflt) / secs))
+            state.ticks, state.ctxsw, state.majflt = ticks, ctxsw, majflt
+            state.ts = now
+            states[entry.pid] = state
+        self._states = states
+        return rows
+
+    def top(self, sort: str = "cpu", top: int = -1) -> List[ProcessRow]:
+        rows = self.update()
+        key = SORT_KEYS[sort]
+        if top > 0:
+            return heapq.nlargest(top, rows, key=key)
+        return sorted(rows, key=key, reverse=True)
+
+    def close(self):
+        self._table.close()
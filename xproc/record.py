@@ -0,0 +1,478 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from abc import ABCMeta, abstractmethod
+from array import array
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from xproc import irq, load, meminfo, stat, vmstat
+from xproc.snapshot import Schema, Snapshot, intern_schema
+from xproc.value import Attr, FloatValue, IntValue, StrValue, current_time_attr
+
+# File layout, every integer is little endian:
+#   MAGIC, u32 header length, json header
+#   uncompressed: rows of int64, [ts in microseconds, values of sources...]
+#   compressed: blocks of [u32 rows, u32 compressed length, zlib(rows)]
+MAGIC = b"XPR1"
+VERSION = 1
+DEFAULT_BLOCK_ROWS = 256
+
+_HEADER = struct.Struct("<4sI")
+_BLOCK = struct.Struct("<II")
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class RecordSource(metaclass=ABCMeta):
+    """Int columns of a recorded source, the layout is fixed at creation"""
+
+    name = ""
+
+    def __init__(self,
+                 fields: Sequence[str],
+                 units: Optional[Sequence[str]] = None,
+                 scales: Optional[Sequence[int]] = None,
+                 labels: Optional[Sequence[str]] = None):
+        self.fields = list(fields)
+        self.units = list(units or [""] * len(self.fields))
+        self.scales = list(scales or [1] * len(self.fields))
+        self.labels = list(labels or [])
+
+    def header(self) -> Dict:
+        header = {
+            "name": self.name,
+            "fields": self.fields,
+            "units": self.units,
+            "scales": self.scales,
+        }
+        if self.labels:
+            header["labels"] = self.labels
+        return header
+
+    @abstractmethod
+    def values(self) -> Sequence[int]:
+        pass
+
+
+class _SnapshotRecordSource(RecordSource):
+
+    def __init__(self):
+        snapshot = self._read()
+        super().__init__(snapshot.schema.names, snapshot.schema.units)
+        self._schema = snapshot.schema
+
+    @abstractmethod
+    def _read(self) -> Snapshot:
+        pass
+
+    def values(self) -> Sequence[int]:
+        snapshot = self._read()
+        if snapshot.schema is self._schema:
+            return snapshot.values
+        return [snapshot.get(name) for name in self.fields]
+
+
+class MemRecordSource(_SnapshotRecordSource):
+    name = "mem"
+
+    def _read(self) -> Snapshot:
+        return meminfo.MemoryInfo().snapshot
+
+
+class VMStatRecordSource(_SnapshotRecordSource):
+    name = "vmstat"
+
+    def _read(self) -> Snapshot:
+        return vmstat.VMStat().snapshot
+
+
+_LOAD_SCALE = 100
+
+
+class LoadRecordSource(RecordSource):
+    name = "load"
+
+    FIELDS = [
+        "LOAD_1_MIN", "LOAD_5_MIN", "LOAD_15_MIN", "NR_RUNNING", "NR_TOTAL",
+        "LAST_PID"
+    ]
+
+    def __init__(self):
+        super().__init__(LoadRecordSource.FIELDS,
+                         scales=[_LOAD_SCALE] * 3 + [1] * 3)
+
+    def values(self) -> Sequence[int]:
+        avg = load.current_loadavg()
+        return [
+            int(round(avg.load_1 * _LOAD_SCALE)),
+            int(round(avg.load_5 * _LOAD_SCALE)),
+            int(round(avg.load_15 * _LOAD_SCALE)),
+            avg.nr_running,
+            avg.nr_total,
+            avg.last_pid,
+        ]
+
+
+class IrqRecordSource(RecordSource):
+    """Total count of every interrupt, columns are the interrupt labels"""
+
+    name = "irq"
+
+    def __init__(self):
+        matrix = irq.get_matrix()
+        fields = matrix.labels + ["ERR", "MIS"]
+        labels = [" ".join(extra) for extra in matrix.extras] + ["", ""]
+        super().__init__(fields, labels=labels)
+        self._matrix = matrix
+
+    def values(self) -> Sequence[int]:
+        matrix = irq.get_matrix(out=self._matrix)
+        totals = matrix.row_totals() + [matrix.err, matrix.mis]
+        if matrix.labels == self.fields[:-2]:
+            return totals
+        by_label = dict(zip(matrix.labels + ["ERR", "MIS"], totals))
+        return [by_label.get(label, 0) for label in self.fields]
+
+
+class StatRecordSource(RecordSource):
+    name = "stat"
+
+    FIELDS = list(stat.CPUStat._fields) + [
+        "ctxt", "processes", "procs_running", "procs_blocked", "intr"
+    ]
+
+    def __init__(self):
+        super().__init__(StatRecordSource.FIELDS)
+
+    def values(self) -> Sequence[int]:
+        sys_stat = stat.current_system_stat()
+        return list(sys_stat.cpu) + [
+            sys_stat.ctxt, sys_stat.processes, sys_stat.procs_running,
+            sys_stat.procs_blocked, sys_stat.intr_total
+        ]
+
+
+RECORD_SOURCES = {
+    MemRecordSource.name: MemRecordSource,
+    VMStatRecordSource.name: VMStatRecordSource,
+    LoadRecordSource.name: LoadRecordSource,
+    IrqRecordSource.name: IrqRecordSource,
+    StatRecordSource.name: StatRecordSource,
+}
+
+
+def _to_bytes(row: array) -> bytes:
+    if _BIG_ENDIAN:
+        row.byteswap()
+    return row.tobytes()
+
+
+def _from_bytes(data: bytes) -> array:
+    row = array("q")
+    row.frombytes(data)
+    if _BIG_ENDIAN:
+        row.byteswap()
+    return row
+
+
+class Recorder:
+    """Append samples of sources to a recording file"""
+
+    def __init__(self,
+                 path: str,
+                 sources: List[RecordSource],
+                 interval: float,
+                 compress: bool = False,
+                 block_rows: int = DEFAULT_BLOCK_ROWS):
+        self._sources = sources
+        self._compress = compress
+        self._block_rows = max(block_rows, 1)
+        self._pending: List[bytes] = []
+        header = {
+            "version": VERSION,
+            "host": os.uname().nodename,
+            "interval": interval,
+            "compress": compress,
+            "sources": [source.header() for source in sources],
+        }
+        raw = json.dumps(header).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, len(raw)))
+        self._file.write(raw)
+        self._file.flush()
+
+    def record(self, now: Optional[float] = None):
+        if now is None:
+            now = time.time()
+        row = array("q", [int(now * 1000000)])
+        for source in self._sources:
+            row.extend(source.values())
+        data = _to_bytes(row)
+        if not self._compress:
+            self._file.write(data)
+            self._file.flush()
+            return
+        self._pending.append(data)
+        if len(self._pending) >= self._block_rows:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self._pending:
+            return
+        block = zlib.compress(b"".join(self._pending))
+        self._file.write(_BLOCK.pack(len(self._pending), len(block)))
+        self._file.write(block)
+        self._file.flush()
+        self._pending = []
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_block()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordedSource(NamedTuple):
+    name: str
+    schema: Schema
+    scales: List[int]
+    labels: List[str]
+    start: int    # index of the first column in a row
+
+    def snapshot(self, row: array) -> Snapshot:
+        values = row[self.start:self.start + len(self.schema)]
+        return Snapshot(self.schema, values, row[0] / 1000000)
+
+
+class Recording:
+    """Read a recording file through mmap, rows are loaded on access"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(),
+                                 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError as ex:    # empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a xproc recording") from ex
+        except OSError:
+            self._file.close()
+            raise
+        try:
+            self._load(path)
+        except (KeyError, TypeError) as ex:
+            self.close()
+            raise ValueError(f"{path} has a bad header: {ex!r}") from ex
+        except BaseException:
+            self.close()
+            raise
+
+    def _load(self, path: str):
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"{path} is not a xproc recording")
+        magic, header_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a xproc recording")
+        data_off = _HEADER.size + header_len
+        if data_off > len(self._mm):
+            raise ValueError(f"{path} has a truncated header")
+        header = json.loads(self._mm[_HEADER.size:data_off].decode("utf-8"))
+        self.header = header
+        self.interval: float = header["interval"]
+        self.sources: Dict[str, RecordedSource] = {}
+        ncols = 1    # ts
+        for src in header["sources"]:
+            schema = intern_schema(src["fields"], src["units"])
+            self.sources[src["name"]] = RecordedSource(src["name"], schema,
+                                                       src["scales"],
+                                                       src.get("labels", []),
+                                                       ncols)
+            ncols += len(schema)
+        self._row_size = 8 * ncols
+        self._data_off = data_off
+        self._compress: bool = header["compress"]
+        # compressed: offsets, first row indexes and row counts of blocks
+        self._blocks: List[Tuple[int, int]] = []
+        self._block_first: List[int] = []
+        self._cached: Tuple[int, bytes] = (-1, b"")
+        if self._compress:
+            self._nrows = self._index_blocks()
+        else:
+            self._nrows = (len(self._mm) - data_off) // self._row_size
+
+    def _index_blocks(self) -> int:
+        offset, nrows = self._data_off, 0
+        size = len(self._mm)
+        while offset + _BLOCK.size <= size:
+            rows, length = _BLOCK.unpack_from(self._mm, offset)
+            if offset + _BLOCK.size + length > size:
+                break    # partial block of a live recording
+            self._blocks.append((offset + _BLOCK.size, length))
+            self._block_first.append(nrows)
+            offset += _BLOCK.size + length
+            nrows += rows
+        return nrows
+
+    def __len__(self) -> int:
+        return self._nrows
+
+    def _block(self, idx: int) -> bytes:
+        if self._cached[0] != idx:
+            offset, length = self._blocks[idx]
+            block = zlib.decompress(self._mm[offset:offset + length])
+            self._cached = (idx, block)
+        return self._cached[1]
+
+    def row(self, idx: int) -> array:
+        if not 0 <= idx < self._nrows:
+            raise IndexError(f"row {idx} out of range")
+        if not self._compress:
+            offset = self._data_off + idx * self._row_size
+            return _from_bytes(self._mm[offset:offset + self._row_size])
+        block_idx = bisect.bisect_right(self._block_first, idx) - 1
+        offset = (idx - self._block_first[block_idx]) * self._row_size
+        block = self._block(block_idx)
+        return _from_bytes(block[offset:offset + self._row_size])
+
+    def ts(self, idx: int) -> float:
+        return self.row(idx)[0] / 1000000
+
+    def find(self, now: float) -> int:
+        """Index of the first row recorded at or after now"""
+        low, high = 0, self._nrows
+        while low < high:
+            mid = (low + high) // 2
+            if self.ts(mid) < now:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def rows(self, start: int = 0, count: int = -1) -> Iterator[array]:
+        stop = self._nrows if count < 0 else min(start + count, self._nrows)
+        for idx in range(max(start, 0), stop):
+            yield self.row(idx)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# replay views, yield the table rows of every recorded row
+def _replay_snapshot(source: RecordedSource, rows: Iterator[array],
+                     names: List[str]) -> Iterator[List[List[Attr]]]:
+    for row in rows:
+        snapshot = source.snapshot(row)
+        attrs = [current_time_attr(snapshot.ts)]
+        attrs.extend(
+            [snapshot.attr(name) for name in names if name in snapshot])
+        yield [attrs]
+
+
+def _replay_load(source: RecordedSource,
+                 rows: Iterator[array]) -> Iterator[List[List[Attr]]]:
+    for row in rows:
+        snapshot = source.snapshot(row)
+        attrs = [current_time_attr(snapshot.ts)]
+        for name, value, scale in zip(source.schema.names, snapshot.values,
+                                      source.scales):
+            if scale == 1:
+                attrs.append(Attr(name, IntValue(value)))
+            else:
+                attrs.append(Attr(name, FloatValue(value / scale)))
+        yield [attrs]
+
+
+def _replay_deltas(
+    source: RecordedSource, rows: Iterator[array]
+) -> Iterator[Tuple[Snapshot, List[float]]]:
+    last = None
+    for row in rows:
+        snapshot = source.snapshot(row)
+        if last is not None:
+            per_sec = 1 / max(snapshot.ts - last.ts, 1e-9)
+            rates = [(now - prev) * per_sec
+                     for now, prev in zip(snapshot.values, last.values)]
+            yield snapshot, rates
+        last = snapshot
+
+
+def _replay_irq(source: RecordedSource, rows: Iterator[array],
+                top: int) -> Iterator[List[List[Attr]]]:
+    for snapshot, rates in _replay_deltas(source, rows):
+        time_attr = current_time_attr(snapshot.ts)
+        ranked = sorted(range(len(rates)), key=rates.__getitem__, reverse=True)
+        table = []
+        for idx in ranked[0:top]:
+            table.append([
+                time_attr,
+                Attr("IRQ", StrValue(source.schema.names[idx])),
+                Attr("DEVICE", StrValue(source.labels[idx])),
+                Attr("IRQs/SECOND", IntValue(int(rates[idx]))),
+            ])
+        yield table
+
+
+def _replay_stat(source: RecordedSource,
+                 rows: Iterator[array]) -> Iterator[List[List[Attr]]]:
+    for snapshot, rates in _replay_deltas(source, rows):
+        rate = dict(zip(source.schema.names, rates))
+        yield [[
+            current_time_attr(snapshot.ts),
+            Attr("CTXT", IntValue(int(rate["ctxt"]))),
+            Attr("FORKS", IntValue(int(rate["processes"]))),
+            Attr("PROCS_RUNNING", IntValue(snapshot.get("procs_running"))),
+            Attr("PROCS_BLOCKED", IntValue(snapshot.get("procs_blocked"))),
+            Attr("IRQS", IntValue(int(rate["intr"]))),
+        ]]
+
+
+def replay(recording: Recording,
+           view: str,
+           names: Optional[List[str]] = None,
+           top: int = 10,
+           start: int = 0,
+           count: int = -1) -> Iterator[List[List[Attr]]]:
+    """Render recorded rows like the show_* views"""
+    if view not in recording.sources:
+        raise ValueError(f"{view} is not recorded, "
+                         f"recorded: {','.join(recording.sources)}")
+    source = recording.sources[view]
+    rows = recording.rows(start, count)
+    if view == MemRecordSource.name:
+        return _replay_snapshot(
+            source, rows, names or
+            [meminfo.KERNEL, meminfo.USER, meminfo.MEMFREE, meminfo.MEMTOTAL])
+    if view == VMStatRecordSource.name:
+        return _replay_snapshot(source, rows, names or
+                                vmstat.list_default_vmstat_names())
+    if view == LoadRecordSource.name:
+        return _replay_load(source, rows)
+    if view == IrqRecordSource.name:
+        return _replay_irq(source, rows, top)
+    return _replay_stat(source, rows)
@@ -0,0 +1,175 @@
+import time
+import logging
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from xproc import irq, load, meminfo, stat, uptime, vmstat
+from xproc.value import Attr, IntValue, current_time_attr
+
+logger = logging.getLogger("xproc.sampler")
+
+
+# the shortest supported sampling interval in seconds
+MIN_INTERVAL = 0.01
+
+OverrunCallback = Callable[["Scheduler"], None]
+
+
+class Scheduler:
+    """
+    Yield the loop number every interval seconds, count times(-1 forever).
+
+    Deadlines are computed from the start time on the monotonic clock, so
+    the time the caller spends between two ticks does not drift the period.
+    When a tick takes longer than the interval, the missed deadlines are
+    skipped instead of firing a burst of late ticks, and the overrun is
+    accounted and reported through on_overrun.
+    """
+
+    def __init__(self,
+                 interval: float,
+                 count: int = -1,
+                 on_overrun: Optional[OverrunCallback] = None):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.count = count
+        self.on_overrun = on_overrun
+        self.loop = 0
+        self.elapsed = 0.0    # seconds spent by the last tick
+        self.overruns = 0    # ticks took longer than interval
+        self.missed = 0    # deadlines skipped by overruns
+
+    def __iter__(self) -> Iterator[int]:
+        interval = self.interval
+        count = self.count
+        deadline = time.monotonic()
+        while count != 0:
+            count -= 1
+            yield self.loop
+            self.loop += 1
+            now = time.monotonic()
+            self.elapsed = now - deadline
+            if count == 0:
+                return
+            deadline += interval
+            if now > deadline:
+                missed = int((now - deadline) // interval) + 1
+                deadline += missed * interval
+                self.overruns += 1
+                self.missed += missed
+                logger.debug("tick %d took %.3fs, skip %d deadline(s)",
+                             self.loop - 1, self.elapsed, missed)
+                if self.on_overrun:
+                    self.on_overrun(self)
+            time.sleep(deadline - now)
+
+
+class Source(metaclass=ABCMeta):
+    """A sample source, returns its columns without the TIME column"""
+
+    @abstractmethod
+    def sample(self) -> List[Attr]:
+        pass
+
+
+class MemorySource(Source):
+
+    def __init__(self, names: Optional[List[str]] = None):
+        self._names = names or []
+
+    def sample(self) -> List[Attr]:
+        return meminfo.MemoryInfo().get_attrs(self._names)[1:]
+
+
+class VMStatSource(Source):
+
+    def __init__(self, names: Optional[List[str]] = None):
+        self._names = names or vmstat.list_default_vmstat_names()
+
+    def sample(self) -> List[Attr]:
+        return vmstat.VMStat().get_attrs(*self._names)[1:]
+
+
+class LoadSource(Source):
+
+    def sample(self) -> List[Attr]:
+        return load.current_loadavg().get_attrs()[1:]
+
+
+def _since_boot_rate(total: int) -> int:
+    secs = uptime.current_uptime().since_boot_in_seconds
+    if secs <= 0:
+        return 0
+    return int(total / secs)
+
+
+class IrqSource(Source):
+    """Interrupts per second, the first sample is the average since boot"""
+
+    def __init__(self):
+        self._engine: Optional[irq.IrqDeltaEngine] = None
+
+    def sample(self) -> List[Attr]:
+        if self._engine is None:
+            self._engine = irq.IrqDeltaEngine()
+            rate = _since_boot_rate(sum(self._engine.last.counts))
+        else:
+            delta = self._engine.update()
+            rate = int(delta.rate(delta.total()))
+        return [Attr("IRQS", IntValue(rate))]
+
+
+class StatSource(Source):
+    """Context switches and forks per second, running and blocked tasks"""
+
+    def __init__(self):
+        self._last: Optional[Tuple[float, stat.SystemStat]] = None
+
+    def sample(self) -> List[Attr]:
+        now_ts, now = time.monotonic(), stat.current_system_stat()
+        if self._last is None:
+            ctxt = _since_boot_rate(now.ctxt)
+            forks = _since_boot_rate(now.processes)
+        else:
+            last_ts, last = self._last
+            secs = max(now_ts - last_ts, 1e-9)
+            ctxt = int((now.ctxt - last.ctxt) / secs)
+            forks = int((now.processes - last.processes) / secs)
+        self._last = (now_ts, now)
+        return [
+            Attr("CTXT", IntValue(ctxt)),
+            Attr("FORKS", IntValue(forks)),
+            Attr("PROCS_RUNNING", IntValue(now.procs_running)),
+            Attr("PROCS_BLOCKED", IntValue(now.procs_blocked)),
+        ]
+
+
+SOURCES = {
+    "mem": MemorySource,
+    "memory": MemorySource,
+    "vmstat": VMStatSource,
+    "load": LoadSource,
+    "irq": IrqSource,
+    "int": IrqSource,
+    "stat": StatSource,
+}
+
+
+class Sampler:
+    """Read every registered source on the same tick"""
+
+    def __init__(self):
+        self._sources: Dict[str, Source] = OrderedDict()
+
+    def register(self, name: str, source: Optional[Source] = None):
+        if source is None:
+            if name not in SOURCES:
+                raise ValueError(f"unknown source: {name}")
+            source = SOURCES[name]()
+        self._sources[name] = source
+
+    def sample(self) -> List[Attr]:
+        attrs = [current_time_attr()]
+        for source in self._sources.values():
+            attrs.extend(source.sample())
+        return attrs
@@ -1,11 +1,15 @@
-import re
-from typing import List, NamedTuple, Optional, OrderedDict
-import collections
+import os
+from array import array
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple,
+                    Optional, OrderedDict, Tuple, Union)
+import heapq
 import operator
 
-from xproc.util import open_file
+from xproc.procfile import read_proc
 from xproc.value import Attr, IntValue, IntUnitValue, StrValue
 
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
 
 class AttrSlab(NamedTuple):
     name: Attr
@@ -38,6 +42,22 @@ class Slab(NamedTuple):
     num_slabs: int    # The total number of slabs
     sharedavail: int
 
+    @property
+    def cache_size(self) -> int:
+        """in bytes, the pages of all slabs like slabtop"""
+        return self.num_slabs * self.pagesperslab * PAGE_SIZE
+
+    @property
+    def use(self) -> int:
+        """Cache utilization in percent"""
+        if self.num_objs <= 0:
+            return 0
+        return self.active_objs * 100 // self.num_objs
+
+    @property
+    def objs_bytes(self) -> int:
+        return self.num_objs * self.objsize
+
     def to_attrslab(self) -> AttrSlab:
         return AttrSlab(
             name=Attr("NAME", StrValue(self.name)),
@@ -69,30 +89,77 @@ class Slab(NamedTuple):
 #  u: sort by cache utilization
 _SLAB_SORT_KEYWORD = {
     "a": "active_objs",
-    "o": "num_objs",
-    "v": "active_slabs",
+    "b": "objperslab",
+    "c": "cache_size",
     "l": "num_slabs",
+    "v": "active_slabs",
+    "n": "name",
+    "o": "num_objs",
+    "p": "pagesperslab",
     "s": "objsize",
+    "u": "use",
 }
+# sort in ascending order
+_SLAB_SORT_ASC = {"n"}
+
+
+# int fields of a slab, a column each
+_FIELDS = Slab._fields[1:]
+
+
+class SlabTable:
+    """
+    Columnar /proc/slabinfo, an int64 array per field and a name to row
+    index. Tables of the same layout share the names and the index.
+    """
+
+    __slots__ = ("names", "index", "columns")
+
+    def __init__(self, names: List[str], index: Dict[str, int],
+                 columns: Dict[str, array]):
+        self.names = names
+        self.index = index
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_slabs(cls, slabs: Iterable[Slab]) -> "SlabTable":
+        columns = {field: array("q") for field in _FIELDS}
+        names = []
+        for slab in slabs:
+            names.append(slab.name)
+            for field in _FIELDS:
+                columns[field].append(getattr(slab, field))
+        return cls(names, {name: idx for idx, name in enumerate(names)},
+                   columns)
+
+    def slab(self, row: int) -> Slab:
+        return Slab(self.names[row],
+                    *[self.columns[field][row] for field in _FIELDS])
+
+    def objs_bytes(self) -> List[int]:
+        return list(
+            map(operator.mul, self.columns["num_objs"],
+                self.columns["objsize"]))
 
 
 class SlabInfo:
 
-    def __init__(self, slabs: OrderedDict[str, Slab]):
-        self._slabs = slabs
-        active_objs = 0
-        num_objs = 0
-        active_slabs = 0
-        num_slabs = 0
-        for slab in slabs.values():
-            active_objs += slab.active_objs
-            num_objs += slab.num_objs
-            active_slabs += slab.active_slabs
-            num_slabs += slab.num_slabs
-        self._active_objs = active_objs
-        self._num_objs = num_objs
-        self._active_slabs = active_slabs
-        self._num_slabs = num_slabs
+    def __init__(self, slabs: Union[OrderedDict[str, Slab], SlabTable]):
+        if not isinstance(slabs, SlabTable):
+            slabs = SlabTable.from_slabs(slabs.values())
+        self._table = slabs
+        columns = slabs.columns
+        self._active_objs = sum(columns["active_objs"])
+        self._num_objs = sum(columns["num_objs"])
+        self._active_slabs = sum(columns["active_slabs"])
+        self._num_slabs = sum(columns["num_slabs"])
+
+    @property
+    def table(self) -> SlabTable:
+        return self._table
 
     def active_objs(self) -> Attr:
         return Attr("ACTIVE_OBJS", IntValue(self._active_objs))
@@ -106,17 +173,37 @@ class SlabInfo:
     def num_slabs(self) -> Attr:
         return Attr("NUM_SLABS", IntValue(self._num_slabs))
 
+    def slabs(self) -> List[Slab]:
+        return [self._table.slab(row) for row in range(len(self._table))]
+
+    def _sort_key(self, attr_name: str) -> Callable[[int], Any]:
+        """Key of a row index, the rows are never built to be sorted"""
+        table = self._table
+        if attr_name == "name":
+            return table.names.__getitem__
+        if attr_name in table.columns:
+            return table.columns[attr_name].__getitem__
+        num_slabs = table.columns["num_slabs"]
+        if attr_name == "cache_size":
+            pagesperslab = table.columns["pagesperslab"]
+            return lambda row: num_slabs[row] * pagesperslab[row]
+        active_objs = table.columns["active_objs"]
+        num_objs = table.columns["num_objs"]
+        # use
+        return lambda row: (active_objs[row] * 100 // num_objs[row]
+                            if num_objs[row] > 0 else 0)
+
     def _sort(self, bywhat: str = 'o', top: int = -1) -> List[Slab]:
-        slabs = list(self._slabs.values())
-        if bywhat not in _SLAB_SORT_KEYWORD:
-            return slabs
-        attr_name = _SLAB_SORT_KEYWORD[bywhat]
-        sorted_slabs = sorted(slabs,
-                              key=operator.attrgetter(attr_name),
-                              reverse=True)
-        if top <= 0:
-            return sorted_slabs
-        return sorted_slabs[0:min(top, len(sorted_slabs))]
+        rows = range(len(self._table))
+        if bywhat in _SLAB_SORT_KEYWORD:
+            key = self._sort_key(_SLAB_SORT_KEYWORD[bywhat])
+            if bywhat in _SLAB_SORT_ASC:
+                rows = (sorted(rows, key=key)
+                        if top <= 0 else heapq.nsmallest(top, rows, key=key))
+            else:
+                rows = (sorted(rows, key=key, reverse=True)
+                        if top <= 0 else heapq.nlargest(top, rows, key=key))
+        return [self._table.slab(row) for row in rows]
 
     def sort(self, bywhat: str, top: int) -> List[AttrSlab]:
         attr_slabs = []
@@ -124,41 +211,95 @@ class SlabInfo:
             attr_slabs.append(slab.to_attrslab())
         return attr_slabs
 
+    def sorted_slabs(self, bywhat: str, top: int) -> List[Slab]:
+        return self._sort(bywhat, top)
+
+    def growth(self, last: "SlabInfo",
+               top: int = -1) -> List[Tuple[Slab, int]]:
+        """
+        (slab, delta of num_objs * objsize in bytes) of the fastest growing
+        caches since last, a new cache grows from 0.
+        """
+        now_table, last_table = self._table, last.table
+        now_bytes = now_table.objs_bytes()
+        last_bytes = last_table.objs_bytes()
+        if now_table.names is last_table.names:
+            deltas = list(map(operator.sub, now_bytes, last_bytes))
+        else:
+            # caches were created or destroyed
+            last_index = last_table.index
+            deltas = [
+                val - (last_bytes[last_index[name]]
+                       if name in last_index else 0)
+                for name, val in zip(now_table.names, now_bytes)
+            ]
+        rows = range(len(deltas))
+        if top <= 0:
+            rows = sorted(rows, key=deltas.__getitem__, reverse=True)
+        else:
+            rows = heapq.nlargest(top, rows, key=deltas.__getitem__)
+        return [(now_table.slab(row), deltas[row]) for row in rows]
+
+
+_VERSION_PREFIX = b"slabinfo - version: 2."
+_HEADER = (b"# name <active_objs> <num_objs> <objsize> <objperslab> "
+           b"<pagesperslab> : tunables <limit> <batchcount> <sharedfactor> "
+           b": slabdata <active_slabs> <num_slabs> <sharedavail>").split()
+# token indexes of the int fields in a line
+_COLS = (1, 2, 3, 4, 5, 8, 9, 10, 13, 14, 15)
+
+
+class SlabInfoParser:
+    """
+    Split /proc/slabinfo lines into a SlabTable.
+
+    The header is validated once and skipped while it does not change.
+    The names and the name index of the last table are reused while the
+    caches stay the same, the growth of two tables is then a plain
+    column subtraction.
+    """
+
+    def __init__(self):
+        self._header = b""
+        self._names: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def _check_header(self, version: bytes, header: bytes):
+        if header == self._header:
+            return
+        if not version.startswith(_VERSION_PREFIX):
+            raise ValueError(f"unsupported slabinfo: {version!r}")
+        if header.split() != _HEADER:
+            raise ValueError(f"unsupported slabinfo header: {header!r}")
+        self._header = header
+
+    def parse(self, data: bytes) -> SlabTable:
+        lines = data.splitlines()
+        if len(lines) < 2:
+            raise ValueError("slabinfo without header")
+        self._check_header(lines[0], lines[1])
+        cols = [array("q") for _ in _FIELDS]
+        names = []
+        for line in lines[2:]:
+            tokens = line.split()
+            if len(tokens) != 16:
+                continue
+            names.append(tokens[0].decode("utf-8"))
+            for col, idx in zip(cols, _COLS):
+                col.append(int(tokens[idx]))
+        if names == self._names:
+            names = self._names
+        else:
+            self._names = names
+            self._index = {name: idx for idx, name in enumerate(names)}
+        return SlabTable(names, self._index, dict(zip(_FIELDS, cols)))
+
+
+_PARSER = SlabInfoParser()
+
 
-_SLAB_PAT = re.compile((
-    r"^(?P<name>\w+)\s+(?P<active_objs>\d+)\s+(?P<num_objs>\d+)\s+"
-    r"(?P<objsize>\d+)\s+(?P<objperslab>\d+)\s+(?P<pagesperslab>\d+)\s+"
-    r":\s+tunables\s+(?P<limit>\d+)\s+(?P<batchcount>\d+)\s+(?P<sharedfactor>\d+)\s+"
-    r":\s+slabdata\s+(?P<active_slabs>\d+)\s+(?P<num_slabs>\d+)\s+(?P<sharedavail>\d+)\s+$"
-))
-
-
-def _parse(line: str) -> Optional[Slab]:
-    match = _SLAB_PAT.match(line)
-    if not match:
-        return None
-    return Slab(
-        match.group("name"),
-        int(match.group("active_objs")),
-        int(match.group("num_objs")),
-        int(match.group("objsize")),
-        int(match.group("objperslab")),
-        int(match.group("pagesperslab")),
-        int(match.group("limit")),
-        int(match.group("batchcount")),
-        int(match.group("sharedfactor")),
-        int(match.group("active_slabs")),
-        int(match.group("num_slabs")),
-        int(match.group("sharedavail")),
-    )
-
-
-def current_slabinfo() -> SlabInfo:
-    with open_file("/proc/slabinfo") as sinfo:
-        lines = sinfo.readlines()
-    slabs = collections.OrderedDict()
-    for line in lines:
-        slab = _parse(line)
-        if slab:
-            slabs[slab.name] = slab
-    return SlabInfo(slabs)
+def current_slabinfo(path: str = "/proc/slabinfo",
+                     data: Optional[bytes] = None) -> SlabInfo:
+    if data is None:
+        data = read_proc(path)
+    return SlabInfo(_PARSER.parse(data))
@@ -0,0 +1,136 @@
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from xproc.value import (
+    DEF_FMT_2,
+    Attr,
+    EmptyAttr,
+    IntUnitValue,
+    IntValue,
+)
+
+
+class Schema:
+    """
+    Field names and units of a snapshot, mapping names to value indexes.
+
+    Schemas are interned by intern_schema, all the snapshots of the same
+    file layout share one schema object.
+    """
+
+    __slots__ = ("names", "units", "index")
+
+    def __init__(self, names: Tuple[str, ...], units: Tuple[str, ...]):
+        self.names = names
+        self.units = units
+        self.index: Dict[str, int] = {
+            name: idx for idx, name in enumerate(names)
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_index(self, name: str) -> int:
+        return self.index.get(name, -1)
+
+    def __repr__(self) -> str:
+        return f"Schema({', '.join(self.names)})"
+
+
+_SCHEMAS: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], Schema] = {}
+
+
+def intern_schema(names: Sequence[str], units: Sequence[str]) -> Schema:
+    key = (tuple(sys.intern(name) for name in names), tuple(units))
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        schema = Schema(*key)
+        _SCHEMAS[key] = schema
+    return schema
+
+
+class Snapshot:
+    """Int values of one sample, Attr objects are only built for display"""
+
+    __slots__ = ("schema", "values", "ts")
+
+    def __init__(self, schema: Schema, values: array, ts: float):
+        self.schema = schema
+        self.values = values
+        self.ts = ts
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.schema.index
+
+    def get(self, name: str, default: int = 0) -> int:
+        idx = self.schema.index.get(name)
+        if idx is None:
+            return default
+        return self.values[idx]
+
+    def set(self, name: str, value: int):
+        self.values[self.schema.index[name]] = value
+
+    def names(self) -> List[str]:
+        return list(self.schema.names)
+
+    def attr(self, name: str) -> Attr:
+        idx = self.schema.index.get(name)
+        if idx is None:
+            return EmptyAttr
+        unit = self.schema.units[idx]
+        if not unit:
+            return Attr(name, IntValue(self.values[idx]))
+        value = IntUnitValue(self.values[idx], unit)
+        value.fmt = DEF_FMT_2
+        return Attr(name, value)
+
+    def attrs(self, names: Sequence[str]) -> List[Attr]:
+        return [self.attr(name) for name in names]
+
+
+# (name, unit) of a column computed from the parsed ones
+Derived = Tuple[Tuple[str, str], ...]
+
+# (raw names, sep, derived) -> schema
+_RAW_SCHEMAS: Dict[Tuple[Tuple[bytes, ...], bytes, Derived], Schema] = {}
+
+
+def _build_schema(lines: List[bytes], sep: bytes, derived: Derived) -> Schema:
+    names, units = [], []
+    for line in lines:
+        name, _, rest = line.partition(sep)
+        fields = rest.split()
+        names.append(name.strip().decode("utf-8"))
+        units.append(fields[1].decode("utf-8") if len(fields) > 1 else "")
+    for name, unit in derived:
+        names.append(name)
+        units.append(unit)
+    return intern_schema(names, units)
+
+
+def parse_snapshot(data: bytes,
+                   sep: bytes = b":",
+                   derived: Derived = (),
+                   ts: Optional[float] = None) -> Snapshot:
+    """
+    Parse "name<sep> value [unit]" lines, such as /proc/meminfo and
+    /proc/vmstat. Derived columns are appended to the schema with 0 values.
+    """
+    lines = data.splitlines()
+    raw_names = []
+    values = array("q")
+    for line in lines:
+        name, _, rest = line.partition(sep)
+        raw_names.append(name)
+        values.append(int(rest.split(None, 1)[0]))
+    key = (tuple(raw_names), sep, derived)
+    schema = _RAW_SCHEMAS.get(key)
+    if schema is None:
+        schema = _build_schema(lines, sep, derived)
+        _RAW_SCHEMAS[key] = schema
+    if derived:
+        values.extend([0] * len(derived))
+    return Snapshot(schema, values, time.time() if ts is None else ts)
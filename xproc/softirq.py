@@ -0,0 +1,46 @@
+import heapq
+from typing import List, NamedTuple, Optional, Tuple
+
+from xproc.irq import IrqDelta, IrqDeltaEngine, IrqMatrix, get_matrix
+
+SOFTIRQS_PATH = "/proc/softirqs"
+
+
+class SoftirqStat(NamedTuple):
+    name: str    # HI, TIMER, NET_TX, NET_RX ...
+    rate: float    # per second on all cpus
+    hot: List[Tuple[int, float]]    # (cpu number, rate) of the busiest cpus
+    imbalance: float    # busiest cpu / mean of all cpus, 1 is balanced
+
+
+def get(path: str = SOFTIRQS_PATH,
+        data: Optional[bytes] = None,
+        out: Optional[IrqMatrix] = None) -> IrqMatrix:
+    """/proc/softirqs has the layout of /proc/interrupts without extras"""
+    return get_matrix(path, data, out)
+
+
+def engine(path: str = SOFTIRQS_PATH) -> IrqDeltaEngine:
+    return IrqDeltaEngine(path)
+
+
+def imbalance(cells) -> float:
+    total = sum(cells)
+    if total <= 0:
+        return 0.0
+    return max(cells) * len(cells) / total
+
+
+def summarize(delta: IrqDelta, hot: int = 3) -> List[SoftirqStat]:
+    """Rates, busiest cpus and imbalance of every softirq"""
+    stats = []
+    ncpu = len(delta.cpu_ids)
+    for idx, name in enumerate(delta.labels):
+        cells = delta.deltas[idx * ncpu:(idx + 1) * ncpu]
+        cols = heapq.nlargest(hot, range(ncpu), key=cells.__getitem__)
+        stats.append(
+            SoftirqStat(name, delta.rate(sum(cells)),
+                        [(delta.cpu_ids[col], delta.rate(cells[col]))
+                         for col in cols
+                         if cells[col] > 0], imbalance(cells)))
+    return stats
@@ -1,10 +1,8 @@
-from typing import NamedTuple, List
+import operator
+from array import array
+from typing import NamedTuple, List, Optional
 
-from xproc.value import (
-    Attr,
-    parse_list_int_val,
-    ListIntValue,
-)
+from xproc.procfile import read_proc
 
 
 class CPUStat(NamedTuple):
@@ -43,7 +41,7 @@ EmptySoftIRQStat = SoftIRQStat(0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
 class SystemStat(NamedTuple):
     cpu: CPUStat
     cpus: List[CPUStat]
-    intr: List[int]
+    intr_line: bytes    # the intr counts, tokenised by intr on demand
     ctxt: int
     btime_in_sec: int
     processes: int
@@ -51,44 +49,134 @@ class SystemStat(NamedTuple):
     procs_blocked: int
     softirq: SoftIRQStat
 
+    @property
+    def intr(self) -> List[int]:
+        """The total then the count of every interrupt number"""
+        return [int(i) for i in self.intr_line.split()]
 
-def _parse_cpustat(attr: Attr) -> CPUStat:
-    if isinstance(attr.value, ListIntValue):
-        return CPUStat(*attr.value.value())
-    return EmptyCpuStat
+    @property
+    def intr_total(self) -> int:
+        return int(self.intr_line.split(None, 1)[0]) if self.intr_line else 0
 
 
-def current_system_stat(path="/proc/stat"):
-    with open(path, "r", encoding="utf-8") as stat:
-        lines = stat.readlines()
-    attrs: List[Attr] = []
-    for line in lines:
-        line = line.strip()
-        idx = line.find(" ")
-        name = line[0:idx]
-        value = line[idx + 1:]
-        attrs.append(parse_list_int_val(name, value))
+def _parse_cpustat(value: bytes) -> CPUStat:
+    vals = [int(i) for i in value.split()]
+    if len(vals) < len(CPUStat._fields):    # older kernels have fewer
+        vals.extend([0] * (len(CPUStat._fields) - len(vals)))
+    return CPUStat(*vals[:len(CPUStat._fields)])
+
+
+def current_system_stat(path="/proc/stat", data: Optional[bytes] = None):
+    if data is None:
+        data = read_proc(path)
     cpus = []
-    d_other = {}
-    i_other = {}
+    intr_line = b""
     softirq = []
-    for attr in attrs:
-        name = attr.name
-        if name.startswith("cpu"):
-            cpus.append(_parse_cpustat(attr))
-        elif name.startswith("intr"):
-            value = attr.value
-            if isinstance(value, ListIntValue):
-                d_other[name] = value.value()
-        elif name.startswith("softirq"):
-            value = attr.value
-            if isinstance(value, ListIntValue):
-                softirq = value.value()
-        else:
-            value = attr.value
-            if isinstance(value, ListIntValue):
-                i_other[name] = value.value()[0]
-    return SystemStat(cpus[0], cpus[1:], d_other["intr"], i_other["ctxt"],
-                      i_other["btime"], i_other["processes"],
-                      i_other["procs_running"], i_other["procs_blocked"],
+    i_other = {}
+    for line in data.splitlines():
+        name, _, value = line.partition(b" ")
+        if name.startswith(b"cpu"):
+            cpus.append(_parse_cpustat(value))
+        elif name == b"intr":
+            intr_line = value
+        elif name == b"softirq":
+            softirq = [int(i) for i in value.split()]
+        elif value:
+            i_other[name] = int(value.split(None, 1)[0])
+    return SystemStat(cpus[0], cpus[1:], intr_line, i_other[b"ctxt"],
+                      i_other[b"btime"], i_other[b"processes"],
+                      i_other[b"procs_running"], i_other[b"procs_blocked"],
                       SoftIRQStat(*softirq))
+
+
+# user nice system idle iowait irq softirq steal guest guest_nice
+NCOLS = len(CPUStat._fields)
+# guest and guest_nice are already counted in user and nice
+_NBUSY_COLS = 8
+
+
+class CpuTimes:
+    """
+    Jiffies of /proc/stat in one flat int64 array, ncpu x 10, the first
+    row is the aggregate "cpu" line, cpu_ids[0] is -1.
+    """
+
+    __slots__ = ("cpu_ids", "jiffies")
+
+    def __init__(self, cpu_ids: List[int], jiffies: array):
+        self.cpu_ids = cpu_ids
+        self.jiffies = jiffies
+
+    @property
+    def ncpu(self) -> int:
+        return len(self.cpu_ids) - 1
+
+    def row(self, idx: int) -> array:
+        return self.jiffies[idx * NCOLS:(idx + 1) * NCOLS]
+
+
+def parse_cpu_times(data: bytes) -> CpuTimes:
+    """Only the cpu lines at the top of /proc/stat are parsed"""
+    cpu_ids = []
+    jiffies = array("q")
+    pos = 0
+    # no split of the whole file, the intr line alone may be tens of kB
+    while data.startswith(b"cpu", pos):
+        end = data.find(b"\n", pos)
+        if end < 0:
+            end = len(data)
+        tokens = data[pos:end].split()
+        pos = end + 1
+        cpu_ids.append(int(tokens[0][3:]) if len(tokens[0]) > 3 else -1)
+        vals = tokens[1:NCOLS + 1]
+        jiffies.extend(map(int, vals))
+        if len(vals) < NCOLS:
+            jiffies.extend([0] * (NCOLS - len(vals)))
+    return CpuTimes(cpu_ids, jiffies)
+
+
+def current_cpu_times(path="/proc/stat",
+                      data: Optional[bytes] = None) -> CpuTimes:
+    if data is None:
+        data = read_proc(path)
+    return parse_cpu_times(data)
+
+
+class CpuUsage:
+    """Percent of every jiffies column between two CpuTimes, per row"""
+
+    __slots__ = ("cpu_ids", "deltas", "totals")
+
+    def __init__(self, now: CpuTimes, last: Optional[CpuTimes] = None):
+        self.cpu_ids = now.cpu_ids
+        if last is None:
+            # since boot
+            self.deltas = array("q", now.jiffies)
+        elif last.cpu_ids == now.cpu_ids:
+            self.deltas = array("q",
+                                map(operator.sub, now.jiffies, last.jiffies))
+        else:
+            # cpus went online or offline
+            rows = {cpu: idx for idx, cpu in enumerate(last.cpu_ids)}
+            self.deltas = array("q")
+            for idx, cpu in enumerate(now.cpu_ids):
+                row = now.row(idx)
+                if cpu in rows:
+                    row = map(operator.sub, row, last.row(rows[cpu]))
+                self.deltas.extend(row)
+        deltas = self.deltas
+        self.totals = [
+            sum(deltas[i:i + _NBUSY_COLS])
+            for i in range(0, len(deltas), NCOLS)
+        ]
+
+    def percents(self, idx: int) -> List[float]:
+        """Percent of the 10 columns of a row"""
+        total = self.totals[idx]
+        if total <= 0:
+            return [0.0] * NCOLS
+        scale = 100 / total
+        return [
+            delta * scale
+            for delta in self.deltas[idx * NCOLS:(idx + 1) * NCOLS]
+        ]
@@ -1,6 +1,6 @@
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
-from xproc.util import open_file
+from xproc.procfile import read_proc
 
 
 class Uptime(NamedTuple):
@@ -8,8 +8,9 @@ class Uptime(NamedTuple):
     idle_seconds: float
 
 
-def current_uptime() -> Uptime:
-    with open_file("/proc/uptime") as uptime:
-        line = uptime.readlines()[0].strip()
-    units = line.split(" ")
+def current_uptime(path: str = "/proc/uptime",
+                   data: Optional[bytes] = None) -> Uptime:
+    if data is None:
+        data = read_proc(path)
+    units = data.split()
     return Uptime(float(units[0]), float(units[1]))
@@ -20,3 +20,27 @@ def cpu_count() -> int:
     if cnt:
         return cnt
     return -1
+
+
+def parse_cpuset(spec: str) -> int:
+    """
+    Parse a cpu list such as 0,2,4-7 into a bitmap, bit n for cpu n.
+    """
+    bitmap = 0
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, sep, last = item.partition("-")
+        if not first.isdigit() or sep and not last.isdigit():
+            raise ValueError(f"invalid cpu list: {spec}")
+        start = int(first)
+        end = int(last) if sep else start
+        if end < start:
+            raise ValueError(f"invalid cpu range: {item}")
+        bitmap |= ((1 << (end - start + 1)) - 1) << start
+    return bitmap
+
+
+def cpuset_contains(bitmap: int, cpu: int) -> bool:
+    return bool(bitmap >> cpu & 1)
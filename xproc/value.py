@@ -1,7 +1,6 @@
-from time import strftime, localtime
+from time import strftime, localtime, time
 from abc import ABCMeta, abstractmethod
-from typing import List, Union
-import re
+from typing import AnyStr, List, Optional, Union
 
 DEF_FMT_1 = "{0}"
 DEF_FMT_2 = "{0}{1}"
@@ -132,26 +131,43 @@ EmptyAttr = Attr("EmptyAttr", EmptyValue)
 EmptyIntAttr = Attr("EmptyAttr", EmptyIntValue)
 
 
-def parse_int_val(name: str, value: str) -> Attr:
-    return Attr(name, IntValue(int(value.strip())))
+def parse_int_val(name: str, value: AnyStr) -> Attr:
+    return Attr(name, IntValue(int(value)))
 
 
-def parse_int_unit_val(name: str, value: str) -> Attr:
-    values = value.strip().split(" ")
-    return Attr(name, IntUnitValue(int(values[0]), values[1]))
+def parse_int_unit_val(name: str, value: AnyStr) -> Attr:
+    values = value.split()
+    unit = values[1]
+    if isinstance(unit, bytes):
+        unit = unit.decode("utf-8")
+    return Attr(name, IntUnitValue(int(values[0]), unit))
 
 
-def parse_str_val(name: str, value: str) -> Attr:
-    return Attr(name, StrValue(value.strip()))
+def parse_str_val(name: str, value: AnyStr) -> Attr:
+    value = value.strip()
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    return Attr(name, StrValue(value))
 
 
-def parse_list_int_val(name: str, value: str) -> Attr:
-    vals = []
-    for i in re.split(r"\s+", value):
-        if i:
-            vals.append(int(i))
-    return Attr(name, ListIntValue(vals))
+def parse_list_int_val(name: str, value: AnyStr) -> Attr:
+    return Attr(name, ListIntValue([int(i) for i in value.split()]))
 
 
-def current_time_attr() -> Attr:
-    return Attr("TIME", StrValue(strftime("%H:%M:%S", localtime())))
+_TIME_WITH_MSEC = False
+
+
+def set_time_msec(enabled: bool):
+    """Show milliseconds in the TIME column, for sub-second intervals"""
+    global _TIME_WITH_MSEC    # pylint: disable=global-statement
+    _TIME_WITH_MSEC = enabled
+
+
+def current_time_attr(now: Optional[float] = None) -> Attr:
+    if now is None:
+        now = time()
+    if not _TIME_WITH_MSEC:
+        return Attr("TIME", StrValue(strftime("%H:%M:%S", localtime(now))))
+    msec = int(now * 1000) % 1000
+    return Attr("TIME",
+                StrValue(f"{strftime('%H:%M:%S', localtime(now))}.{msec:03d}"))
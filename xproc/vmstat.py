@@ -1,7 +1,12 @@
-from typing import Dict, List
+from array import array
+from typing import List, Optional
 import logging
-from xproc.util import open_file
-from xproc.value import EmptyIntAttr, Attr, IntValue, parse_int_val, current_time_attr
+import operator
+import time
+from xproc.procfile import read_proc
+from xproc.uptime import current_uptime
+from xproc.snapshot import Snapshot, parse_snapshot
+from xproc.value import EmptyIntAttr, Attr, IntValue, current_time_attr
 
 logger = logging.getLogger("xproc.vmstat")
 
@@ -286,24 +291,47 @@ def supported(name: str) -> bool:
     return name in SUPPORT_VMSATA_NAMES
 
 
+# nr_* are gauges except these event counters
+_NR_COUNTERS = {
+    NR_VMSCAN_WRITE,
+    NR_VMSCAN_IMMEDIATE_RECLAIM,
+    NR_DIRTIED,
+    NR_WRITTEN,
+    "nr_foll_pin_acquired",
+    "nr_foll_pin_released",
+    "nr_throttled_written",
+}
+
+# gauges without the nr_ prefix
+_GAUGES = {
+    WORKINGSET_NODES,
+}
+
+
+def is_counter(name: str) -> bool:
+    """Monotonic event counter or gauge"""
+    if name.startswith("nr_"):
+        return name in _NR_COUNTERS
+    return name not in _GAUGES
+
+
 class VMStat:
 
-    def __init__(self):
-        with open_file("/proc/vmstat") as vmstat:
-            lines = [l.strip() for l in vmstat.readlines()]
-        attrs: Dict[str, Attr] = {}
-        for line in lines:
-            idx = line.find(" ")
-            name = line[0:idx]
-            value = line[idx + 1:]
-            attr = parse_int_val(name, value)
-            val = attr.value
-            if isinstance(val, IntValue):
-                attrs[attr.name] = attr
-        self._attrs = attrs
+    def __init__(self,
+                 path: str = "/proc/vmstat",
+                 data: Optional[bytes] = None):
+        if data is None:
+            data = read_proc(path)
+        self._snapshot = parse_snapshot(data, b" ")
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
 
     def _get_attr(self, name: str) -> Attr:
-        return self._attrs.get(name, EmptyIntAttr)
+        if name not in self._snapshot:
+            return EmptyIntAttr
+        return self._snapshot.attr(name)
 
     def get_attrs(self, *names) -> List[Attr]:
         attrs = []
@@ -312,6 +340,45 @@ class VMStat:
             attrs.append(self._get_attr(name))
         return attrs
 
+    def values(self, names: List[str]) -> array:
+        get = self._snapshot.get
+        return array("q", [get(name) for name in names])
+
+
+class VMStatRate:
+    """
+    Per second deltas of counters, gauges are shown as they are.
+
+    The previous values are kept in an int array indexed like names, the
+    first rate is the average since boot.
+    """
+
+    def __init__(self, names: List[str]):
+        self._names = names
+        # 1 for counters, 0 for gauges, gauges subtract 0 from themselves
+        self._mask = array("q", [int(is_counter(name)) for name in names])
+        self._last = array("q", [0] * len(names))
+        boot_secs = current_uptime().since_boot_in_seconds
+        self._last_ts = time.monotonic() - boot_secs
+
+    def rates(self, vmstat: "VMStat") -> List[float]:
+        now_ts = time.monotonic()
+        values = vmstat.values(self._names)
+        per_sec = 1 / max(now_ts - self._last_ts, 1e-9)
+        scale = [per_sec if m else 1 for m in self._mask]
+        # one pass: (value - last * mask) * scale
+        lasts = map(operator.mul, self._last, self._mask)
+        deltas = map(operator.sub, values, lasts)
+        rates = list(map(operator.mul, deltas, scale))
+        self._last, self._last_ts = values, now_ts
+        return rates
+
+    def get_attrs(self, vmstat: "VMStat") -> List[Attr]:
+        attrs = [current_time_attr()]
+        for name, rate in zip(self._names, self.rates(vmstat)):
+            attrs.append(Attr(name, IntValue(int(rate))))
+        return attrs
+
 
 def list_default_vmstat_names() -> List[str]:
     return [
@@ -0,0 +1,176 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from xproc.pidstatus import PIDStatus
+from xproc.procfile import ProcFileReader
+from xproc.proctable import (
+    DEFAULT_FIELDS,
+    RACE_ERRORS,
+    STAT_STARTTIME,
+    STAT_STATE,
+    parse_stat,
+    stat_columns,
+)
+from xproc.snapshot import Schema, Snapshot, intern_schema, parse_snapshot
+
+logger = logging.getLogger("xproc.watcher")
+
+STAT = "stat"
+STATUS = "status"
+IO = "io"
+
+DEFAULT_FD_BUDGET = 1024
+
+
+class WatchedProcess(NamedTuple):
+    pid: int
+    starttime: int
+    new: bool    # first sample, or the pid was reused by another process
+    comm: str
+    state: str
+    stat: Snapshot    # int values of the stat fields
+    status: Optional[PIDStatus]
+    io: Optional[Snapshot]    # None without io or without permission
+
+
+class ProcessWatcher:
+    """
+    Sample a fixed set of pids through fds kept open between ticks.
+
+    A tick rereads /proc/<pid>/{stat,status,io} with pread, no path lookup
+    and no open. The fds of an exited process fail with ESRCH, a pid is
+    then reopened by path once, and a different start time in stat tells
+    that the pid was reused. Open fds are capped by fd_budget, the least
+    recently used ones are closed first and reopened on demand.
+    """
+
+    def __init__(self,
+                 pids: Iterable[int],
+                 fields: Sequence[str] = DEFAULT_FIELDS,
+                 status_fields: Optional[Sequence[str]] = None,
+                 io: bool = False,
+                 fd_budget: int = DEFAULT_FD_BUDGET):
+        names = [name for name in fields if name != STAT_STATE]
+        if STAT_STARTTIME not in names:
+            names.append(STAT_STARTTIME)
+        self.schema: Schema = intern_schema(names, [""] * len(names))
+        self._cols = stat_columns(names)
+        self._start_idx = names.index(STAT_STARTTIME)
+        self._status_fields = status_fields
+        self._files = [STAT]
+        if status_fields is not None:
+            self._files.append(STATUS)
+        if io:
+            self._files.append(IO)
+        # the files of one pid are open together
+        self.fd_budget = max(fd_budget, len(self._files))
+        self._pids: List[int] = sorted(set(pids))
+        self._starttimes: Dict[int, int] = {}
+        self._readers: Dict[Tuple[int, str],
+                            ProcFileReader] = OrderedDict()
+        self._no_io: Dict[int, bool] = {}
+        self.exited: List[int] = []
+
+    @property
+    def pids(self) -> List[int]:
+        return list(self._pids)
+
+    def open_fds(self) -> int:
+        return len(self._readers)
+
+    def watch(self, pid: int):
+        if pid not in self._pids:
+            self._pids.append(pid)
+
+    def unwatch(self, pid: int):
+        if pid in self._pids:
+            self._pids.remove(pid)
+        self._forget(pid)
+
+    def _forget(self, pid: int):
+        for name in self._files:
+            reader = self._readers.pop((pid, name), None)
+            if reader is not None:
+                reader.close()
+        self._starttimes.pop(pid, None)
+        self._no_io.pop(pid, None)
+
+    def _reader(self, pid: int, name: str) -> ProcFileReader:
+        key = (pid, name)
+        reader = self._readers.get(key)
+        if reader is not None:
+            self._readers.move_to_end(key)
+            return reader
+        while len(self._readers) >= self.fd_budget:
+            _, idle = self._readers.popitem(last=False)
+            idle.close()
+        # stat, status and io fit in one read
+        reader = ProcFileReader(f"/proc/{pid}/{name}", single=True)
+        self._readers[key] = reader
+        return reader
+
+    def _read(self, pid: int, name: str) -> bytes:
+        """Reopen by path once if the kept fd belongs to an exited task"""
+        try:
+            return self._reader(pid, name).read()
+        except RACE_ERRORS:
+            reader = self._readers.pop((pid, name), None)
+            if reader is None:
+                raise
+            reader.close()
+            return self._reader(pid, name).read()
+
+    def _sample(self, pid: int) -> Optional[WatchedProcess]:
+        comm, state, values = parse_stat(self._read(pid, STAT), self._cols)
+        starttime = values[self._start_idx]
+        new = self._starttimes.get(pid) != starttime
+        if new and pid in self._starttimes:
+            logger.debug("pid %d was reused", pid)
+            # the other files may still point to the old process
+            self._forget(pid)
+        self._starttimes[pid] = starttime
+        status = None
+        if self._status_fields is not None:
+            status = PIDStatus(pid,
+                               fields=self._status_fields,
+                               data=self._read(pid, STATUS))
+        io = None
+        if IO in self._files and not self._no_io.get(pid):
+            try:
+                io = parse_snapshot(self._read(pid, IO))
+            except PermissionError:
+                self._no_io[pid] = True
+        return WatchedProcess(pid, starttime, new, comm, state,
+                              Snapshot(self.schema, values, time.time()),
+                              status, io)
+
+    def sample(self, pid: int) -> Optional[WatchedProcess]:
+        """None if pid has exited, it is then no longer watched"""
+        try:
+            return self._sample(pid)
+        except RACE_ERRORS:
+            self.unwatch(pid)
+            self.exited.append(pid)
+            return None
+
+    def poll(self) -> Dict[int, WatchedProcess]:
+        """Sample every watched pid, the exited ones are moved to exited"""
+        samples = {}
+        for pid in list(self._pids):
+            watched = self.sample(pid)
+            if watched is not None:
+                samples[pid] = watched
+        return samples
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()